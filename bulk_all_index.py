@@ -1,57 +1,100 @@
 import argparse
+import datetime
+import os
 
 import concurrent.futures
+import threading
 import time
 
 import numpy as np
+from pydantic import BaseModel
 
 from pinecone_commands.commands import upsert_vectors
+from dataset_util.results import summarize_latencies
 from qdrant.commands import update_index_threshold, upsert_points
 
 
+VECTOR_SIZE = 1536
+BACKENDS = ("qdrant", "pinecone")
+
+
+class BackendIngestResult(BaseModel):
+    backend: str
+    parallel_count: int
+    max_in_flight_batches: int
+    vectors: int
+    failed_batches: int
+    failed_vectors: int
+    # 最初のバッチの生成から最後のupsertの完了までの時間
+    wall_time: float
+    vectors_per_sec: float
+    generate_took_time: float
+    # 1バッチあたりのupsertのレイテンシ(秒)
+    batch_latency: dict
+
+
+def generate_random_batches(index_number, bulk_index_threshold, seed=None):
+    # 1バッチ分ずつベクトルを生成する(全件を先に作らない)
+    # 同じ seed なら同じベクトル列になるので、バックエンドごとに生成しても同じデータを比較できる
+    rng = np.random.default_rng(seed)
+    for i in range(0, index_number, bulk_index_threshold):
+        batch_size = min(bulk_index_threshold, index_number - i)
+        vectors = rng.random((batch_size, VECTOR_SIZE))
+        yield [
+            {"id": i + j + 1, "vector": vector}
+            for j, vector in enumerate(vectors.tolist())
+        ]
+
+
 def bulk_index_by_random_vector(
-    collection_name, index_number, bulk_index_threshold, parallel_count=1
+    collection_name,
+    index_number,
+    bulk_index_threshold,
+    parallel_count=1,
+    max_in_flight_batches=None,
 ):
+    if max_in_flight_batches is None:
+        max_in_flight_batches = parallel_count * 2
     print(
-        f"bulk_index_by_random_vector: index_number={index_number}, bulk_index_threshold={bulk_index_threshold}, parallel_count={parallel_count}"
+        f"bulk_index_by_random_vector: index_number={index_number}, bulk_index_threshold={bulk_index_threshold}, parallel_count={parallel_count}, max_in_flight_batches={max_in_flight_batches}"
     )
     start_time = time.time()
     # 一時的にindexをdisableする
     update_index_threshold(collection_name, 0)
 
     task_took_time = {}
-    with concurrent.futures.ThreadPoolExecutor(max_workers=parallel_count) as executor:
-        futures = []
-        crate_vector_start_time = time.time()
-        print(f"start vector generation")
-        vectors = [
-            {"id": i + 1, "vector": np.random.rand(1536).tolist()}
-            for i in range(index_number)
-        ]
-        print(f"end vector generation took {time.time() - crate_vector_start_time} seconds")
-        chunk_vector_start_time = time.time()
-        print(f"start chunk vector")
-        chunked_vectors = [
-            vectors[i : i + bulk_index_threshold]
-            for i in range(0, index_number, bulk_index_threshold)
-        ]
-        print(f"end chunk vector took {time.time() - chunk_vector_start_time} seconds")
-        for vectors in chunked_vectors:
-            futureQdrant = executor.submit(upsert_points, vectors, collection_name)
-            futurePincone = executor.submit(upsert_vectors, vectors)
-            futures.append(futureQdrant)
-            futures.append(futurePincone)
-
-        # Wait for all the futures to complete and handle results
-        for res in concurrent.futures.as_completed(futures):
-            if res.exception():
-                print(f"Exception: {res.exception()}")
+    lock = threading.Lock()
+    # 実行中のバッチ数を制限してメモリ使用量を parallel_count × index_threshold 程度に抑える
+    in_flight = threading.BoundedSemaphore(max_in_flight_batches)
+
+    def on_done(future):
+        in_flight.release()
+        if future.exception():
+            print(f"Exception: {future.exception()}")
+            return
+        task_result = future.result()
+        with lock:
+            if task_result["task_name"] in task_took_time:
+                task_took_time[task_result["task_name"]] += task_result["took_time"]
             else:
-                task_result = res.result()
-                if task_result["task_name"] in task_took_time:
-                    task_took_time[task_result["task_name"]] += task_result["took_time"]
-                else:
-                    task_took_time[task_result["task_name"]] = task_result["took_time"]
+                task_took_time[task_result["task_name"]] = task_result["took_time"]
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=parallel_count) as executor:
+        generate_took_time = 0
+        batches = generate_random_batches(index_number, bulk_index_threshold)
+        while True:
+            generate_start_time = time.time()
+            vectors = next(batches, None)
+            generate_took_time += time.time() - generate_start_time
+            if vectors is None:
+                break
+            for upsert, args in (
+                (upsert_points, (vectors, collection_name)),
+                (upsert_vectors, (vectors,)),
+            ):
+                in_flight.acquire()
+                executor.submit(upsert, *args).add_done_callback(on_done)
+        print(f"vector generation took {generate_took_time} seconds")
 
     # indexを有効化する
     update_index_threshold(collection_name, 20000)
@@ -63,6 +106,165 @@ def bulk_index_by_random_vector(
     print(f"total took {end_time - start_time} seconds")
 
 
+def backend_upsert_function(backend, collection_name):
+    if backend == "qdrant":
+        return lambda vectors: upsert_points(vectors, collection_name)
+    return upsert_vectors
+
+
+def index_backend(
+    backend,
+    collection_name,
+    index_number,
+    bulk_index_threshold,
+    parallel_count,
+    max_in_flight_batches=None,
+    seed=0,
+) -> BackendIngestResult:
+    """1つのバックエンドに専用のスレッドプールでインデックスし、壁時計時間とバッチのレイテンシを返す"""
+    if max_in_flight_batches is None:
+        max_in_flight_batches = parallel_count * 2
+    upsert = backend_upsert_function(backend, collection_name)
+    latencies = []
+    failed_batches = 0
+    failed_vectors = 0
+    lock = threading.Lock()
+    in_flight = threading.BoundedSemaphore(max_in_flight_batches)
+
+    def on_done(future, batch_size):
+        nonlocal failed_batches, failed_vectors
+        in_flight.release()
+        with lock:
+            if future.exception():
+                print(f"{backend} upsert failed: {future.exception()}")
+                failed_batches += 1
+                failed_vectors += batch_size
+            else:
+                latencies.append(future.result()["took_time"])
+
+    start_time = time.perf_counter()
+    generate_took_time = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=parallel_count) as executor:
+        batches = generate_random_batches(index_number, bulk_index_threshold, seed)
+        while True:
+            generate_start_time = time.perf_counter()
+            vectors = next(batches, None)
+            generate_took_time += time.perf_counter() - generate_start_time
+            if vectors is None:
+                break
+            in_flight.acquire()
+            executor.submit(upsert, vectors).add_done_callback(
+                lambda future, batch_size=len(vectors): on_done(future, batch_size)
+            )
+    wall_time = time.perf_counter() - start_time
+
+    vectors_count = index_number - failed_vectors
+    return BackendIngestResult(
+        backend=backend,
+        parallel_count=parallel_count,
+        max_in_flight_batches=max_in_flight_batches,
+        vectors=vectors_count,
+        failed_batches=failed_batches,
+        failed_vectors=failed_vectors,
+        wall_time=wall_time,
+        vectors_per_sec=vectors_count / wall_time if wall_time > 0 else 0.0,
+        generate_took_time=generate_took_time,
+        batch_latency=summarize_latencies(latencies),
+    )
+
+
+class BulkIndexComparison(BaseModel):
+    params: dict
+    results: list[BackendIngestResult]
+
+
+def save_comparison_json(mode, params, results) -> str:
+    current_time = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+    os.makedirs("benchmark_results", exist_ok=True)
+    filepath = os.path.join(
+        "benchmark_results", f"bulk_all_index_{mode}_{current_time}.json"
+    )
+    with open(filepath, "w") as f:
+        f.write(
+            BulkIndexComparison(params=params, results=results).model_dump_json(indent=4)
+        )
+    print(f"Results saved to {filepath}")
+    return filepath
+
+
+def compare_backends(
+    collection_name,
+    index_number,
+    bulk_index_threshold,
+    parallel_counts: dict,
+    max_in_flight_batches=None,
+    mode="parallel",
+    seed=0,
+) -> list[BackendIngestResult]:
+    """バックエンドごとに別のスレッドプールと同時実行数でインデックスし、結果を比較する。
+
+    mode=parallel は全バックエンドを同時に、sequential は1つずつ順に実行する。
+    parallel ではクライアント側のCPUを取り合うので、クライアントの影響を除きたいときは sequential を使う。
+    """
+    backends = list(parallel_counts)
+    print(
+        f"compare_backends: mode={mode}, backends={parallel_counts}, index_number={index_number}, bulk_index_threshold={bulk_index_threshold}"
+    )
+    if "qdrant" in backends:
+        # 一時的にindexをdisableする
+        update_index_threshold(collection_name, 0)
+
+    def run(backend):
+        return index_backend(
+            backend,
+            collection_name,
+            index_number,
+            bulk_index_threshold,
+            parallel_counts[backend],
+            max_in_flight_batches,
+            seed,
+        )
+
+    if mode == "parallel":
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(backends)) as executor:
+            results = list(executor.map(run, backends))
+    else:
+        results = [run(backend) for backend in backends]
+
+    if "qdrant" in backends:
+        # indexを有効化する
+        update_index_threshold(collection_name, 20000)
+
+    print(f"====comparison ({mode})====")
+    for result in results:
+        print(
+            f"{result.backend}: {result.vectors} vectors in {result.wall_time:.2f} seconds "
+            f"({result.vectors_per_sec:.1f} vectors/s), failed batches={result.failed_batches}, "
+            f"batch latency={result.batch_latency}"
+        )
+    save_comparison_json(
+        mode,
+        {
+            "collection_name": collection_name,
+            "index_number": index_number,
+            "bulk_index_threshold": bulk_index_threshold,
+            "parallel_counts": parallel_counts,
+            "max_in_flight_batches": max_in_flight_batches,
+            "seed": seed,
+        },
+        results,
+    )
+    return results
+
+
+def backend_parallel_counts(args) -> dict:
+    parallel_counts = {
+        "qdrant": args.q_parallel_count or args.parallel_count,
+        "pinecone": args.p_parallel_count or args.parallel_count,
+    }
+    return {backend: parallel_counts[backend] for backend in args.backends}
+
+
 def main():
     parser = argparse.ArgumentParser()
     subparsers = parser.add_subparsers()
@@ -91,12 +293,95 @@ def main():
         default=2,
         help="Number of parallel indexing",
     )
+    bulk_index_parser.add_argument(
+        "--max_in_flight_batches",
+        type=int,
+        default=None,
+        help="Max number of upsert requests queued or running at once (default: parallel_count * 2)",
+    )
     bulk_index_parser.set_defaults(
         func=lambda args: bulk_index_by_random_vector(
             args.q_collection_name,
             args.index_num,
             args.index_threshold,
             args.parallel_count,
+            args.max_in_flight_batches,
+        )
+    )
+
+    compare_parser = subparsers.add_parser("compare")
+    compare_parser.add_argument(
+        "--q_collection_name",
+        type=str,
+        default="test_vectors",
+        help="Name of Qdrant Collection name",
+    )
+    compare_parser.add_argument(
+        "--backends",
+        type=str,
+        nargs="+",
+        choices=BACKENDS,
+        default=list(BACKENDS),
+        help="Backends to index",
+    )
+    compare_parser.add_argument(
+        "--mode",
+        type=str,
+        choices=["parallel", "sequential"],
+        default="parallel",
+        help="Run the backends at the same time or one after another",
+    )
+    compare_parser.add_argument(
+        "--index_num",
+        type=int,
+        default=10000,
+        help="Number of vectors to index",
+    )
+    compare_parser.add_argument(
+        "--index_threshold",
+        type=int,
+        default=200,
+        help="Threshold for bulk indexing",
+    )
+    compare_parser.add_argument(
+        "--parallel_count",
+        type=int,
+        default=2,
+        help="Number of parallel upserts per backend",
+    )
+    compare_parser.add_argument(
+        "--q_parallel_count",
+        type=int,
+        default=None,
+        help="Number of parallel upserts for Qdrant (default: parallel_count)",
+    )
+    compare_parser.add_argument(
+        "--p_parallel_count",
+        type=int,
+        default=None,
+        help="Number of parallel upserts for Pinecone (default: parallel_count)",
+    )
+    compare_parser.add_argument(
+        "--max_in_flight_batches",
+        type=int,
+        default=None,
+        help="Max number of upsert requests queued or running at once per backend (default: parallel_count * 2)",
+    )
+    compare_parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Seed of the random vectors (every backend indexes the same vectors)",
+    )
+    compare_parser.set_defaults(
+        func=lambda args: compare_backends(
+            args.q_collection_name,
+            args.index_num,
+            args.index_threshold,
+            backend_parallel_counts(args),
+            args.max_in_flight_batches,
+            args.mode,
+            args.seed,
         )
     )
 
@@ -0,0 +1,214 @@
+import argparse
+import time
+
+from dataset_util.dataset_util import convert_csv, load_vectors, write_vectors
+from dataset_util.ground_truth import load_ground_truth
+from dataset_util.synthetic import SYNTHETIC_KINDS, synthetic_spec
+
+
+def convert_function(csv_file_path, output_path, chunk_size):
+    start_time = time.time()
+    rows = convert_csv(csv_file_path, output_path, chunk_size)
+    vectors = load_vectors(output_path)
+    print(
+        f"converted {rows} rows to {output_path} shape={vectors.shape} took {time.time() - start_time} seconds"
+    )
+
+
+def generate_function(spec, output_path, chunk_size):
+    print(f"Synthetic dataset: {spec}")
+    if output_path is None:
+        return
+    start_time = time.time()
+    rows = write_vectors(load_vectors(spec), output_path, chunk_size)
+    print(f"generated {rows} rows to {output_path} took {time.time() - start_time} seconds")
+
+
+def info_function(dataset_path):
+    vectors = load_vectors(dataset_path)
+    print(f"Dataset: {dataset_path}")
+    print(f"Shape: {vectors.shape}")
+    print(f"Dtype: {vectors.dtype}")
+
+
+def ground_truth_function(
+    dataset_path, query_dataset_path, top_k, index_num, num_queries, block_size, workers
+):
+    ids = load_ground_truth(
+        dataset_path,
+        query_dataset_path,
+        top_k,
+        num_base=index_num,
+        num_queries=num_queries,
+        block_size=block_size,
+        workers=workers,
+    )
+    print(f"Ground truth shape: {ids.shape}")
+
+
+def setup_convert_parser(subparsers, convert_command):
+    convert_parser = subparsers.add_parser(convert_command)
+    convert_parser.add_argument(
+        "--csv_file_path", type=str, required=True, help="Path to the CSV file"
+    )
+    convert_parser.add_argument(
+        "--output_path",
+        type=str,
+        required=True,
+        help="Path to the output dataset file (.npy or .fvecs)",
+    )
+    convert_parser.add_argument(
+        "--chunk_size", type=int, default=100000, help="Number of rows per chunk"
+    )
+    convert_parser.set_defaults(
+        func=lambda args: convert_function(
+            args.csv_file_path, args.output_path, args.chunk_size
+        )
+    )
+
+
+def setup_generate_parser(subparsers, generate_command):
+    generate_parser = subparsers.add_parser(generate_command)
+    generate_parser.add_argument(
+        "--kind",
+        type=str,
+        choices=SYNTHETIC_KINDS,
+        default="gaussian_mixture",
+        help="Distribution: clustered Gaussian mixture, anisotropic (decaying variance, rotated and shifted), or uniform",
+    )
+    generate_parser.add_argument("--num", type=int, default=100000, help="Number of vectors")
+    generate_parser.add_argument("--dim", type=int, default=1536, help="Vector size")
+    generate_parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    generate_parser.add_argument(
+        "--offset",
+        type=int,
+        default=None,
+        help="First row (use rows after the indexed ones as queries from the same distribution)",
+    )
+    generate_parser.add_argument(
+        "--clusters", type=int, default=None, help="Number of clusters (gaussian_mixture, default 100)"
+    )
+    generate_parser.add_argument(
+        "--cluster_std",
+        type=float,
+        default=None,
+        help="Spread around the center relative to its norm (gaussian_mixture, default 0.3)",
+    )
+    generate_parser.add_argument(
+        "--decay",
+        type=float,
+        default=None,
+        help="Variance of dimension i decays as (i+1)^-decay (anisotropic, default 1.0)",
+    )
+    generate_parser.add_argument(
+        "--mean_shift",
+        type=float,
+        default=None,
+        help="Norm of the common mean relative to the spread (anisotropic, default 0.5)",
+    )
+    generate_parser.add_argument(
+        "--normalize",
+        type=str,
+        default=None,
+        help="L2-normalize the vectors (default true, except uniform)",
+    )
+    generate_parser.add_argument(
+        "--output_path",
+        type=str,
+        default=None,
+        help="Path to the output dataset file (.npy or .fvecs). Without it only the synthetic: spec is printed",
+    )
+    generate_parser.add_argument(
+        "--chunk_size", type=int, default=100000, help="Number of rows per chunk"
+    )
+    generate_parser.set_defaults(
+        func=lambda args: generate_function(
+            synthetic_spec(
+                args.kind,
+                num=args.num,
+                dim=args.dim,
+                seed=args.seed,
+                offset=args.offset,
+                clusters=args.clusters,
+                cluster_std=args.cluster_std,
+                decay=args.decay,
+                mean_shift=args.mean_shift,
+                normalize=args.normalize,
+            ),
+            args.output_path,
+            args.chunk_size,
+        )
+    )
+
+
+def setup_info_parser(subparsers, info_command):
+    info_parser = subparsers.add_parser(info_command)
+    info_parser.add_argument(
+        "--dataset_path", type=str, required=True, help="Path to the dataset file"
+    )
+    info_parser.set_defaults(func=lambda args: info_function(args.dataset_path))
+
+
+def setup_ground_truth_parser(subparsers, ground_truth_command):
+    ground_truth_parser = subparsers.add_parser(ground_truth_command)
+    ground_truth_parser.add_argument(
+        "--dataset_path",
+        type=str,
+        required=True,
+        help="Path to the indexed dataset file",
+    )
+    ground_truth_parser.add_argument(
+        "--query_dataset_path",
+        type=str,
+        required=True,
+        help="Path to the query dataset file",
+    )
+    ground_truth_parser.add_argument(
+        "--top_k", type=int, default=10, help="Number of neighbors per query"
+    )
+    ground_truth_parser.add_argument(
+        "--index_num",
+        type=int,
+        default=None,
+        help="Number of indexed vectors (first rows of the dataset)",
+    )
+    ground_truth_parser.add_argument(
+        "--num_queries", type=int, default=None, help="Number of queries"
+    )
+    ground_truth_parser.add_argument(
+        "--block_size",
+        type=int,
+        default=100000,
+        help="Number of dataset rows multiplied at once",
+    )
+    ground_truth_parser.add_argument(
+        "--workers", type=int, default=None, help="Number of threads (default: CPUs)"
+    )
+    ground_truth_parser.set_defaults(
+        func=lambda args: ground_truth_function(
+            args.dataset_path,
+            args.query_dataset_path,
+            args.top_k,
+            args.index_num,
+            args.num_queries,
+            args.block_size,
+            args.workers,
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers()
+
+    setup_convert_parser(subparsers, "convert")
+    setup_generate_parser(subparsers, "generate")
+    setup_info_parser(subparsers, "info")
+    setup_ground_truth_parser(subparsers, "ground_truth")
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
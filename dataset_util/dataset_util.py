@@ -0,0 +1,149 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from dataset_util.hdf5 import load_hdf5, split_hdf5_path
+from dataset_util.synthetic import is_synthetic_spec, load_synthetic
+
+NPY_EXTENSION = ".npy"
+FVECS_EXTENSION = ".fvecs"
+
+
+def read_csv_chunks(csv_file_path, chunk_size):
+    # CSVをNumPy配列のチャンク単位で読み込む(1行ずつfloat変換しない)
+    reader = pd.read_csv(
+        csv_file_path,
+        header=None,
+        dtype=np.float32,
+        chunksize=chunk_size,
+        engine="c",
+    )
+    for chunk in reader:
+        yield chunk.to_numpy(dtype=np.float32, copy=False)
+
+
+def is_dataset_file(path) -> bool:
+    return (
+        os.path.splitext(path)[1] in (NPY_EXTENSION, FVECS_EXTENSION)
+        or split_hdf5_path(path) is not None
+        or is_synthetic_spec(path)
+    )
+
+
+def load_vectors(path) -> np.ndarray:
+    """データセットファイルをメモリマップで開き (n, dim) のfloat32配列を返す。
+
+    ファイル全体はRAMに読み込まれず、スライスしたページだけが読まれる。
+    path には次も指定できる(どちらもスライスした範囲だけを読む LazyVectors を返す)。
+    - ann-benchmarks のHDF5ファイル: glove-100-angular.hdf5 (train) / glove-100-angular.hdf5:test
+    - 合成データセット: synthetic:gaussian_mixture?num=1000000&dim=1536&seed=0
+    """
+    if is_synthetic_spec(path):
+        return load_synthetic(path)
+    if split_hdf5_path(path) is not None:
+        return load_hdf5(path)
+    ext = os.path.splitext(path)[1]
+    if ext == NPY_EXTENSION:
+        vectors = np.load(path, mmap_mode="r")
+        if vectors.dtype != np.float32 or vectors.ndim != 2:
+            raise ValueError(
+                f"{path} must be a 2-d float32 array, got {vectors.dtype} {vectors.shape}"
+            )
+        return vectors
+    if ext == FVECS_EXTENSION:
+        # fvecs: 各行が int32 の次元数 + float32 * dim
+        dim = int(np.fromfile(path, dtype=np.int32, count=1)[0])
+        raw = np.memmap(path, dtype=np.float32, mode="r").reshape(-1, dim + 1)
+        return raw[:, 1:]
+    raise ValueError(f"Unsupported dataset format: {path}")
+
+
+def dataset_fingerprint(path) -> str:
+    """キャッシュキー用。ファイルはパス・サイズ・更新時刻、合成データセットは指定そのもの"""
+    if is_synthetic_spec(path):
+        return path
+    hdf5_path = split_hdf5_path(path)
+    file_path = hdf5_path[0] if hdf5_path else path
+    stat = os.stat(file_path)
+    suffix = f":{hdf5_path[1]}" if hdf5_path else ""
+    return f"{os.path.abspath(file_path)}{suffix}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def iter_batches(vectors: np.ndarray, batch_size, start=0, stop=None):
+    """(開始ID, ベクトルのスライス) をゼロコピーで順に返す"""
+    stop = len(vectors) if stop is None else min(stop, len(vectors))
+    for offset in range(start, stop, batch_size):
+        yield offset, vectors[offset : min(offset + batch_size, stop)]
+
+
+def write_vectors(vectors, output_path, chunk_size=100000) -> int:
+    """(n, dim) の配列(LazyVectors を含む)を .npy または .fvecs にチャンク単位で書き出す"""
+    ext = os.path.splitext(output_path)[1]
+    if ext == NPY_EXTENSION:
+        output = np.lib.format.open_memmap(
+            output_path, mode="w+", dtype=np.float32, shape=tuple(vectors.shape)
+        )
+        for start in range(0, len(vectors), chunk_size):
+            output[start : start + chunk_size] = np.asarray(vectors[start : start + chunk_size])
+            print(f"write up to {min(start + chunk_size, len(vectors))} row")
+        output.flush()
+    elif ext == FVECS_EXTENSION:
+        with open(output_path, "wb") as f:
+            for start in range(0, len(vectors), chunk_size):
+                chunk = np.asarray(vectors[start : start + chunk_size])
+                rows = np.empty((len(chunk), chunk.shape[1] + 1), dtype=np.float32)
+                rows[:, 0] = np.array(chunk.shape[1], dtype=np.int32).view(np.float32)
+                rows[:, 1:] = chunk
+                rows.tofile(f)
+                print(f"write up to {start + len(chunk)} row")
+    else:
+        raise ValueError(f"Unsupported dataset format: {output_path}")
+    return len(vectors)
+
+
+def count_csv_rows(csv_file_path) -> int:
+    rows = 0
+    with open(csv_file_path, "rb") as f:
+        while block := f.read(1 << 24):
+            rows += block.count(b"\n")
+        f.seek(0, os.SEEK_END)
+        if f.tell() > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                rows += 1
+    return rows
+
+
+def convert_csv(csv_file_path, output_path, chunk_size=100000):
+    """CSVを .npy または .fvecs に変換する。チャンク単位で書き出すのでメモリ使用量は一定"""
+    ext = os.path.splitext(output_path)[1]
+    written = 0
+    if ext == NPY_EXTENSION:
+        row_count = count_csv_rows(csv_file_path)
+        output = None
+        for chunk in read_csv_chunks(csv_file_path, chunk_size):
+            if output is None:
+                output = np.lib.format.open_memmap(
+                    output_path,
+                    mode="w+",
+                    dtype=np.float32,
+                    shape=(row_count, chunk.shape[1]),
+                )
+            output[written : written + len(chunk)] = chunk
+            written += len(chunk)
+            print(f"convert up to {written} row")
+        if output is not None:
+            output.flush()
+    elif ext == FVECS_EXTENSION:
+        with open(output_path, "wb") as f:
+            for chunk in read_csv_chunks(csv_file_path, chunk_size):
+                rows = np.empty((len(chunk), chunk.shape[1] + 1), dtype=np.float32)
+                rows[:, 0] = np.array(chunk.shape[1], dtype=np.int32).view(np.float32)
+                rows[:, 1:] = chunk
+                rows.tofile(f)
+                written += len(chunk)
+                print(f"convert up to {written} row")
+    else:
+        raise ValueError(f"Unsupported dataset format: {output_path}")
+    return written
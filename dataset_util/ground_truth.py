@@ -0,0 +1,202 @@
+import concurrent.futures
+import hashlib
+import os
+import time
+
+import numpy as np
+
+from dataset_util.dataset_util import dataset_fingerprint, load_vectors
+from dataset_util.hdf5 import hdf5_distance, load_hdf5_neighbors, split_hdf5_path
+
+GROUND_TRUTH_CACHE_DIR = "ground_truth_cache"
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+def merge_top_k(ids, scores, new_ids, new_scores, k):
+    # スコアの大きい順に上位k件だけ残す
+    ids = np.concatenate([ids, new_ids], axis=1)
+    scores = np.concatenate([scores, new_scores], axis=1)
+    if scores.shape[1] > k:
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        ids = np.take_along_axis(ids, top, axis=1)
+        scores = np.take_along_axis(scores, top, axis=1)
+    return ids, scores
+
+
+def top_k_of_range(base_vectors, queries, k, start, stop, block_size, filter_mask=None):
+    """base_vectors[start:stop] をブロック単位で読みながら上位k件を求める
+
+    filter_mask があれば、マッチしない行のスコアを -inf にする(マッチする行がないブロックは読まない)。
+    """
+    ids = np.empty((len(queries), 0), dtype=np.int64)
+    scores = np.empty((len(queries), 0), dtype=np.float32)
+    for offset in range(start, stop, block_size):
+        block_stop = min(offset + block_size, stop)
+        block_mask = None if filter_mask is None else filter_mask[offset:block_stop]
+        if block_mask is not None and not block_mask.any():
+            continue
+        # メモリマップからブロック分だけ読み込んで正規化する
+        block = normalize(base_vectors[offset:block_stop])
+        block_scores = queries @ block.T
+        if block_mask is not None:
+            block_scores[:, ~block_mask] = -np.inf
+        block_k = min(k, len(block))
+        top = np.argpartition(-block_scores, block_k - 1, axis=1)[:, :block_k]
+        ids, scores = merge_top_k(
+            ids,
+            scores,
+            top + offset,
+            np.take_along_axis(block_scores, top, axis=1),
+            k,
+        )
+    return ids, scores
+
+
+def compute_ground_truth(
+    base_vectors: np.ndarray,
+    queries: np.ndarray,
+    k,
+    block_size=100000,
+    workers=None,
+    filter_mask=None,
+):
+    """cosine類似度の厳密な上位k件を返す。戻り値は行番号とスコアで、スコアの降順に並ぶ
+
+    filter_mask (ベースの行ごとのbool配列) があればマッチする行だけを対象にする。
+    対象の行がk件に満たない分は、行番号 -1・スコア -inf で埋める。
+    """
+    workers = workers or os.cpu_count()
+    queries = normalize(queries)
+    candidates = len(base_vectors) if filter_mask is None else int(filter_mask.sum())
+    if candidates == 0:
+        return (
+            np.full((len(queries), k), -1, dtype=np.int64),
+            np.full((len(queries), k), -np.inf, dtype=np.float32),
+        )
+    # 行範囲をワーカーに分割する(行列積はGILを解放するのでスレッドで並列化できる)
+    range_size = -(-len(base_vectors) // workers)
+    range_size = -(-range_size // block_size) * block_size
+    ranges = [
+        (start, min(start + range_size, len(base_vectors)))
+        for start in range(0, len(base_vectors), range_size)
+    ]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(
+                top_k_of_range,
+                base_vectors,
+                queries,
+                k,
+                start,
+                stop,
+                block_size,
+                filter_mask,
+            )
+            for start, stop in ranges
+        ]
+        ids = np.empty((len(queries), 0), dtype=np.int64)
+        scores = np.empty((len(queries), 0), dtype=np.float32)
+        for future in futures:
+            ids, scores = merge_top_k(ids, scores, *future.result(), k)
+    if ids.shape[1] < k:
+        padding = k - ids.shape[1]
+        ids = np.pad(ids, ((0, 0), (0, padding)), constant_values=-1)
+        scores = np.pad(scores, ((0, 0), (0, padding)), constant_values=-np.inf)
+    order = np.argsort(-scores, axis=1, kind="stable")
+    ids = np.take_along_axis(ids, order, axis=1)
+    scores = np.take_along_axis(scores, order, axis=1)
+    # マッチしない行(スコア -inf)しか残らなかった枠は -1 にする
+    ids[np.isneginf(scores)] = -1
+    return ids, scores
+
+
+def ground_truth_cache_path(
+    dataset_path, query_dataset_path, k, num_base, num_queries, filter_mask=None
+):
+    key = hashlib.sha1()
+    for path in (dataset_path, query_dataset_path):
+        key.update(dataset_fingerprint(path).encode())
+    key.update(f"{k}:{num_base}:{num_queries}".encode())
+    if filter_mask is not None:
+        key.update(np.packbits(filter_mask).tobytes())
+    return os.path.join(GROUND_TRUTH_CACHE_DIR, f"{key.hexdigest()}.npz")
+
+
+def hdf5_ground_truth_file(dataset_path, query_dataset_path, num_base, filter_mask):
+    """ann-benchmarks のファイルの train / test 全体を使う場合は、ファイル内の正解をそのまま使える。
+
+    neighbors は distance の指標で計算されているので、cosine(angular)のファイルのときだけ使う。
+    """
+    base = split_hdf5_path(dataset_path)
+    query = split_hdf5_path(query_dataset_path)
+    if base is None or query is None or filter_mask is not None:
+        return None
+    if base[0] != query[0] or (base[1], query[1]) != ("train", "test"):
+        return None
+    if num_base is not None and num_base < len(load_vectors(dataset_path)):
+        return None
+    if hdf5_distance(base[0]) != "angular":
+        return None
+    return base[0]
+
+
+def load_ground_truth(
+    dataset_path,
+    query_dataset_path,
+    k,
+    num_base=None,
+    num_queries=None,
+    block_size=100000,
+    workers=None,
+    filter_mask=None,
+) -> np.ndarray:
+    """正解の近傍IDを (num_queries, k) で返す。計算結果はディスクにキャッシュする。
+
+    filter_mask (ベースの行ごとのbool配列) を渡すと、マッチする行だけを対象にする。
+    """
+    hdf5_file = hdf5_ground_truth_file(dataset_path, query_dataset_path, num_base, filter_mask)
+    if hdf5_file is not None:
+        print(f"load ground truth from the neighbors of {hdf5_file}")
+        return load_hdf5_neighbors(hdf5_file, k, num_queries)
+    base_vectors = load_vectors(dataset_path)[:num_base]
+    queries = load_vectors(query_dataset_path)[:num_queries]
+    cache_path = ground_truth_cache_path(
+        dataset_path, query_dataset_path, k, len(base_vectors), len(queries), filter_mask
+    )
+    if os.path.exists(cache_path):
+        print(f"load ground truth from {cache_path}")
+        return np.load(cache_path)["ids"]
+
+    start_time = time.time()
+    ids, scores = compute_ground_truth(
+        base_vectors, queries, k, block_size, workers, filter_mask
+    )
+    print(
+        f"compute ground truth base={len(base_vectors)} queries={len(queries)} k={k} took {time.time() - start_time} seconds"
+    )
+    os.makedirs(GROUND_TRUTH_CACHE_DIR, exist_ok=True)
+    np.savez(cache_path, ids=ids, scores=scores)
+    print(f"ground truth saved to {cache_path}")
+    return ids
+
+
+def recall_at_k(result_ids, ground_truth_ids, k) -> float:
+    """1クエリ分の recall@k。フィルターにマッチする行がk件に満たない場合(-1埋め)は、その件数で割る"""
+    ground_truth = [i for i in ground_truth_ids[:k].tolist() if i >= 0]
+    if not ground_truth:
+        return 1.0
+    return len(set(result_ids[:k]) & set(ground_truth)) / len(ground_truth)
+
+
+def mean_recall_at_k(results_ids, ground_truth_ids, k) -> float:
+    recalls = [
+        recall_at_k(result_ids, ground_truth, k)
+        for result_ids, ground_truth in zip(results_ids, ground_truth_ids)
+    ]
+    return float(np.mean(recalls)) if recalls else 0.0
@@ -0,0 +1,74 @@
+import os
+import threading
+
+import numpy as np
+
+from dataset_util.lazy_vectors import LazyVectors
+
+try:
+    import h5py
+except ImportError:  # HDF5のデータセットを使うときだけ必要
+    h5py = None
+
+HDF5_EXTENSIONS = (".hdf5", ".h5")
+# ann-benchmarks のファイルの構成: train(インデックスする行), test(クエリ), neighbors / distances(test の正解)
+HDF5_DEFAULT_SPLIT = "train"
+
+
+def split_hdf5_path(path) -> tuple[str, str] | None:
+    """glove-100-angular.hdf5:test を (ファイル, データセット名) に分ける。HDF5でなければ None"""
+    path = str(path)
+    file_path, _, name = path.rpartition(":")
+    if file_path and os.path.splitext(file_path)[1] in HDF5_EXTENSIONS:
+        return file_path, name
+    if os.path.splitext(path)[1] in HDF5_EXTENSIONS:
+        return path, HDF5_DEFAULT_SPLIT
+    return None
+
+
+def open_hdf5(file_path):
+    if h5py is None:
+        raise ImportError("h5py is required to read HDF5 datasets (pip install h5py)")
+    return h5py.File(file_path, "r")
+
+
+class HDF5Vectors(LazyVectors):
+    """HDF5ファイルの2次元データセット。読んだ範囲だけをディスクから読み、ファイル全体はメモリに載せない。"""
+
+    def __init__(self, file_path, name=HDF5_DEFAULT_SPLIT):
+        self.file_path = file_path
+        self.name = name
+        self.file = open_hdf5(file_path)
+        if name not in self.file:
+            raise ValueError(f"{file_path} has no dataset {name!r} (has {list(self.file)})")
+        self.dataset = self.file[name]
+        if self.dataset.ndim != 2:
+            raise ValueError(f"{file_path}:{name} must be a 2-d array, got {self.dataset.shape}")
+        super().__init__(*self.dataset.shape)
+        # h5py は同じファイルへの同時アクセスをスレッドセーフにしないので読み出しを直列にする
+        self._lock = threading.Lock()
+
+    def read_rows(self, start, stop) -> np.ndarray:
+        with self._lock:
+            rows = self.dataset[start:stop]
+        return rows.astype(np.float32, copy=False)
+
+
+def load_hdf5(path) -> HDF5Vectors:
+    file_path, name = split_hdf5_path(path)
+    return HDF5Vectors(file_path, name)
+
+
+def hdf5_distance(file_path) -> str | None:
+    with open_hdf5(file_path) as f:
+        distance = f.attrs.get("distance")
+    return distance.decode() if isinstance(distance, bytes) else distance
+
+
+def load_hdf5_neighbors(file_path, k, num_queries=None) -> np.ndarray:
+    """ann-benchmarks のファイルに含まれる test の正解 (num_queries, k) を読む"""
+    with open_hdf5(file_path) as f:
+        neighbors = f["neighbors"]
+        if neighbors.shape[1] < k:
+            raise ValueError(f"{file_path} has only {neighbors.shape[1]} neighbors per query")
+        return np.asarray(neighbors[:num_queries, :k], dtype=np.int64)
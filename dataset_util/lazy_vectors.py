@@ -0,0 +1,84 @@
+import abc
+import copy
+
+import numpy as np
+
+# 行番号の配列で取り出すときに一度に読む行数
+READ_BLOCK_ROWS = 100000
+
+
+class LazyVectors(abc.ABC):
+    """必要になった行だけを読む (n, dim) の読み取り専用のfloat32配列。
+
+    メモリマップした配列と同じように len / shape / スライス / 行番号の配列で扱える。
+    範囲のスライスはデータを読まずに範囲を絞ったビューを返し、
+    np.asarray() や tolist() の時点でその範囲だけを read_rows で読む。
+    サブクラスは read_rows(start, stop) (全体での行番号) を実装する。
+    """
+
+    dtype = np.dtype(np.float32)
+    ndim = 2
+
+    def __init__(self, num_rows, dim):
+        self.start = 0
+        self.num_rows = num_rows
+        self.dim = dim
+
+    @abc.abstractmethod
+    def read_rows(self, start, stop) -> np.ndarray:
+        """全体での行番号 start から stop までを (stop - start, dim) のfloat32配列で返す"""
+
+    @property
+    def shape(self):
+        return (self.num_rows, self.dim)
+
+    def __len__(self):
+        return self.num_rows
+
+    def view(self, start, stop) -> "LazyVectors":
+        sliced = copy.copy(self)
+        sliced.start = self.start + start
+        sliced.num_rows = max(stop - start, 0)
+        return sliced
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step == 1:
+                return self.view(start, stop)
+            return self[np.arange(start, stop, step)]
+        if isinstance(index, (int, np.integer)):
+            row = index + len(self) if index < 0 else index
+            if not 0 <= row < len(self):
+                raise IndexError(f"row {index} is out of range for {len(self)} rows")
+            return self.read_rows(self.start + row, self.start + row + 1)[0]
+        rows = np.asarray(index)
+        if rows.dtype == bool:
+            rows = np.flatnonzero(rows)
+        return self.take(rows)
+
+    def take(self, rows) -> np.ndarray:
+        """行番号の配列の行を、ブロック単位で読みながら取り出す"""
+        out = np.empty((len(rows), self.dim), dtype=np.float32)
+        if len(rows) == 0:
+            return out
+        order = np.argsort(rows, kind="stable")
+        sorted_rows = rows[order]
+        if sorted_rows[0] < 0 or sorted_rows[-1] >= len(self):
+            raise IndexError(f"rows out of range for {len(self)} rows")
+        position = 0
+        while position < len(sorted_rows):
+            block_start = int(sorted_rows[position])
+            block_stop = min(block_start + READ_BLOCK_ROWS, len(self))
+            end = int(np.searchsorted(sorted_rows, block_stop, side="left"))
+            block = self.read_rows(self.start + block_start, self.start + block_stop)
+            out[order[position:end]] = block[sorted_rows[position:end] - block_start]
+            position = end
+        return out
+
+    def __array__(self, dtype=None, copy=None):
+        vectors = self.read_rows(self.start, self.start + len(self))
+        return vectors if dtype is None else vectors.astype(dtype, copy=False)
+
+    def tolist(self):
+        return np.asarray(self).tolist()
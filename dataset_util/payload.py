@@ -0,0 +1,118 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+# 生成するペイロードのフィールド: キーワード(カテゴリ)・数値・テナントID
+PAYLOAD_FIELDS = ("category", "number", "tenant_id")
+FIELD_SALTS = {"category": 1, "number": 2, "tenant_id": 3}
+
+
+@dataclass
+class PayloadConfig:
+    category_cardinality: int = 10
+    category_skew: float = 0.0
+    tenant_cardinality: int = 100
+    tenant_skew: float = 1.0
+    seed: int = 0
+
+
+def hash_uniform(ids, salt: int, seed: int) -> np.ndarray:
+    """IDごとに決まる [0, 1) の一様乱数(splitmix64)。
+
+    どのバッチ分割でインデックスしても同じIDには同じ値が付くので、
+    ground truth 計算時に同じペイロードを再現できる。
+    """
+    x = np.asarray(ids, dtype=np.uint64) + np.uint64(
+        (seed * 0x9E3779B97F4A7C15 + salt * 0xBF58476D1CE4E5B9) % 2**64
+    )
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    x = x ^ (x >> np.uint64(31))
+    return (x >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+
+def zipf_probabilities(cardinality: int, skew: float) -> np.ndarray:
+    """値 i の出現確率を 1 / (i + 1)^skew に比例させる。skew=0 なら一様"""
+    weights = 1.0 / np.arange(1, cardinality + 1) ** skew
+    return weights / weights.sum()
+
+
+def categorical_values(ids, salt, seed, cardinality, skew) -> np.ndarray:
+    cumulative = np.cumsum(zipf_probabilities(cardinality, skew))
+    values = np.searchsorted(cumulative, hash_uniform(ids, salt, seed), side="right")
+    return np.minimum(values, cardinality - 1)
+
+
+def generate_payload_columns(ids, config: PayloadConfig) -> dict[str, np.ndarray]:
+    """フィールドごとの配列を返す。category / tenant_id は値の番号、number は [0, 1) の実数"""
+    return {
+        "category": categorical_values(
+            ids,
+            FIELD_SALTS["category"],
+            config.seed,
+            config.category_cardinality,
+            config.category_skew,
+        ),
+        "number": hash_uniform(ids, FIELD_SALTS["number"], config.seed),
+        "tenant_id": categorical_values(
+            ids,
+            FIELD_SALTS["tenant_id"],
+            config.seed,
+            config.tenant_cardinality,
+            config.tenant_skew,
+        ),
+    }
+
+
+def value_name(field: str, value: int) -> str:
+    return f"{field}_{value}"
+
+
+def build_payloads(ids, config: PayloadConfig) -> list[dict]:
+    columns = generate_payload_columns(ids, config)
+    return [
+        {
+            "category": value_name("category", category),
+            "number": number,
+            "tenant_id": value_name("tenant_id", tenant_id),
+        }
+        for category, number, tenant_id in zip(
+            columns["category"].tolist(),
+            columns["number"].tolist(),
+            columns["tenant_id"].tolist(),
+        )
+    ]
+
+
+def condition_for_selectivity(field: str, selectivity: float, config: PayloadConfig) -> dict:
+    """指定した割合の点にマッチする条件を作る。
+
+    number は範囲 (number < selectivity)、category / tenant_id は出現確率の小さい値から
+    累積確率が selectivity に最も近くなるまで集めた値のいずれかに一致する条件になる。
+    戻り値は {"field", "lt" or "any", "expected_selectivity"}。
+    """
+    if field == "number":
+        return {"field": field, "lt": selectivity, "expected_selectivity": selectivity}
+    if field == "category":
+        probabilities = zipf_probabilities(config.category_cardinality, config.category_skew)
+    elif field == "tenant_id":
+        probabilities = zipf_probabilities(config.tenant_cardinality, config.tenant_skew)
+    else:
+        raise ValueError(f"Unknown payload field: {field}")
+    order = np.argsort(probabilities, kind="stable")
+    cumulative = np.cumsum(probabilities[order])
+    count = int(np.argmin(np.abs(cumulative - selectivity))) + 1
+    return {
+        "field": field,
+        "any": [value_name(field, value) for value in sorted(order[:count].tolist())],
+        "expected_selectivity": float(cumulative[count - 1]),
+    }
+
+
+def condition_mask(ids, condition: dict, config: PayloadConfig) -> np.ndarray:
+    """条件にマッチするIDのマスク。ground truth とselectivityの実測に使う"""
+    column = generate_payload_columns(ids, config)[condition["field"]]
+    if "lt" in condition:
+        return column < condition["lt"]
+    values = [int(value.rsplit("_", 1)[1]) for value in condition["any"]]
+    return np.isin(column, values)
@@ -0,0 +1,64 @@
+import datetime
+import os
+import random
+
+import numpy as np
+from pydantic import BaseModel
+
+UPSERT_MAX_RETRIES = 3
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 30.0
+
+
+def backoff_delay(retry_count) -> float:
+    """指数バックオフ(full jitter)。同時に失敗したリクエストが同じタイミングで再送しないようにする"""
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2**retry_count))
+
+
+class BulkIndexResult(BaseModel):
+    """bulk_index の結果。Qdrant と Pinecone の bulk_index で同じ形式を出力して比較できるようにする"""
+
+    index_took_time: float
+    index_completed_time: datetime.datetime
+    optimize_took_time: float
+    optimize_completed_time: datetime.datetime
+    indexed_vectors_per_sec: float | None = None
+    index_progress_path: str | None = None
+    # upsertのフェーズ別の時間(秒)。--latency_breakdown のときだけ
+    latency_breakdown: dict | None = None
+    telemetry_path: str | None = None
+    telemetry_summary: dict | None = None
+    # インデックス中のクライアントのCPU時間(全スレッドと --workers の子プロセスの user + system)
+    client_cpu_seconds: float | None = None
+    client_cpu_seconds_per_million_vectors: float | None = None
+
+
+def client_cpu_time() -> float:
+    # 子プロセスの分は終了して join した後に加算される
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+def cpu_seconds_per_million_vectors(cpu_seconds, vector_count) -> float | None:
+    if not vector_count:
+        return None
+    return cpu_seconds / vector_count * 1e6
+
+
+def summarize_latencies(latencies) -> dict:
+    if len(latencies) == 0:
+        return {"count": 0}
+    latencies = np.asarray(latencies)
+    return {
+        "count": len(latencies),
+        "mean": float(latencies.mean()),
+        "p50": float(np.percentile(latencies, 50)),
+        "p95": float(np.percentile(latencies, 95)),
+        "p99": float(np.percentile(latencies, 99)),
+        "max": float(latencies.max()),
+    }
+
+
+def print_latency_stats(name, latencies):
+    stats = summarize_latencies(latencies)
+    print(f"{name} batch latency (seconds): {stats}")
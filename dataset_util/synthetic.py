@@ -0,0 +1,158 @@
+import threading
+from urllib.parse import parse_qsl
+
+import numpy as np
+
+from dataset_util.lazy_vectors import LazyVectors
+
+SYNTHETIC_PREFIX = "synthetic:"
+SYNTHETIC_KINDS = ("gaussian_mixture", "anisotropic", "uniform")
+# 行はこの行数のブロックごとに (seed, ブロック番号) の乱数で生成する。
+# どの範囲をどの順で読んでも同じ行番号には同じベクトルが出る
+BLOCK_ROWS = 4096
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+class SyntheticVectors(LazyVectors):
+    """シードから決まる合成データセット。ファイルを作らずに必要な行だけ生成する。
+
+    gaussian_mixture: clusters 個の中心の周りのガウス分布(中心からの標準偏差は中心のノルムの cluster_std 倍)
+    anisotropic: 次元ごとの分散が (i+1)^-decay で減衰する正規分布をランダムに回転し、平均をずらしたもの
+    uniform: 従来の np.random.rand と同じ [0, 1) の一様分布(比較用)
+    normalize が真なら(uniform 以外は)各行をL2正規化する(cosine距離の埋め込みと同じく単位球面上に乗る)。
+    クエリはインデックスしたものと同じ分布の別の行を offset で指定して使う。
+    """
+
+    def __init__(
+        self,
+        kind="gaussian_mixture",
+        num=1000000,
+        dim=1536,
+        seed=0,
+        offset=0,
+        clusters=100,
+        cluster_std=0.3,
+        decay=1.0,
+        mean_shift=0.5,
+        normalize=True,
+    ):
+        if kind not in SYNTHETIC_KINDS:
+            raise ValueError(f"Unknown synthetic dataset kind: {kind}")
+        super().__init__(num, dim)
+        self.kind = kind
+        self.seed = seed
+        self.offset = offset
+        self.clusters = clusters
+        self.cluster_std = cluster_std
+        self.decay = decay
+        self.mean_shift = mean_shift
+        self.normalize = normalize
+        self.centers = None
+        self.scales = None
+        self.rotation = None
+        self.mean = None
+        # 直前に生成したブロックを使い回す(バッチがブロックより小さい場合に同じブロックを何度も作らない)
+        self._cache = {}
+        self._lock = threading.Lock()
+        self._setup()
+
+    def _setup(self):
+        # 分布のパラメーターは行のブロックとは別の乱数列で決める
+        rng = np.random.default_rng([self.seed, 2**32 - 1])
+        if self.kind == "gaussian_mixture":
+            self.centers = rng.standard_normal((self.clusters, self.dim)).astype(np.float32)
+        elif self.kind == "anisotropic":
+            self.scales = (np.arange(1, self.dim + 1) ** -self.decay).astype(np.float32)
+            self.scales *= np.sqrt(self.dim / np.sum(self.scales**2))
+            # 正規分布の行列のQR分解でランダムな直交行列を作る
+            q, r = np.linalg.qr(rng.standard_normal((self.dim, self.dim)))
+            self.rotation = (q * np.sign(np.diag(r))).astype(np.float32)
+            mean = rng.standard_normal(self.dim)
+            self.mean = (mean / np.linalg.norm(mean) * self.mean_shift * np.sqrt(self.dim)).astype(
+                np.float32
+            )
+
+    def generate_block(self, block_index) -> np.ndarray:
+        rng = np.random.default_rng([self.seed, block_index])
+        if self.kind == "uniform":
+            return rng.random((BLOCK_ROWS, self.dim), dtype=np.float32)
+        noise = rng.standard_normal((BLOCK_ROWS, self.dim), dtype=np.float32)
+        if self.kind == "gaussian_mixture":
+            labels = rng.integers(0, self.clusters, BLOCK_ROWS)
+            vectors = self.centers[labels] + noise * self.cluster_std
+        else:
+            vectors = (noise * self.scales) @ self.rotation + self.mean
+        return normalize_rows(vectors) if self.normalize else vectors
+
+    def block(self, block_index) -> np.ndarray:
+        with self._lock:
+            block = self._cache.get(block_index)
+        if block is None:
+            block = self.generate_block(block_index)
+            with self._lock:
+                if len(self._cache) >= 4:
+                    self._cache.pop(next(iter(self._cache)))
+                self._cache[block_index] = block
+        return block
+
+    def read_rows(self, start, stop) -> np.ndarray:
+        start += self.offset
+        stop += self.offset
+        first = start // BLOCK_ROWS
+        last = -(-stop // BLOCK_ROWS)
+        if last - first == 1:
+            return self.block(first)[start - first * BLOCK_ROWS : stop - first * BLOCK_ROWS]
+        out = np.empty((stop - start, self.dim), dtype=np.float32)
+        for block_index in range(first, last):
+            block_start = block_index * BLOCK_ROWS
+            lo = max(start, block_start)
+            hi = min(stop, block_start + BLOCK_ROWS)
+            out[lo - start : hi - start] = self.generate_block(block_index)[
+                lo - block_start : hi - block_start
+            ]
+        return out
+
+
+SPEC_TYPES = {
+    "num": int,
+    "dim": int,
+    "seed": int,
+    "offset": int,
+    "clusters": int,
+    "cluster_std": float,
+    "decay": float,
+    "mean_shift": float,
+}
+
+
+def is_synthetic_spec(path) -> bool:
+    return str(path).startswith(SYNTHETIC_PREFIX)
+
+
+def parse_synthetic_spec(spec) -> dict:
+    """synthetic:<kind>?num=...&dim=...&seed=... をパラメーターのdictにする"""
+    kind, _, query = spec[len(SYNTHETIC_PREFIX) :].partition("?")
+    params = {"kind": kind}
+    for key, value in parse_qsl(query, strict_parsing=bool(query)):
+        if key == "normalize":
+            params[key] = value.lower() in ("yes", "true", "t", "y", "1")
+        elif key in SPEC_TYPES:
+            params[key] = SPEC_TYPES[key](value)
+        else:
+            raise ValueError(f"Unknown synthetic dataset parameter: {key}")
+    return params
+
+
+def load_synthetic(spec) -> SyntheticVectors:
+    return SyntheticVectors(**parse_synthetic_spec(spec))
+
+
+def synthetic_spec(kind, **params) -> str:
+    """load_vectors に渡せる synthetic:<kind>?... の文字列を作る(None のパラメーターは既定値)"""
+    query = "&".join(f"{key}={value}" for key, value in params.items() if value is not None)
+    return f"{SYNTHETIC_PREFIX}{kind}?{query}" if query else f"{SYNTHETIC_PREFIX}{kind}"
@@ -0,0 +1,156 @@
+import argparse
+import json
+import sys
+
+from locust_util.local_runner import LocalRunParams, run_local
+from locust_util.qps_search import MaxQpsSearchParams, max_qps_function
+from locust_util.results import merge_results
+
+
+def toLocalRunParams(args):
+    extra_args = args.extra_args
+    if extra_args[:1] == ["--"]:
+        extra_args = extra_args[1:]
+    return LocalRunParams(
+        config=args.config,
+        host=args.host,
+        workers=args.workers,
+        users=args.users,
+        spawn_rate=args.spawn_rate,
+        run_time=args.run_time,
+        expect_workers_max_wait=args.expect_workers_max_wait,
+        extra_args=extra_args,
+    )
+
+
+def setup_run_parser(subparsers, run_command):
+    run_parser = subparsers.add_parser(run_command)
+    run_parser.add_argument(
+        "--config", type=str, required=True, help="Locust config file"
+    )
+    run_parser.add_argument(
+        "--host", type=str, default="http://localhost:6333", help="Target host"
+    )
+    run_parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of worker processes (default: number of CPUs)",
+    )
+    run_parser.add_argument(
+        "--users", type=int, default=None, help="Number of users (overrides config)"
+    )
+    run_parser.add_argument(
+        "--spawn_rate",
+        type=float,
+        default=None,
+        help="Users spawned per second (overrides config)",
+    )
+    run_parser.add_argument(
+        "--run_time", type=str, default=None, help="Run time, e.g. 1m (overrides config)"
+    )
+    run_parser.add_argument(
+        "--expect_workers_max_wait",
+        type=int,
+        default=60,
+        help="Seconds to wait for workers to register",
+    )
+    run_parser.add_argument(
+        "extra_args",
+        nargs=argparse.REMAINDER,
+        help="Extra arguments passed to master and workers (after --)",
+    )
+    run_parser.set_defaults(func=lambda args: sys.exit(run_local(toLocalRunParams(args))))
+
+
+def setup_merge_results_parser(subparsers, merge_results_command):
+    merge_results_parser = subparsers.add_parser(merge_results_command)
+    merge_results_parser.add_argument(
+        "paths", nargs="+", help="Result JSON files written by the locustfiles"
+    )
+    merge_results_parser.set_defaults(
+        func=lambda args: print(json.dumps(merge_results(args.paths), indent=4))
+    )
+
+
+def setup_max_qps_parser(subparsers, max_qps_command):
+    max_qps_parser = subparsers.add_parser(max_qps_command)
+    max_qps_parser.add_argument(
+        "--config", type=str, required=True, help="Locust config file"
+    )
+    max_qps_parser.add_argument(
+        "--host", type=str, default="http://localhost:6333", help="Target host"
+    )
+    max_qps_parser.add_argument(
+        "--p99_slo", type=float, required=True, help="p99 latency SLO in milliseconds"
+    )
+    max_qps_parser.add_argument(
+        "--start_qps", type=float, default=50, help="QPS of the first step"
+    )
+    max_qps_parser.add_argument(
+        "--step_qps", type=float, default=50, help="QPS added at each step"
+    )
+    max_qps_parser.add_argument(
+        "--max_qps", type=float, default=5000, help="Upper bound of the QPS steps"
+    )
+    max_qps_parser.add_argument(
+        "--step_time", type=str, default="30s", help="Run time of each step, e.g. 30s"
+    )
+    max_qps_parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of worker processes (default: number of CPUs)",
+    )
+    max_qps_parser.add_argument(
+        "--users",
+        type=int,
+        default=None,
+        help="Number of users, i.e. max in-flight requests (overrides config)",
+    )
+    max_qps_parser.add_argument(
+        "--arrival",
+        type=str,
+        choices=["constant", "poisson"],
+        default="constant",
+        help="Arrival process of the open-loop schedule",
+    )
+    max_qps_parser.add_argument(
+        "--refine_steps",
+        type=int,
+        default=2,
+        help="Bisection steps between the last passing and the first failing QPS",
+    )
+    max_qps_parser.set_defaults(
+        func=lambda args: max_qps_function(
+            MaxQpsSearchParams(
+                config=args.config,
+                host=args.host,
+                p99_slo=args.p99_slo,
+                start_qps=args.start_qps,
+                step_qps=args.step_qps,
+                max_qps=args.max_qps,
+                step_time=args.step_time,
+                workers=args.workers,
+                users=args.users,
+                arrival=args.arrival,
+                refine_steps=args.refine_steps,
+            )
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers()
+
+    setup_run_parser(subparsers, "run")
+    setup_merge_results_parser(subparsers, "merge_results")
+    setup_max_qps_parser(subparsers, "max_qps")
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import os
+import time
+
+import numpy as np
+
+# LATENCY_BREAKDOWN=true で、リクエストごとの送受信・サーバー処理・デコードの時間を記録する
+LATENCY_BREAKDOWN = os.getenv("LATENCY_BREAKDOWN", "false").lower() in (
+    "yes",
+    "true",
+    "t",
+    "y",
+    "1",
+)
+PHASES = ("serialize", "transport", "server", "transport_minus_server", "deserialize")
+
+
+class LatencyBreakdownTracker:
+    """フェーズ別の時間(秒)を集める。分散実行時はワーカーのサンプルをマスターに送る。
+
+    serialize: クエリプールを作るときの1リクエスト分の構築とエンコード(起動時に1回だけ)
+    transport: 送信から応答を受け取り終わるまで
+    server: サーバーが返した処理時間
+    transport_minus_server: transport からサーバーの処理時間を引いた、ネットワークやキューイングの時間
+    deserialize: 応答のデコード
+    """
+
+    def __init__(self):
+        self.samples = {phase: [] for phase in PHASES}
+
+    def register(self, events) -> None:
+        events.report_to_master.add_listener(self._report_to_master)
+        events.worker_report.add_listener(self._worker_report)
+
+    def timed_serializer(self, serialize):
+        def wrapper(*args):
+            start = time.perf_counter()
+            body = serialize(*args)
+            self.samples["serialize"].append(time.perf_counter() - start)
+            return body
+
+        return wrapper
+
+    def add_request(self, transport, server, deserialize) -> None:
+        """server は応答に処理時間が含まれなければ None"""
+        self.samples["transport"].append(transport)
+        self.samples["deserialize"].append(deserialize)
+        if server is not None:
+            self.samples["server"].append(server)
+            self.samples["transport_minus_server"].append(transport - server)
+
+    def extra(self) -> dict:
+        extra = {}
+        for phase, values in self.samples.items():
+            if not values:
+                continue
+            values = np.asarray(values) * 1000
+            extra[f"breakdown_{phase}_mean_ms"] = float(values.mean())
+            extra[f"breakdown_{phase}_p50_ms"] = float(np.percentile(values, 50))
+            extra[f"breakdown_{phase}_p99_ms"] = float(np.percentile(values, 99))
+        return extra
+
+    def _report_to_master(self, client_id, data):
+        data["latency_breakdown"] = self.samples
+        self.samples = {phase: [] for phase in PHASES}
+
+    def _worker_report(self, client_id, data):
+        for phase, values in data.get("latency_breakdown", {}).items():
+            self.samples[phase].extend(values)
+
+
+def create_latency_breakdown_tracker(events) -> LatencyBreakdownTracker | None:
+    if not LATENCY_BREAKDOWN:
+        return None
+    tracker = LatencyBreakdownTracker()
+    tracker.register(events)
+    return tracker
@@ -0,0 +1,106 @@
+import os
+import socket
+import subprocess
+import time
+from dataclasses import dataclass, field
+
+
+@dataclass
+class LocalRunParams:
+    config: str
+    host: str
+    workers: int | None = None
+    users: int | None = None
+    spawn_rate: float | None = None
+    run_time: str | None = None
+    expect_workers_max_wait: int = 60
+    extra_args: list[str] = field(default_factory=list)
+
+
+def find_free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def master_command(params: LocalRunParams, workers: int, port: int) -> list[str]:
+    command = [
+        "locust",
+        "--config",
+        params.config,
+        "--host",
+        params.host,
+        "--master",
+        "--headless",
+        "--master-bind-host",
+        "127.0.0.1",
+        "--master-bind-port",
+        str(port),
+        # ワーカーが全員接続するまで負荷をかけ始めない
+        "--expect-workers",
+        str(workers),
+        "--expect-workers-max-wait",
+        str(params.expect_workers_max_wait),
+    ]
+    if params.users is not None:
+        command += ["--users", str(params.users)]
+    if params.spawn_rate is not None:
+        command += ["--spawn-rate", str(params.spawn_rate)]
+    if params.run_time is not None:
+        command += ["--run-time", params.run_time]
+    return command + params.extra_args
+
+
+def worker_command(params: LocalRunParams, port: int) -> list[str]:
+    return [
+        "locust",
+        "--config",
+        params.config,
+        "--worker",
+        "--master-host",
+        "127.0.0.1",
+        "--master-port",
+        str(port),
+    ] + params.extra_args
+
+
+def stop_processes(processes, timeout=10):
+    for process in processes:
+        if process.poll() is None:
+            process.terminate()
+    deadline = time.time() + timeout
+    for process in processes:
+        try:
+            process.wait(timeout=max(deadline - time.time(), 0))
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def run_local(params: LocalRunParams) -> int:
+    """ローカルでLocustのマスターと、CPUコア数(または指定数)のワーカープロセスを起動して実行する。
+
+    結果はマスターの quitting イベントで benchmark_results/ に保存される。
+    """
+    workers = params.workers or os.cpu_count()
+    port = find_free_port()
+    print(f"start locust master port={port} workers={workers} config={params.config}")
+    master = subprocess.Popen(master_command(params, workers, port))
+    worker_processes = []
+    try:
+        for _ in range(workers):
+            worker_processes.append(
+                subprocess.Popen(
+                    worker_command(params, port),
+                    stdout=subprocess.DEVNULL,
+                    # open-loopの TARGET_QPS をワーカー間で分ける
+                    env={**os.environ, "OPEN_LOOP_WORKERS": str(workers)},
+                )
+            )
+        return_code = master.wait()
+    except KeyboardInterrupt:
+        return_code = 1
+    finally:
+        stop_processes([master] + worker_processes)
+    print(f"locust master exited with code {return_code}")
+    return return_code
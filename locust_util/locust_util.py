@@ -2,8 +2,17 @@ import csv
 import datetime
 import os
 from locust.env import Environment
+from locust.runners import WorkerRunner
 
-def save_stats_csv(environment: Environment, filename_prefix: str) -> None:
+from dataset_util.ground_truth import recall_at_k
+
+def save_stats_csv(
+    environment: Environment, filename_prefix: str, extra: dict | None = None
+) -> str | None:
+    # 分散実行時はマスターが集計済みの結果を保存する
+    if isinstance(environment.runner, WorkerRunner):
+        return None
+    extra = extra or {}
     stats = environment.stats.total
     current_time = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
     num_users = environment.parsed_options.num_users
@@ -12,16 +21,82 @@ def save_stats_csv(environment: Environment, filename_prefix: str) -> None:
     with open(filepath, "w", newline="") as csvfile:
         writer = csv.writer(csvfile)
         # CSVのヘッダー
-        writer.writerow(["p50", "p75", "p90", "p95", "max", "last_rps", "total_rps"])
+        writer.writerow(
+            [
+                "p50",
+                "p75",
+                "p90",
+                "p95",
+                "p99",
+                "p99.9",
+                "max",
+                "last_rps",
+                "total_rps",
+                "requests",
+                "failures",
+                *extra.keys(),
+            ]
+        )
         writer.writerow(
             [
                 stats.get_response_time_percentile(0.5),  # p50
                 stats.get_response_time_percentile(0.75),  # p75
                 stats.get_response_time_percentile(0.90),  # p90
                 stats.get_response_time_percentile(0.95),  # p95
+                stats.get_response_time_percentile(0.99),  # p99
+                stats.get_response_time_percentile(0.999),  # p99.9
                 stats.max_response_time,  # 最大応答時間
                 stats.current_rps,  # 現在のRPS
                 stats.total_rps,  # 累計RPS
+                stats.num_requests,  # リクエスト数
+                stats.num_failures,  # 失敗数
+                *extra.values(),
             ]
         )
-    print(f"Results saved to {filepath}")
\ No newline at end of file
+    print(f"Results saved to {filepath}")
+    return filepath
+
+
+def batch_extra(environment: Environment, batch_size: int) -> dict:
+    """バッチ検索時のクエリ単位のスループットと、1クエリあたりに均した応答時間"""
+    if batch_size == 1:
+        return {}
+    stats = environment.stats.total
+    return {
+        "batch_size": batch_size,
+        "total_qps": stats.total_rps * batch_size,
+        "amortized_avg_response_time": stats.avg_response_time / batch_size,
+        "amortized_p50": stats.get_response_time_percentile(0.5) / batch_size,
+        "amortized_p95": stats.get_response_time_percentile(0.95) / batch_size,
+        "amortized_p99": stats.get_response_time_percentile(0.99) / batch_size,
+    }
+
+
+class RecallTracker:
+    """検索ごとのrecall@kを集計する。分散実行時はワーカーの集計をマスターに送る"""
+
+    def __init__(self, top_k: int):
+        self.top_k = top_k
+        self.recall_sum = 0.0
+        self.count = 0
+
+    def register(self, events) -> None:
+        events.report_to_master.add_listener(self._report_to_master)
+        events.worker_report.add_listener(self._worker_report)
+
+    def add(self, result_ids, ground_truth_ids) -> None:
+        self.recall_sum += recall_at_k(result_ids, ground_truth_ids, self.top_k)
+        self.count += 1
+
+    def mean(self) -> float | None:
+        return self.recall_sum / self.count if self.count else None
+
+    def _report_to_master(self, client_id, data):
+        data["recall_sum"] = self.recall_sum
+        data["recall_count"] = self.count
+        self.recall_sum = 0.0
+        self.count = 0
+
+    def _worker_report(self, client_id, data):
+        self.recall_sum += data.get("recall_sum", 0.0)
+        self.count += data.get("recall_count", 0)
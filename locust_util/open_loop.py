@@ -0,0 +1,105 @@
+import os
+import random
+import time
+
+import gevent
+from locust import constant
+
+# TARGET_QPS を指定すると、ユーザーの待ち時間ではなく決まったスケジュールでリクエストを送る(open-loop)
+TARGET_QPS = float(os.getenv("TARGET_QPS", 0))
+# constant: 等間隔 / poisson: 指数分布の間隔(ポアソン到着)
+ARRIVAL = os.getenv("ARRIVAL", "constant")
+# TARGET_QPS は全体の値なので、ワーカープロセス数で割って各プロセスのレートにする
+OPEN_LOOP_WORKERS = int(os.getenv("OPEN_LOOP_WORKERS", 1))
+
+
+class ArrivalSchedule:
+    """ワーカープロセス内で共有する送信予定時刻のスケジュール。
+
+    ユーザーは空いた順に次の予定時刻を取り、その時刻まで待ってから送信する。
+    応答時間は予定時刻から測るので、サーバーが遅くなってユーザーが足りなくなっても
+    遅れた分が応答時間に含まれる(coordinated omission を避ける)。
+    geventのユーザーは協調的に動くのでロックは不要。
+    """
+
+    def __init__(self, rate: float, poisson=False, seed=None):
+        self.rate = rate
+        self.poisson = poisson
+        self.random = random.Random(seed)
+        self.next_time = None
+        self.count = 0
+        self.lag_sum = 0.0
+        self.lag_max = 0.0
+
+    def register(self, events) -> None:
+        events.report_to_master.add_listener(self._report_to_master)
+        events.worker_report.add_listener(self._worker_report)
+
+    def next(self) -> float:
+        if self.next_time is None:
+            self.next_time = time.perf_counter()
+        scheduled = self.next_time
+        if self.poisson:
+            self.next_time += self.random.expovariate(self.rate)
+        else:
+            self.next_time += 1 / self.rate
+        return scheduled
+
+    def wait(self) -> float:
+        """次の予定時刻まで待ち、予定時刻(perf_counter)を返す"""
+        scheduled = self.next()
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            gevent.sleep(delay)
+        # 予定時刻に送れなかった遅れ(ユーザー不足・クライアント過負荷)を記録する
+        lag = max(time.perf_counter() - scheduled, 0.0)
+        self.count += 1
+        self.lag_sum += lag
+        self.lag_max = max(self.lag_max, lag)
+        return scheduled
+
+    def extra(self) -> dict:
+        return {
+            "target_qps": TARGET_QPS,
+            "arrival": ARRIVAL,
+            "schedule_lag_mean_ms": self.lag_sum / self.count * 1000 if self.count else None,
+            "schedule_lag_max_ms": self.lag_max * 1000,
+        }
+
+    def _report_to_master(self, client_id, data):
+        data["schedule_lag"] = (self.count, self.lag_sum, self.lag_max)
+        self.count = 0
+        self.lag_sum = 0.0
+
+    def _worker_report(self, client_id, data):
+        if "schedule_lag" in data:
+            count, lag_sum, lag_max = data["schedule_lag"]
+            self.count += count
+            self.lag_sum += lag_sum
+            self.lag_max = max(self.lag_max, lag_max)
+
+
+def create_arrival_schedule(events) -> ArrivalSchedule | None:
+    """TARGET_QPS が設定されていればスケジュールを作ってイベントに登録する"""
+    if TARGET_QPS <= 0:
+        return None
+    schedule = ArrivalSchedule(TARGET_QPS / OPEN_LOOP_WORKERS, poisson=ARRIVAL == "poisson")
+    schedule.register(events)
+    return schedule
+
+
+def open_loop_wait_time(schedule: ArrivalSchedule | None, closed_loop_wait_time):
+    # open-loopではタスク内でスケジュールを待つので、ユーザーの待ち時間はなくす
+    return constant(0) if schedule is not None else closed_loop_wait_time
+
+
+def wait_for_schedule(schedule: ArrivalSchedule | None) -> float | None:
+    return schedule.wait() if schedule is not None else None
+
+
+def post_with_schedule(client, path, scheduled: float | None, **kwargs):
+    """FastHttpUserのPOST。scheduled があれば実際の送信時刻ではなく予定時刻からの応答時間を記録する"""
+    with client.post(path, catch_response=True, **kwargs) as response:
+        if scheduled is not None:
+            response.request_meta["response_time"] = (time.perf_counter() - scheduled) * 1000
+    return response
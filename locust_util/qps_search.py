@@ -0,0 +1,151 @@
+import csv
+import datetime
+import glob
+import json
+import os
+from dataclasses import dataclass
+
+from locust_util.local_runner import LocalRunParams, run_local
+
+RESULTS_DIR = "benchmark_results"
+
+
+@dataclass
+class MaxQpsSearchParams:
+    config: str
+    host: str
+    p99_slo: float
+    start_qps: float
+    step_qps: float
+    max_qps: float
+    step_time: str = "30s"
+    workers: int | None = None
+    users: int | None = None
+    arrival: str = "constant"
+    refine_steps: int = 2
+    # 目標QPSに対して実際に送れた割合と、失敗率の許容値
+    min_throughput_ratio: float = 0.95
+    max_failure_ratio: float = 0.01
+
+
+def result_files() -> set[str]:
+    return set(glob.glob(os.path.join(RESULTS_DIR, "*.json")))
+
+
+def achieved_qps(time_series: list[dict]) -> float:
+    """秒ごとのリクエスト数の平均。途中から始まる最初と最後の1秒は除く"""
+    if len(time_series) > 2:
+        time_series = time_series[1:-1]
+    if not time_series:
+        return 0.0
+    return sum(second["rps"] for second in time_series) / len(time_series)
+
+
+def config_users(config_path) -> int | None:
+    """Locustの設定ファイル(key = value 形式)の users を読む"""
+    with open(config_path) as f:
+        for line in f:
+            key, sep, value = line.partition("=")
+            if sep and key.strip() == "users":
+                return int(value.strip())
+    return None
+
+
+def step_users(params: MaxQpsSearchParams) -> int:
+    users = params.users if params.users is not None else config_users(params.config)
+    if users is None:
+        raise ValueError(f"--users is required because {params.config} does not set users")
+    return users
+
+
+def run_step(params: MaxQpsSearchParams, qps: float) -> dict:
+    """TARGET_QPS=qps のopen-loopで1回実行し、p99がSLO以内で目標どおり送れたかを判定する"""
+    os.environ["TARGET_QPS"] = str(qps)
+    os.environ["ARRIVAL"] = params.arrival
+    users = step_users(params)
+    before = result_files()
+    return_code = run_local(
+        LocalRunParams(
+            config=params.config,
+            host=params.host,
+            workers=params.workers,
+            users=users,
+            # 全ユーザーを最初に起動し、立ち上がりの遅れをスケジュールの遅れにしない
+            spawn_rate=users,
+            run_time=params.step_time,
+        )
+    )
+    new_files = sorted(result_files() - before)
+    if not new_files:
+        raise RuntimeError(f"locust wrote no results (exit code {return_code})")
+    with open(new_files[-1]) as f:
+        results = json.load(f)
+    total = results["total"]
+    failure_ratio = total["failures"] / total["requests"] if total["requests"] else 1.0
+    row = {
+        "target_qps": qps,
+        "achieved_qps": achieved_qps(results["time_series"]),
+        "p50": total["p50"],
+        "p99": total["p99"],
+        "requests": total["requests"],
+        "failures": total["failures"],
+        "schedule_lag_max_ms": total.get("schedule_lag_max_ms"),
+        "results_file": new_files[-1],
+    }
+    row["sustainable"] = (
+        row["p99"] <= params.p99_slo
+        and row["achieved_qps"] >= qps * params.min_throughput_ratio
+        and failure_ratio <= params.max_failure_ratio
+    )
+    print(f"step: {row}")
+    return row
+
+
+def find_max_qps(params: MaxQpsSearchParams) -> tuple[float | None, list[dict]]:
+    """start_qps から step_qps ずつ上げ、SLOを満たせなくなったら直前との間を二分探索で詰める"""
+    rows = []
+    best = None
+    failed = None
+    qps = params.start_qps
+    while qps <= params.max_qps:
+        row = run_step(params, qps)
+        rows.append(row)
+        if not row["sustainable"]:
+            failed = qps
+            break
+        best = qps
+        qps += params.step_qps
+
+    if failed is not None:
+        low = best if best is not None else 0.0
+        high = failed
+        for _ in range(params.refine_steps):
+            qps = (low + high) / 2
+            row = run_step(params, qps)
+            rows.append(row)
+            if row["sustainable"]:
+                low = best = qps
+            else:
+                high = qps
+    return best, rows
+
+
+def save_max_qps_csv(rows) -> str:
+    current_time = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    filepath = os.path.join(RESULTS_DIR, f"max_qps_{current_time}.csv")
+    with open(filepath, "w", newline="") as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"Results saved to {filepath}")
+    return filepath
+
+
+def max_qps_function(params: MaxQpsSearchParams):
+    best, rows = find_max_qps(params)
+    save_max_qps_csv(rows)
+    if best is None:
+        print(f"No step met p99 <= {params.p99_slo} ms")
+    else:
+        print(f"Max sustainable QPS under p99 <= {params.p99_slo} ms: {best}")
@@ -0,0 +1,119 @@
+import itertools
+import os
+
+import numpy as np
+
+from dataset_util.dataset_util import load_vectors
+from dataset_util.ground_truth import load_ground_truth
+from dataset_util.payload import PayloadConfig, condition_for_selectivity, condition_mask
+
+QUERY_POOL_SIZE = int(os.getenv("QUERY_POOL_SIZE", 1000))
+QUERY_POOL_SEED = os.getenv("QUERY_POOL_SEED")
+
+
+class QueryPool:
+    """ワーカーごとに一度だけ作る送信済み形式のクエリ集合。
+
+    各要素は (クエリ番号, リクエスト) で、リクエストはシリアライズ済みのbytesなど
+    そのまま送れる形にしておく。ユーザーは next() で順に使い回すだけなので
+    リクエストごとのベクトル生成やJSONエンコードが発生しない。
+    """
+
+    def __init__(self, queries):
+        self.queries = queries
+        self._cycle = itertools.cycle(queries)
+
+    def __len__(self):
+        return len(self.queries)
+
+    def next(self):
+        return next(self._cycle)
+
+
+def load_query_vectors(vector_size, pool_size=QUERY_POOL_SIZE, dataset_path=None):
+    """クエリ番号のリストと (n, vector_size) の配列を返す。
+
+    データセットを指定した場合は先頭 pool_size 行をそのまま使う(クエリ番号 = 行番号)ので、
+    同じクエリで ground truth と突き合わせられる。
+    """
+    if dataset_path:
+        vectors = np.asarray(load_vectors(dataset_path)[:pool_size])
+        return list(range(len(vectors))), vectors
+    seed = int(QUERY_POOL_SEED) if QUERY_POOL_SEED else None
+    vectors = np.random.default_rng(seed).random((pool_size, vector_size))
+    return [None] * pool_size, vectors
+
+
+def build_query_pool(serialize, vector_size, dataset_path=None, pool_size=QUERY_POOL_SIZE):
+    """serialize(ベクトルのlist) でリクエストを作り、QueryPoolに詰める"""
+    query_indexes, vectors = load_query_vectors(vector_size, pool_size, dataset_path)
+    return QueryPool(
+        [
+            (query_index, serialize(vector))
+            for query_index, vector in zip(query_indexes, vectors.tolist())
+        ]
+    )
+
+
+def build_batch_query_pool(
+    serialize_batch, vector_size, batch_size, dataset_path=None, pool_size=QUERY_POOL_SIZE
+):
+    """連続する batch_size 件のクエリを serialize_batch(ベクトルのlistのlist) で1リクエストにまとめる。
+
+    各要素は (クエリ番号のlist, リクエスト) になる。バッチサイズを揃えるため端数のクエリは使わない。
+    """
+    query_indexes, vectors = load_query_vectors(
+        vector_size, max(pool_size, batch_size), dataset_path
+    )
+    vectors = vectors.tolist()
+    return QueryPool(
+        [
+            (query_indexes[i : i + batch_size], serialize_batch(vectors[i : i + batch_size]))
+            for i in range(0, len(vectors) - batch_size + 1, batch_size)
+        ]
+    )
+
+
+def load_filter_condition():
+    """FILTER_FIELD が設定されていれば SELECTIVITY の割合にマッチする条件とペイロード設定を返す"""
+    filter_field = os.getenv("FILTER_FIELD")
+    if not filter_field:
+        return None, None
+    payload_config = PayloadConfig(
+        category_cardinality=int(os.getenv("CATEGORY_CARDINALITY", 10)),
+        category_skew=float(os.getenv("CATEGORY_SKEW", 0.0)),
+        tenant_cardinality=int(os.getenv("TENANT_CARDINALITY", 100)),
+        tenant_skew=float(os.getenv("TENANT_SKEW", 1.0)),
+        seed=int(os.getenv("PAYLOAD_SEED", 0)),
+    )
+    condition = condition_for_selectivity(
+        filter_field, float(os.getenv("SELECTIVITY", 0.1)), payload_config
+    )
+    return condition, payload_config
+
+
+def load_query_ground_truth(
+    query_dataset_path,
+    top_k,
+    pool_size=QUERY_POOL_SIZE,
+    filter_condition=None,
+    payload_config=None,
+):
+    """GROUND_TRUTH_DATASET_PATH が設定されていればクエリプールの正解IDを返す"""
+    dataset_path = os.getenv("GROUND_TRUTH_DATASET_PATH")
+    if not query_dataset_path or not dataset_path:
+        return None
+    index_num = os.getenv("GROUND_TRUTH_INDEX_NUM")
+    num_base = int(index_num) if index_num else None
+    filter_mask = None
+    if filter_condition is not None:
+        num_base = len(load_vectors(dataset_path)[:num_base])
+        filter_mask = condition_mask(np.arange(num_base), filter_condition, payload_config)
+    return load_ground_truth(
+        dataset_path,
+        query_dataset_path,
+        top_k,
+        num_base=num_base,
+        num_queries=pool_size,
+        filter_mask=filter_mask,
+    )
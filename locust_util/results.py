@@ -0,0 +1,189 @@
+import json
+import time
+
+import pandas as pd
+from locust.env import Environment
+
+from locust_util.locust_util import save_stats_csv
+
+PERCENTILES = [0.5, 0.75, 0.9, 0.95, 0.99, 0.999]
+
+
+def round_response_time(response_time: float) -> int:
+    """Locustと同じ丸め方(有効数字2桁程度)でヒストグラムのバケットを決める"""
+    if response_time < 100:
+        return int(round(response_time))
+    if response_time < 1000:
+        return int(round(response_time, -1))
+    if response_time < 10000:
+        return int(round(response_time, -2))
+    return int(round(response_time, -3))
+
+
+def merge_histograms(*histograms) -> dict[int, int]:
+    """{バケット(ms): 件数} のヒストグラムを足し合わせる。ワーカー間・実行間で結合できる"""
+    merged = {}
+    for histogram in histograms:
+        for bucket, count in histogram.items():
+            merged[int(bucket)] = merged.get(int(bucket), 0) + count
+    return merged
+
+
+def histogram_percentile(histogram: dict[int, int], percentile: float) -> int:
+    total = sum(histogram.values())
+    if total == 0:
+        return 0
+    threshold = total * percentile
+    processed = 0
+    for bucket in sorted(histogram):
+        processed += histogram[bucket]
+        if processed >= threshold:
+            return bucket
+    return max(histogram)
+
+
+def summarize_histogram(histogram: dict[int, int]) -> dict:
+    return {
+        "count": sum(histogram.values()),
+        **{f"p{p * 100:g}": histogram_percentile(histogram, p) for p in PERCENTILES},
+        "max": max(histogram) if histogram else 0,
+    }
+
+
+class TimeSeriesRecorder:
+    """1秒ごとのリクエスト数・失敗数・応答時間ヒストグラムを記録する。
+
+    分散実行時はワーカーの記録を report_to_master でマスターに送って結合する。
+    """
+
+    def __init__(self):
+        self.seconds = {}
+
+    def register(self, events) -> None:
+        events.request.add_listener(self._on_request)
+        events.report_to_master.add_listener(self._report_to_master)
+        events.worker_report.add_listener(self._worker_report)
+
+    def _on_request(self, response_time, exception=None, **kwargs):
+        second = int(time.time())
+        bucket = self.seconds.setdefault(
+            second, {"requests": 0, "failures": 0, "histogram": {}}
+        )
+        bucket["requests"] += 1
+        if exception is not None:
+            bucket["failures"] += 1
+        rounded = round_response_time(response_time)
+        bucket["histogram"][rounded] = bucket["histogram"].get(rounded, 0) + 1
+
+    def _report_to_master(self, client_id, data):
+        data["time_series"] = self.seconds
+        self.seconds = {}
+
+    def _worker_report(self, client_id, data):
+        self.merge(data.get("time_series", {}))
+
+    def merge(self, seconds: dict) -> None:
+        for second, other in seconds.items():
+            bucket = self.seconds.setdefault(
+                int(second), {"requests": 0, "failures": 0, "histogram": {}}
+            )
+            bucket["requests"] += other["requests"]
+            bucket["failures"] += other["failures"]
+            bucket["histogram"] = merge_histograms(bucket["histogram"], other["histogram"])
+
+    def series(self) -> list[dict]:
+        return [
+            {
+                "time": second,
+                "rps": bucket["requests"],
+                "failures_per_sec": bucket["failures"],
+                **summarize_histogram(bucket["histogram"]),
+            }
+            for second, bucket in sorted(self.seconds.items())
+        ]
+
+
+def save_results_json(
+    environment: Environment,
+    filepath: str,
+    recorder: TimeSeriesRecorder,
+    metadata: dict | None = None,
+    extra: dict | None = None,
+) -> None:
+    """ヒストグラム全体・秒ごとの時系列・実行条件をJSON(pyarrowがあればParquetも)で保存する"""
+    stats = environment.stats.total
+    histogram = merge_histograms(stats.response_times)
+    results = {
+        "metadata": {
+            "host": environment.host,
+            "num_users": environment.parsed_options.num_users,
+            "start_time": stats.start_time,
+            "last_request_timestamp": stats.last_request_timestamp,
+            **(metadata or {}),
+        },
+        "total": {
+            "requests": stats.num_requests,
+            "failures": stats.num_failures,
+            "total_rps": stats.total_rps,
+            **summarize_histogram(histogram),
+            **(extra or {}),
+        },
+        "errors": [
+            {
+                "method": error.method,
+                "name": error.name,
+                "error": str(error.error),
+                "occurrences": error.occurrences,
+            }
+            for error in environment.stats.errors.values()
+        ],
+        "histogram": histogram,
+        "time_series": recorder.series(),
+    }
+    with open(filepath, "w") as f:
+        json.dump(results, f, indent=2, default=str)
+    print(f"Results saved to {filepath}")
+
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return
+    parquet_path = filepath.removesuffix(".json") + "_time_series.parquet"
+    pd.DataFrame(results["time_series"]).to_parquet(parquet_path)
+    print(f"Results saved to {parquet_path}")
+
+
+def save_results(
+    environment: Environment,
+    filename_prefix: str,
+    recorder: TimeSeriesRecorder,
+    extra: dict | None = None,
+    metadata: dict | None = None,
+) -> None:
+    """従来のCSVに加えて、同じファイル名でJSONの詳細結果を保存する"""
+    filepath = save_stats_csv(environment, filename_prefix, extra)
+    if filepath is None:
+        return
+    save_results_json(
+        environment, filepath.removesuffix(".csv") + ".json", recorder, metadata, extra
+    )
+
+
+def load_results(paths: list[str]) -> list[dict]:
+    results = []
+    for path in paths:
+        with open(path) as f:
+            results.append(json.load(f))
+    return results
+
+
+def merge_results(paths: list[str]) -> dict:
+    """複数の実行結果のヒストグラムを結合して全体のパーセンタイルを求める"""
+    results = load_results(paths)
+    histogram = merge_histograms(*[result["histogram"] for result in results])
+    return {
+        "runs": paths,
+        "requests": sum(result["total"]["requests"] for result in results),
+        "failures": sum(result["total"]["failures"] for result in results),
+        **summarize_histogram(histogram),
+    }
@@ -0,0 +1,213 @@
+import argparse
+from dataclasses import dataclass
+import datetime
+
+from dataset_util.results import (
+    BulkIndexResult,
+    client_cpu_time,
+    cpu_seconds_per_million_vectors,
+)
+from pinecone_commands.bulk_index import (
+    DEFAULT_INDEX_NAME,
+    DEFAULT_NAMESPACE,
+    bulk_index,
+    vector_count,
+    wait_for_vector_count,
+)
+
+DEFAULT_VECTOR_SIZE = 1536
+# --index_num を省略したときのランダムベクトルの件数(データセットは全件をインデックスする)
+DEFAULT_RANDOM_INDEX_NUM = 10000
+
+
+def str2bool(v):
+    if isinstance(v, bool):
+        return v
+    if v.lower() in ("yes", "true", "t", "y", "1"):
+        return True
+    elif v.lower() in ("no", "false", "f", "n", "0"):
+        return False
+    else:
+        raise argparse.ArgumentTypeError("Boolean value expected.")
+
+
+@dataclass
+class BulkIndexParams:
+    index_name: str
+    namespace: str
+    csv_file_path: str | None
+    vector_size: int
+    index_threshold: int
+    index_num: int | None
+    parallel_count: int
+    wait_cluster_ready: bool
+    interval: int = 5
+    timeout: int = 600
+    csv_chunk_size: int | None = None
+    dataset_path: str | None = None
+
+
+def bulk_index_function(params: BulkIndexParams):
+    baseline = 0
+    if params.wait_cluster_ready:
+        # 名前空間に前の実行のベクトルが残っていると、件数がすぐに期待値を超えてしまうので差分で待つ
+        baseline = vector_count(params.index_name, params.namespace)
+        if baseline > 0:
+            print(
+                f"namespace {params.namespace} already has {baseline} vectors; "
+                "re-upserted IDs do not add to the count, so use an empty namespace to measure the wait"
+            )
+    cpu_start = client_cpu_time()
+    index_took_time, rows = bulk_index(
+        params.index_name,
+        params.namespace,
+        params.vector_size,
+        params.index_num,
+        params.index_threshold,
+        params.parallel_count,
+        params.dataset_path,
+        params.csv_file_path,
+        params.csv_chunk_size,
+    )
+    client_cpu_seconds = client_cpu_time() - cpu_start
+    index_completed_time = datetime.datetime.now()
+    optimezed_time = 0
+    if params.wait_cluster_ready:
+        # Pineconeにはインデックス作成の完了がないので、upsertした件数が統計に反映されるまでを待つ
+        optimezed_time = wait_for_vector_count(
+            params.index_name,
+            params.namespace,
+            baseline + rows,
+            params.timeout,
+            params.interval,
+        )
+    optimeze_completed_time = datetime.datetime.now()
+
+    bulk_index_result = BulkIndexResult(
+        index_took_time=index_took_time,
+        index_completed_time=index_completed_time,
+        optimize_took_time=optimezed_time,
+        optimize_completed_time=optimeze_completed_time,
+        client_cpu_seconds=client_cpu_seconds,
+        client_cpu_seconds_per_million_vectors=cpu_seconds_per_million_vectors(
+            client_cpu_seconds, rows
+        ),
+    )
+    print(bulk_index_result.model_dump_json(indent=4))
+    return bulk_index_result
+
+
+def setup_bulk_index_parser(subparsers, bulk_index_command):
+    bulk_index_parser = subparsers.add_parser(bulk_index_command)
+    bulk_index_parser.add_argument(
+        "--index_name",
+        type=str,
+        default=DEFAULT_INDEX_NAME,
+        help="Pinecone index name (used to look up the host unless PINECONE_HOST is set)",
+    )
+    bulk_index_parser.add_argument(
+        "--namespace",
+        type=str,
+        default=DEFAULT_NAMESPACE,
+        help="Namespace to upsert into",
+    )
+    setup_bulk_index_args(bulk_index_parser)
+    bulk_index_parser.set_defaults(
+        func=lambda args: bulk_index_function(toBulkIndexParams(args))
+    )
+
+
+def default_index_num(index_num, dataset_path):
+    if index_num is None and dataset_path is None:
+        return DEFAULT_RANDOM_INDEX_NUM
+    return index_num
+
+
+def toBulkIndexParams(args):
+    return BulkIndexParams(
+        index_name=args.index_name,
+        namespace=args.namespace,
+        csv_file_path=args.csv_file_path,
+        vector_size=args.vector_size,
+        index_threshold=args.index_threshold,
+        index_num=default_index_num(args.index_num, args.dataset_path),
+        parallel_count=args.parallel_count,
+        wait_cluster_ready=args.wait_cluster_ready,
+        interval=args.interval,
+        timeout=args.timeout,
+        csv_chunk_size=args.csv_chunk_size,
+        dataset_path=args.dataset_path,
+    )
+
+
+def setup_bulk_index_args(bulk_index_parser):
+    bulk_index_parser.add_argument(
+        "--csv_file_path",
+        type=str,
+        help="Path to the CSV file",
+    )
+    bulk_index_parser.add_argument(
+        "--csv_chunk_size",
+        type=int,
+        default=None,
+        help="Number of CSV rows parsed at once (default: max(index_threshold, 10000))",
+    )
+    bulk_index_parser.add_argument(
+        "--dataset_path",
+        type=str,
+        default=None,
+        help="Path to the memory-mapped dataset file (.npy or .fvecs). Takes precedence over --csv_file_path",
+    )
+    bulk_index_parser.add_argument(
+        "--vector_size", type=int, default=DEFAULT_VECTOR_SIZE, help="Vector size"
+    )
+    bulk_index_parser.add_argument(
+        "--index_num",
+        type=int,
+        default=None,
+        help=f"Number of vectors to index (default: the whole --dataset_path, or {DEFAULT_RANDOM_INDEX_NUM} random vectors)",
+    )
+    bulk_index_parser.add_argument(
+        "--index_threshold",
+        type=int,
+        default=200,
+        help="Vectors per upsert (at most 1000)",
+    )
+    bulk_index_parser.add_argument(
+        "--parallel_count",
+        type=int,
+        default=2,
+        help="Max in-flight upserts (and pooled connections)",
+    )
+    bulk_index_parser.add_argument(
+        "--wait_cluster_ready",
+        type=str2bool,
+        default=True,
+        help="Wait until describe_index_stats reports the upserted vectors",
+    )
+    bulk_index_parser.add_argument(
+        "--interval",
+        type=int,
+        default=5,
+        help="Max interval (seconds) to poll the vector count",
+    )
+    bulk_index_parser.add_argument(
+        "--timeout",
+        type=int,
+        default=600,
+        help="Timeout (seconds) to wait for the vector count",
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers()
+
+    setup_bulk_index_parser(subparsers, "bulk_index")
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,227 @@
-import csv
+import asyncio
+import json
 import os
-import uuid
-from pinecone import Pinecone, Vector
-
-bulk_index_threshold = 200
-csv_file_path = 'vectors_100000.csv'
-vector_db_name='pinecone'
-
-api_key = os.getenv("PINECONE_API_KEY")
-pc = Pinecone(api_key=api_key)
-index_name = 'test-vectors'
-namespace = 'test_vectors'
-client = pc.Index(index_name)
-
-with open(csv_file_path, mode='r') as csv_file:
-    csv_reader = csv.reader(csv_file)
-    vectors = []
-    for i, row in enumerate(csv_reader):
-        # ここで、CSVの各行からベクターを読み込む
-        vector = [float(x) for x in row]  # CSVの行がベクターの数値データであると仮定
-        vectors.append(Vector(id=str(uuid.uuid4()), values=vector))
-        if len(vectors) >= bulk_index_threshold:
-            # データをPineconeにアップロード
-            client.upsert(vectors=vectors, namespace=namespace)
-            vectors.clear()
-            print(f'index to {vector_db_name} up to {i+1} row')
+import time
 
+import httpx
+import numpy as np
+
+from dataset_util.dataset_util import iter_batches, load_vectors, read_csv_chunks
+from dataset_util.results import UPSERT_MAX_RETRIES, backoff_delay, print_latency_stats
+
+try:
+    import orjson
+except ImportError:  # orjson がなければ標準のjsonでエンコードする(遅い)
+    orjson = None
+
+DEFAULT_INDEX_NAME = "test-vectors"
+DEFAULT_NAMESPACE = "test_vectors"
+# Pineconeの1リクエストの上限は1000ベクトル・2MB
+MAX_BATCH_SIZE = 1000
+
+
+def index_host(index_name) -> str:
+    """データプレーンのURL。PINECONE_HOST(ローカルのエミュレーターなど)がなければコントロールプレーンに問い合わせる"""
+    host = os.getenv("PINECONE_HOST", "")
+    if not host:
+        # SDKはホストの解決にだけ使う
+        from pinecone import Pinecone
+
+        host = Pinecone(api_key=os.getenv("PINECONE_API_KEY")).describe_index(index_name).host
+    if not host.startswith(("http://", "https://")):
+        host = f"https://{host}"
+    return host.rstrip("/")
+
+
+def api_headers() -> dict:
+    api_key = os.getenv("PINECONE_API_KEY", "local" if os.getenv("PINECONE_HOST") else None)
+    return {"Api-Key": api_key, "Content-Type": "application/json"}
+
+
+def encode_upsert(ids, vectors: np.ndarray, namespace) -> bytes:
+    # orjson はC連続の ndarray しか扱えないので、memmap や列優先のCSVのチャンクはここで揃える
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if orjson is not None:
+        return orjson.dumps(
+            {
+                "vectors": [
+                    {"id": str(vector_id), "values": values}
+                    for vector_id, values in zip(ids, vectors)
+                ],
+                "namespace": namespace,
+            },
+            option=orjson.OPT_SERIALIZE_NUMPY,
+        )
+    return json.dumps(
+        {
+            "vectors": [
+                {"id": str(vector_id), "values": values}
+                for vector_id, values in zip(ids, vectors.tolist())
+            ],
+            "namespace": namespace,
+        }
+    ).encode()
+
+
+def vector_batches(
+    vector_size,
+    index_number,
+    batch_size,
+    dataset_path=None,
+    csv_file_path=None,
+    csv_chunk_size=None,
+):
+    """(先頭のID, float32のベクトル配列) を順に返す。
+
+    IDは決まった値にするので、同じ入力で再実行すると同じベクトルを上書きする(冪等)。
+    データセットとCSVは行番号、ランダムベクトルは Qdrant の bulk_index と同じく1始まり。
+    """
+    if dataset_path is not None:
+        yield from iter_batches(load_vectors(dataset_path), batch_size, stop=index_number)
+    elif csv_file_path is not None:
+        parsed_rows = 0
+        for chunk in read_csv_chunks(csv_file_path, csv_chunk_size or max(batch_size, 10000)):
+            for start_id, vectors in iter_batches(chunk, batch_size):
+                yield parsed_rows + start_id, vectors
+            parsed_rows += len(chunk)
+    else:
+        rng = np.random.default_rng()
+        for start_id in range(0, index_number, batch_size):
+            count = min(batch_size, index_number - start_id)
+            yield start_id + 1, rng.random((count, vector_size), dtype=np.float32)
+
+
+async def upsert_with_retry(client: httpx.AsyncClient, body: bytes) -> float:
+    retry_count = 0
+    while retry_count < UPSERT_MAX_RETRIES:
+        try:
+            start = time.perf_counter()
+            response = await client.post("/vectors/upsert", content=body)
+            response.raise_for_status()
+            return time.perf_counter() - start
+        except Exception as e:
+            print(f"Upsert failed: {e}")
+            retry_count += 1
+            if retry_count == UPSERT_MAX_RETRIES:
+                print(f"Upsert failed after {UPSERT_MAX_RETRIES} retries, so exit")
+                raise e
+            await asyncio.sleep(backoff_delay(retry_count))
+
+
+async def upsert_batches(host, namespace, batches, parallel_count) -> tuple[list[float], int]:
+    """接続プールを共有する AsyncClient で、最大 parallel_count 件のupsertを同時に送る"""
+    # 接続数を同時実行数に合わせ、リクエストごとにTLS接続を作り直さない
+    limits = httpx.Limits(
+        max_connections=parallel_count, max_keepalive_connections=parallel_count
+    )
+    semaphore = asyncio.Semaphore(parallel_count)
+    latencies = []
+    rows = 0
+
+    async with httpx.AsyncClient(
+        base_url=host, headers=api_headers(), limits=limits, timeout=60.0
+    ) as client:
+
+        async def run_batch(start_id, vectors):
+            nonlocal rows
+            try:
+                body = encode_upsert(
+                    range(start_id, start_id + len(vectors)), vectors, namespace
+                )
+                took_time = await upsert_with_retry(client, body)
+                latencies.append(took_time)
+                rows += len(vectors)
+                print(
+                    f"index to pinecone up to {start_id + len(vectors)} row took {took_time} seconds"
+                )
+            finally:
+                semaphore.release()
+
+        tasks = []
+        try:
+            for start_id, vectors in batches:
+                await semaphore.acquire()
+                # 失敗したタスクがあれば残りを投入せずに例外を伝播させる
+                # (キャンセルされたタスクの exception() は CancelledError を投げるので先に除く)
+                for task in tasks:
+                    if task.done() and not task.cancelled() and task.exception() is not None:
+                        raise task.exception()
+                tasks.append(asyncio.create_task(run_batch(start_id, vectors)))
+                tasks = [task for task in tasks if not task.done()]
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+    return latencies, rows
+
+
+def bulk_index(
+    index_name,
+    namespace,
+    vector_size,
+    index_number,
+    bulk_index_threshold,
+    parallel_count=1,
+    dataset_path=None,
+    csv_file_path=None,
+    csv_chunk_size=None,
+) -> tuple[float, int]:
+    """(インデックスにかかった時間, upsertした件数) を返す"""
+    if bulk_index_threshold > MAX_BATCH_SIZE:
+        raise ValueError(f"Pinecone accepts at most {MAX_BATCH_SIZE} vectors per upsert")
+    start_time = time.time()
+    host = index_host(index_name)
+    batches = vector_batches(
+        vector_size,
+        index_number,
+        bulk_index_threshold,
+        dataset_path,
+        csv_file_path,
+        csv_chunk_size,
+    )
+    latencies, rows = asyncio.run(
+        upsert_batches(host, namespace, batches, parallel_count)
+    )
+    took_time = time.time() - start_time
+    print_latency_stats(f"pinecone (parallel_count={parallel_count})", latencies)
+    print(f"pinecone bulk_index took {took_time} seconds ({rows / took_time:.1f} rows/s)")
+    return took_time, rows
+
+
+def namespace_vector_count(client: httpx.Client, namespace) -> int:
+    response = client.post("/describe_index_stats", json={})
+    response.raise_for_status()
+    return response.json().get("namespaces", {}).get(namespace, {}).get("vectorCount", 0)
+
+
+def vector_count(index_name, namespace) -> int:
+    with httpx.Client(
+        base_url=index_host(index_name), headers=api_headers(), timeout=60.0
+    ) as client:
+        return namespace_vector_count(client, namespace)
+
+
+def wait_for_vector_count(index_name, namespace, expected, timeout, interval) -> float:
+    """upsertしたベクトルが describe_index_stats に反映される(検索できる)まで待つ
+
+    expected は upsert 前の件数 + upsertした件数。既存のIDを上書きした分は件数が増えないので、
+    同じ名前空間に再実行すると待ち時間を測れない(タイムアウトする)。
+    """
+    start_time = time.time()
+    poll_interval = 0.5
+    with httpx.Client(
+        base_url=index_host(index_name), headers=api_headers(), timeout=60.0
+    ) as client:
+        while True:
+            count = namespace_vector_count(client, namespace)
+            elapsed = time.time() - start_time
+            print(f"namespace {namespace}: {count}/{expected} vectors ({elapsed:.1f}s)")
+            if count >= expected:
+                return elapsed
+            if elapsed > timeout:
+                raise TimeoutError(
+                    f"{namespace} has {count} of {expected} vectors after {timeout} seconds"
+                )
+            time.sleep(poll_interval)
+            poll_interval = min(poll_interval * 2, interval)
@@ -0,0 +1,292 @@
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+class Namespace:
+    """1つのnamespaceのベクトルを保持するインメモリのインデックス。
+
+    ベクトルは float32 の配列に行として追加し、容量が足りなくなったら倍に広げる。
+    検索は全件との内積による厳密なtop-k。
+    """
+
+    def __init__(self, dimension, normalize):
+        self.dimension = dimension
+        self.normalize = normalize
+        self.vectors = np.empty((1024, dimension), dtype=np.float32)
+        self.ids = []
+        self.metadata = []
+        self.positions = {}
+
+    @property
+    def count(self):
+        return len(self.ids)
+
+    def upsert(self, ids, values, metadata):
+        if self.normalize:
+            norms = np.linalg.norm(values, axis=1, keepdims=True)
+            values = values / np.where(norms == 0, 1, norms)
+        for vector_id, vector, meta in zip(ids, values, metadata):
+            position = self.positions.get(vector_id)
+            if position is None:
+                position = self.count
+                if position == len(self.vectors):
+                    grown = np.empty((len(self.vectors) * 2, self.dimension), dtype=np.float32)
+                    grown[:position] = self.vectors[:position]
+                    self.vectors = grown
+                self.positions[vector_id] = position
+                self.ids.append(vector_id)
+                self.metadata.append(meta)
+            else:
+                self.metadata[position] = meta
+            self.vectors[position] = vector
+
+    def snapshot(self):
+        # 配列を広げても古い配列は残るので、件数と配列の組を取ればロックの外で検索できる
+        return self.vectors[: self.count], self.ids, self.metadata
+
+    def vector_by_id(self, vector_id):
+        position = self.positions.get(vector_id)
+        return None if position is None else self.vectors[position].copy()
+
+
+class VectorStore:
+    def __init__(self, metric="cosine", dimension=None):
+        self.metric = metric
+        self.dimension = dimension
+        self.namespaces: dict[str, Namespace] = {}
+        self.lock = threading.Lock()
+
+    def upsert(self, namespace, vectors) -> int:
+        if not vectors:
+            return 0
+        ids = [str(vector["id"]) for vector in vectors]
+        values = np.asarray([vector["values"] for vector in vectors], dtype=np.float32)
+        if values.ndim != 2:
+            raise ValueError("All vectors must have the same dimension")
+        metadata = [vector.get("metadata") for vector in vectors]
+        with self.lock:
+            if self.dimension is None:
+                # 次元を指定していなければ最初のupsertで決める
+                self.dimension = values.shape[1]
+            if values.shape[1] != self.dimension:
+                raise ValueError(
+                    f"Vector dimension {values.shape[1]} does not match the dimension of the index {self.dimension}"
+                )
+            if namespace not in self.namespaces:
+                self.namespaces[namespace] = Namespace(
+                    self.dimension, normalize=self.metric == "cosine"
+                )
+            self.namespaces[namespace].upsert(ids, values, metadata)
+        return len(ids)
+
+    def query(
+        self,
+        namespace,
+        top_k,
+        vector=None,
+        vector_id=None,
+        include_values=False,
+        include_metadata=False,
+    ) -> list[dict]:
+        with self.lock:
+            index = self.namespaces.get(namespace)
+            if index is None:
+                return []
+            vectors, ids, metadata = index.snapshot()
+            if vector_id is not None:
+                vector = index.vector_by_id(str(vector_id))
+                if vector is None:
+                    return []
+        query = np.asarray(vector, dtype=np.float32)
+        if query.shape != (self.dimension,):
+            raise ValueError(
+                f"Query vector dimension {query.shape[-1]} does not match the dimension of the index {self.dimension}"
+            )
+        if self.metric == "euclidean":
+            scores = -np.linalg.norm(vectors - query, axis=1)
+        else:
+            if self.metric == "cosine":
+                norm = np.linalg.norm(query)
+                query = query / norm if norm else query
+            scores = vectors @ query
+        top_k = min(top_k, len(ids))
+        if top_k <= 0:
+            return []
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top])]
+        matches = []
+        for position in top:
+            # euclidean はPineconeと同じく距離そのもの(小さいほど近い)を返す
+            score = float(-scores[position] if self.metric == "euclidean" else scores[position])
+            match = {"id": ids[position], "score": score, "values": []}
+            if include_values:
+                match["values"] = vectors[position].tolist()
+            if include_metadata and metadata[position] is not None:
+                match["metadata"] = metadata[position]
+            matches.append(match)
+        return matches
+
+    def stats(self) -> dict:
+        with self.lock:
+            namespaces = {
+                name: {"vectorCount": index.count}
+                for name, index in self.namespaces.items()
+            }
+        return {
+            "namespaces": namespaces,
+            "dimension": self.dimension or 0,
+            "indexFullness": 0.0,
+            "totalVectorCount": sum(ns["vectorCount"] for ns in namespaces.values()),
+        }
+
+
+class EmulatorHandler(BaseHTTPRequestHandler):
+    # keep-aliveで接続を使い回せるようにする(locustやSDKの接続プールのため)
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body, started=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        if started is not None:
+            # Pineconeと同じくサーバー側の処理時間(ms)をヘッダーで返す
+            self.send_header(
+                "x-envoy-upstream-service-time",
+                str(round((time.perf_counter() - started) * 1000)),
+            )
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length)) if length else {}
+
+    def delay(self, latency_ms):
+        latency = latency_ms + random.uniform(0, self.server.jitter_ms)
+        if latency > 0:
+            time.sleep(latency / 1000)
+
+    def do_GET(self):
+        if self.path == "/describe_index_stats":
+            self.send_json(200, self.server.store.stats())
+        else:
+            self.send_json(404, {"code": 5, "message": f"Not found: {self.path}"})
+
+    def do_POST(self):
+        started = time.perf_counter()
+        try:
+            body = self.read_json()
+        except ValueError as e:
+            self.send_json(400, {"code": 3, "message": f"Invalid JSON: {e}"})
+            return
+        store = self.server.store
+        try:
+            if self.path == "/vectors/upsert":
+                self.delay(self.server.upsert_latency_ms)
+                upserted = store.upsert(body.get("namespace", ""), body.get("vectors", []))
+                self.send_json(200, {"upsertedCount": upserted}, started)
+            elif self.path == "/query":
+                self.delay(self.server.query_latency_ms)
+                namespace = body.get("namespace", "")
+                matches = store.query(
+                    namespace,
+                    int(body.get("topK", 10)),
+                    vector=body.get("vector"),
+                    vector_id=body.get("id"),
+                    include_values=body.get("includeValues", False),
+                    include_metadata=body.get("includeMetadata", False),
+                )
+                self.send_json(
+                    200,
+                    {"results": [], "matches": matches, "namespace": namespace},
+                    started,
+                )
+            elif self.path == "/describe_index_stats":
+                self.send_json(200, store.stats())
+            else:
+                self.send_json(404, {"code": 5, "message": f"Not found: {self.path}"})
+        except (ValueError, KeyError, TypeError) as e:
+            self.send_json(400, {"code": 3, "message": str(e)})
+
+
+def create_server(
+    host, port, store, upsert_latency_ms=0, query_latency_ms=0, jitter_ms=0
+) -> ThreadingHTTPServer:
+    ThreadingHTTPServer.request_queue_size = 1024
+    server = ThreadingHTTPServer((host, port), EmulatorHandler)
+    server.daemon_threads = True
+    server.store = store
+    server.upsert_latency_ms = upsert_latency_ms
+    server.query_latency_ms = query_latency_ms
+    server.jitter_ms = jitter_ms
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Local emulator of the Pinecone /vectors/upsert and /query endpoints"
+    )
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Bind address")
+    parser.add_argument("--port", type=int, default=5081, help="Port to listen on")
+    parser.add_argument(
+        "--metric",
+        type=str,
+        choices=["cosine", "dotproduct", "euclidean"],
+        default="cosine",
+        help="Similarity metric of the index",
+    )
+    parser.add_argument(
+        "--dimension",
+        type=int,
+        default=None,
+        help="Vector dimension (default: taken from the first upsert)",
+    )
+    parser.add_argument(
+        "--upsert_latency_ms",
+        type=float,
+        default=0,
+        help="Artificial latency added to each upsert request",
+    )
+    parser.add_argument(
+        "--query_latency_ms",
+        type=float,
+        default=0,
+        help="Artificial latency added to each query request",
+    )
+    parser.add_argument(
+        "--jitter_ms",
+        type=float,
+        default=0,
+        help="Uniform random latency of 0 to jitter_ms added on top",
+    )
+    args = parser.parse_args()
+
+    server = create_server(
+        args.host,
+        args.port,
+        VectorStore(args.metric, args.dimension),
+        args.upsert_latency_ms,
+        args.query_latency_ms,
+        args.jitter_ms,
+    )
+    print(f"Pinecone emulator listening on http://{args.host}:{args.port} (metric={args.metric})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,112 @@
+import json
 import os
+import time
 from locust import FastHttpUser, task, between, events
-import numpy as np
-from locust_util.locust_util import save_stats_csv
+from locust_util.latency_breakdown import create_latency_breakdown_tracker
+from locust_util.locust_util import RecallTracker
+from locust_util.open_loop import (
+    create_arrival_schedule,
+    open_loop_wait_time,
+    post_with_schedule,
+    wait_for_schedule,
+)
+from locust_util.query_pool import (
+    QUERY_POOL_SIZE,
+    build_query_pool,
+    load_query_ground_truth,
+)
+from locust_util.results import TimeSeriesRecorder, save_results
 
-QUERY_VECTOR_SIZE = 1536
+QUERY_VECTOR_SIZE = int(os.getenv("QUERY_VECTOR_SIZE", 1536))
 TOP_K = int(os.getenv("TOP_K", 10))
+# データセットを指定すると先頭行をクエリに使う(未指定ならランダム生成)
+QUERY_DATASET_PATH = os.getenv("QUERY_DATASET_PATH")
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 NAMESPACE = "test_vectors"
+HEADERS = {"Api-Key": PINECONE_API_KEY, "Content-Type": "application/json"}
+# Pineconeはサーバー側の処理時間(ms)をこのヘッダーで返す
+SERVER_TIME_HEADER = "x-envoy-upstream-service-time"
 
 
-class PineconeLoadTest(FastHttpUser):
-    wait_time = between(0.5, 1)
-
-    @task
-    def search_test(self):
-        query_vector = np.random.rand(QUERY_VECTOR_SIZE).tolist()
-        payload = {
-            "vector": query_vector,
+def serialize_query(vector):
+    return json.dumps(
+        {
+            "vector": vector,
             "topK": TOP_K,
             "includeValues": False,
             "includeMetadata": False,
             "namespace": NAMESPACE,
         }
-        headers = {"Api-Key": PINECONE_API_KEY, "Content-Type": "application/json"}
-        self.client.post(f"/query", headers=headers, json=payload)
+    ).encode()
+
+
+# LATENCY_BREAKDOWN=true なら送受信・サーバー処理・デコードの時間を分けて記録する
+breakdown_tracker = create_latency_breakdown_tracker(events)
+if breakdown_tracker is not None:
+    serialize_query = breakdown_tracker.timed_serializer(serialize_query)
+
+# クエリはワーカーごとに一度だけ生成・シリアライズして使い回す
+QUERY_POOL = build_query_pool(serialize_query, QUERY_VECTOR_SIZE, QUERY_DATASET_PATH)
+# インデックスしたデータセットを指定するとrecall@kも計測する
+GROUND_TRUTH = load_query_ground_truth(QUERY_DATASET_PATH, TOP_K)
+recall_tracker = RecallTracker(TOP_K)
+recall_tracker.register(events)
+time_series_recorder = TimeSeriesRecorder()
+time_series_recorder.register(events)
+arrival_schedule = create_arrival_schedule(events)
+
+
+def track_recall(query_index, result_ids):
+    if GROUND_TRUTH is not None and query_index is not None:
+        recall_tracker.add(result_ids, GROUND_TRUTH[query_index])
+
+
+def read_response(response, sent, received):
+    """recallか内訳の計測に必要なときだけ応答のJSONをデコードして返す"""
+    if response.status_code != 200 or (GROUND_TRUTH is None and breakdown_tracker is None):
+        return None
+    data = response.json()
+    if breakdown_tracker is not None:
+        server_time = response.headers.get(SERVER_TIME_HEADER)
+        breakdown_tracker.add_request(
+            received - sent,
+            float(server_time) / 1000 if server_time else None,
+            time.perf_counter() - received,
+        )
+    return data
+
+
+class PineconeLoadTest(FastHttpUser):
+    wait_time = open_loop_wait_time(arrival_schedule, between(0.5, 1))
+
+    @task
+    def search_test(self):
+        scheduled = wait_for_schedule(arrival_schedule)
+        query_index, body = QUERY_POOL.next()
+        sent = time.perf_counter()
+        response = post_with_schedule(
+            self.client, "/query", scheduled, headers=HEADERS, data=body
+        )
+        data = read_response(response, sent, time.perf_counter())
+        if data is not None:
+            # データセットからインデックスした場合、IDは行番号
+            track_recall(query_index, [int(match["id"]) for match in data["matches"]])
 
 @events.quitting.add_listener
 def _(environment, **kw):
     filename = f"pinecone_top{TOP_K}"
-    save_stats_csv(environment, filename)
\ No newline at end of file
+    extra = {}
+    if arrival_schedule is not None:
+        filename = f"{filename}_{arrival_schedule.extra()['target_qps']:g}qps"
+        extra.update(arrival_schedule.extra())
+    if GROUND_TRUTH is not None:
+        extra[f"recall_at_{TOP_K}"] = recall_tracker.mean()
+    if breakdown_tracker is not None:
+        extra.update(breakdown_tracker.extra())
+    metadata = {
+        "top_k": TOP_K,
+        "namespace": NAMESPACE,
+        "query_dataset_path": QUERY_DATASET_PATH,
+        "query_pool_size": QUERY_POOL_SIZE,
+    }
+    save_results(environment, filename, time_series_recorder, extra, metadata)
\ No newline at end of file
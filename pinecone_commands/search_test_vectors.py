@@ -3,11 +3,13 @@ import numpy as np
 from pinecone import Pinecone, Vector
 import time
 
-api_key = os.getenv("PINECONE_API_KEY")
+# PINECONE_HOST を指定すると、そのホストのインデックス(ローカルのエミュレーターなど)に接続する
+pinecone_host = os.getenv("PINECONE_HOST", "")
+api_key = os.getenv("PINECONE_API_KEY", "local" if pinecone_host else None)
 pc = Pinecone(api_key=api_key)
 index_name = 'test-vectors'
 namespace='test_vectors'
-client = pc.Index(index_name)
+client = pc.Index(index_name, host=pinecone_host)
 top_k=10
 include_values=False
 include_metadata=False
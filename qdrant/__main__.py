@@ -1,17 +1,63 @@
 import argparse
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass, field
 import datetime
+import os
 
-from pydantic import BaseModel
+import numpy as np
+
+from dataset_util.dataset_util import load_vectors
+from dataset_util.results import (
+    BulkIndexResult,
+    client_cpu_time,
+    cpu_seconds_per_million_vectors,
+    summarize_latencies,
+)
+from dataset_util.payload import (
+    PAYLOAD_FIELDS,
+    PayloadConfig,
+    condition_for_selectivity,
+    condition_mask,
+)
+from qdrant.snapshot_cache import (
+    SnapshotCacheResult,
+    restore_collection_snapshot,
+    save_collection_snapshot,
+    snapshot_cache_key,
+)
+from dataset_util.ground_truth import load_ground_truth, mean_recall_at_k
+from qdrant.search_sweep import (
+    run_filtered_search_sweep,
+    run_search_sweep,
+    save_search_sweep_csv,
+)
 from qdrant.commands import (
+    build_filter,
+    build_search_params,
     bulk_index_by_random_vector,
+    bulk_index_by_random_vector_async,
     create_collection,
     delete_collection,
     get_collection_info,
+    LatencyBreakdown,
     search,
+    search_batch,
+    search_queries,
+    get_latency_breakdown,
+    rest_base_url,
+    rest_headers,
+    set_latency_breakdown,
+    set_transport,
+    set_upsert_serializer,
+    TRANSPORTS,
+    UPSERT_SERIALIZERS,
+    QUANTIZATIONS,
     bulk_index_from_csv,
-    wait_for_green_status,
+    bulk_index_from_dataset,
 )
+from qdrant.adaptive_ingest import bulk_index_adaptive
+from qdrant.process_ingest import bulk_index_multiprocess
+from qdrant.index_monitor import monitor_indexing, wait_for_green_status
+from qdrant.telemetry import TelemetryCollector, summarize_samples
 
 
 def str2bool(v):
@@ -33,10 +79,16 @@ class CreateCollectionParams:
     shard_number: int
     replica_number: int
     max_segment_size: int | None
+    quantization: str = "int8"
+    hnsw_m: int | None = None
+    hnsw_ef_construct: int | None = None
+    payload_indexes: bool = False
 
 
 def create_collection_function(params: CreateCollectionParams):
     print(f"on_disk: {params.on_disk}")
+    print(f"quantization: {params.quantization}")
+    print(f"hnsw_m: {params.hnsw_m}, hnsw_ef_construct: {params.hnsw_ef_construct}")
     create_collection(
         params.collection_name,
         params.vector_size,
@@ -44,6 +96,10 @@ def create_collection_function(params: CreateCollectionParams):
         params.shard_number,
         params.replica_number,
         params.max_segment_size,
+        params.quantization,
+        params.hnsw_m,
+        params.hnsw_ef_construct,
+        params.payload_indexes,
     )
 
 
@@ -53,61 +109,423 @@ class BulkIndexParams:
     csv_file_path: str
     vector_size: int
     index_threshold: int
-    index_num: int
+    index_num: int | None
     parallel_count: int
     wait_cluster_ready: bool
     interval: int = 5
     timeout: int = 600
+    csv_chunk_size: int | None = None
+    dataset_path: str | None = None
+    engine: str = "thread"
+    transport: str = "rest"
+    payload_config: PayloadConfig | None = None
+    target_latency: float = 1.0
+    max_index_threshold: int = 10000
+    max_parallel_count: int = 64
+    latency_breakdown: bool = False
+    telemetry: bool = False
+    telemetry_interval: float = 1.0
+    telemetry_container: str | None = None
+    serializer: str = "pydantic"
+    workers: int = 1
 
 
-class BulkIndexResult(BaseModel):
-    index_took_time: float
-    index_completed_time: datetime.datetime
-    optimize_took_time: float
-    optimize_completed_time: datetime.datetime
+def indexed_vector_count(params: BulkIndexParams) -> int | None:
+    if params.dataset_path is not None:
+        return len(load_vectors(params.dataset_path)[: params.index_num])
+    if params.csv_file_path is None:
+        return params.index_num
+    # CSVは読み終わるまで行数が分からない
+    return None
 
 
 def bulk_index_function(params: BulkIndexParams):
-    index_took_time = 0
-    if params.csv_file_path is None:
-        index_took_time = bulk_index_by_random_vector(
-            params.collection_name,
-            params.vector_size,
-            params.index_num,
-            params.index_threshold,
-            params.parallel_count,
+    set_transport(params.transport)
+    if params.engine == "async" and (
+        params.dataset_path is not None or params.csv_file_path is not None
+    ):
+        raise ValueError("--engine async supports random vectors only")
+    latency_breakdown = None
+    if params.latency_breakdown:
+        if params.engine != "thread":
+            raise ValueError("--latency_breakdown supports --engine thread")
+        latency_breakdown = LatencyBreakdown()
+        set_latency_breakdown(latency_breakdown)
+    if params.serializer != "pydantic" and params.engine != "thread":
+        raise ValueError("--serializer fast supports --engine thread")
+    set_upsert_serializer(params.serializer)
+    if params.workers > 1:
+        if params.engine != "thread":
+            raise ValueError("--workers supports --engine thread")
+        if params.dataset_path is None and params.csv_file_path is not None:
+            raise ValueError("--workers supports --dataset_path or random vectors")
+        if params.latency_breakdown:
+            raise ValueError("--latency_breakdown does not support --workers")
+    collector = None
+    if params.telemetry:
+        # インデックスとインデックス作成の完了待ちの間、サーバーのリソースを記録する
+        collector = TelemetryCollector(
+            rest_base_url(),
+            rest_headers(),
+            params.telemetry_interval,
+            params.telemetry_container,
         )
-    else:
-        index_took_time = bulk_index_from_csv(
-            params.collection_name, params.csv_file_path, params.index_threshold
-        )
-    index_completed_time = datetime.datetime.now()
-    optimezed_time = 0
-    if params.wait_cluster_ready:
-        optimezed_time = wait_for_green_status(
-            params.collection_name, params.timeout
-        )
-    optimeze_completed_time = datetime.datetime.now()
+        collector.start()
+    telemetry_path = None
+    try:
+        index_took_time = 0
+        cpu_start = client_cpu_time()
+        if params.engine == "adaptive":
+            if params.dataset_path is None and params.csv_file_path is not None:
+                raise ValueError("--engine adaptive supports --dataset_path or random vectors")
+            index_took_time = bulk_index_adaptive(
+                params.collection_name,
+                params.vector_size,
+                params.index_num,
+                params.index_threshold,
+                params.parallel_count,
+                params.dataset_path,
+                params.target_latency,
+                params.max_index_threshold,
+                params.max_parallel_count,
+                params.payload_config,
+            )
+        elif params.workers > 1:
+            index_took_time = bulk_index_multiprocess(
+                params.collection_name,
+                params.vector_size,
+                params.index_num,
+                params.index_threshold,
+                params.workers,
+                params.parallel_count,
+                params.dataset_path,
+                params.payload_config,
+                params.transport,
+                params.serializer,
+            )
+        elif params.dataset_path is not None:
+            index_took_time = bulk_index_from_dataset(
+                params.collection_name,
+                params.dataset_path,
+                params.index_threshold,
+                params.parallel_count,
+                params.index_num,
+                params.payload_config,
+            )
+        elif params.csv_file_path is None and params.engine == "async":
+            index_took_time = bulk_index_by_random_vector_async(
+                params.collection_name,
+                params.vector_size,
+                params.index_num,
+                params.index_threshold,
+                params.parallel_count,
+                params.payload_config,
+            )
+        elif params.csv_file_path is None:
+            index_took_time = bulk_index_by_random_vector(
+                params.collection_name,
+                params.vector_size,
+                params.index_num,
+                params.index_threshold,
+                params.parallel_count,
+                params.payload_config,
+            )
+        else:
+            index_took_time = bulk_index_from_csv(
+                params.collection_name,
+                params.csv_file_path,
+                params.index_threshold,
+                params.parallel_count,
+                params.csv_chunk_size,
+                params.payload_config,
+            )
+        client_cpu_seconds = client_cpu_time() - cpu_start
+        index_completed_time = datetime.datetime.now()
+        vector_count = indexed_vector_count(params)
+        optimezed_time = 0
+        index_monitor_result = None
+        if params.wait_cluster_ready:
+            index_monitor_result = monitor_indexing(
+                params.collection_name, params.timeout, params.interval
+            )
+            optimezed_time = index_monitor_result.took_time
+        optimeze_completed_time = datetime.datetime.now()
+    finally:
+        # 失敗した実行(インデックス中の例外や完了待ちのタイムアウト)でもテレメトリを止めて保存する
+        if collector is not None:
+            collector.stop()
+            telemetry_path = collector.save(f"bulk_index_{params.collection_name}")
 
     bulk_index_result = BulkIndexResult(
         index_took_time=index_took_time,
         index_completed_time=index_completed_time,
         optimize_took_time=optimezed_time,
         optimize_completed_time=optimeze_completed_time,
+        indexed_vectors_per_sec=index_monitor_result.indexed_vectors_per_sec
+        if index_monitor_result
+        else None,
+        index_progress_path=index_monitor_result.time_series_path
+        if index_monitor_result
+        else None,
+        latency_breakdown=latency_breakdown.summary() if latency_breakdown else None,
+        telemetry_path=telemetry_path,
+        telemetry_summary=summarize_samples(collector.samples) if collector else None,
+        client_cpu_seconds=client_cpu_seconds,
+        client_cpu_seconds_per_million_vectors=cpu_seconds_per_million_vectors(
+            client_cpu_seconds, vector_count
+        ),
     )
     print(bulk_index_result.model_dump_json(indent=4))
+    return bulk_index_result
+
+
+@dataclass
+class SearchParams:
+    collection_name: str
+    top_k: int
+    query_vector_size: int
+    output_response: bool
+    transport: str = "rest"
+    query_dataset_path: str | None = None
+    num_queries: int | None = None
+    dataset_path: str | None = None
+    index_num: int | None = None
+    hnsw_ef: int | None = None
+    exact: bool = False
+    rescore: bool | None = None
+    oversampling: float | None = None
+    concurrency: int = 1
+    batch_size: int = 1
+    filter_field: str | None = None
+    selectivity: float | None = None
+    payload_config: PayloadConfig = field(default_factory=PayloadConfig)
+    latency_breakdown: bool = False
 
 
-def search_function(collection_name, top_k, query_vector_size, output_response):
-    [res, response_time] = search(collection_name, top_k, query_vector_size)
+def toQdrantSearchParams(params: SearchParams):
+    return build_search_params(
+        hnsw_ef=params.hnsw_ef,
+        exact=params.exact,
+        rescore=params.rescore,
+        oversampling=params.oversampling,
+    )
+
+
+def filter_condition(params: SearchParams) -> dict | None:
+    if params.filter_field is None:
+        return None
+    return condition_for_selectivity(
+        params.filter_field, params.selectivity, params.payload_config
+    )
+
+
+def filter_ground_truth_mask(condition, payload_config, dataset_path, index_num):
+    """インデックスした行(ID = 行番号)のうちフィルターにマッチするもののマスク"""
+    num_base = len(load_vectors(dataset_path)[:index_num])
+    return condition_mask(np.arange(num_base), condition, payload_config)
+
+
+def search_function(params: SearchParams):
+    set_transport(params.transport)
+    if params.latency_breakdown:
+        if params.batch_size > 1:
+            raise ValueError("--latency_breakdown supports --batch_size 1")
+        set_latency_breakdown(LatencyBreakdown())
+    if params.query_dataset_path is not None:
+        search_query_set_function(params)
+        return
+    if params.batch_size > 1:
+        search_random_batch_function(params)
+        return
+    [res, response_time] = search(
+        params.collection_name,
+        params.top_k,
+        params.query_vector_size,
+        search_params=toQdrantSearchParams(params),
+        query_filter=build_filter(filter_condition(params)),
+    )
     print(f"Response time: {response_time} seconds")
-    print(f"Top k: {top_k}")
-    print(f"Collection name: {collection_name}")
-    print(f"Query vector size: {query_vector_size}")
-    if output_response:
+    print_latency_breakdown()
+    print(f"Filter: {filter_condition(params)}")
+    print(f"Search params: {toQdrantSearchParams(params)}")
+    print(f"Transport: {params.transport}")
+    print(f"Top k: {params.top_k}")
+    print(f"Collection name: {params.collection_name}")
+    print(f"Query vector size: {params.query_vector_size}")
+    if params.output_response:
+        print(res)
+
+
+def print_latency_breakdown():
+    latency_breakdown = get_latency_breakdown()
+    if latency_breakdown is not None:
+        print("Latency breakdown (seconds):")
+        for phase, stats in latency_breakdown.summary().items():
+            print(f"  {phase}: {stats}")
+
+
+def search_random_batch_function(params: SearchParams):
+    query_vectors = np.random.rand(params.batch_size, params.query_vector_size)
+    res, response_time = search_batch(
+        params.collection_name,
+        params.top_k,
+        query_vectors.tolist(),
+        toQdrantSearchParams(params),
+        build_filter(filter_condition(params)),
+    )
+    print(f"Response time: {response_time} seconds (batch_size={params.batch_size})")
+    print(f"Amortized response time per query: {response_time / params.batch_size} seconds")
+    print(f"Transport: {params.transport}")
+    print(f"Top k: {params.top_k}")
+    print(f"Collection name: {params.collection_name}")
+    print(f"Query vector size: {params.query_vector_size}")
+    if params.output_response:
         print(res)
 
 
+def search_query_set_function(params: SearchParams):
+    queries = np.asarray(load_vectors(params.query_dataset_path)[: params.num_queries])
+    condition = filter_condition(params)
+    results_ids, response_times, took_time = search_queries(
+        params.collection_name,
+        params.top_k,
+        queries,
+        toQdrantSearchParams(params),
+        params.concurrency,
+        params.batch_size,
+        build_filter(condition),
+    )
+    latencies = summarize_latencies(response_times)
+    print(f"Response time per request (seconds): {latencies}")
+    print(
+        f"Amortized response time per query: {latencies['mean'] / params.batch_size} seconds"
+        f" (batch_size={params.batch_size})"
+    )
+    print(f"QPS: {len(queries) / took_time} (concurrency={params.concurrency})")
+    print_latency_breakdown()
+    print(f"Search params: {toQdrantSearchParams(params)}")
+    print(f"Transport: {params.transport}")
+    print(f"Top k: {params.top_k}")
+    print(f"Collection name: {params.collection_name}")
+    print(f"Queries: {len(queries)}")
+    print(f"Filter: {condition}")
+    if params.dataset_path is not None:
+        filter_mask = None
+        if condition is not None:
+            filter_mask = filter_ground_truth_mask(
+                condition, params.payload_config, params.dataset_path, params.index_num
+            )
+            print(f"Actual selectivity: {filter_mask.mean()}")
+        # 厳密な近傍(ground truth)と比較してrecall@kを出す
+        ground_truth_ids = load_ground_truth(
+            params.dataset_path,
+            params.query_dataset_path,
+            params.top_k,
+            num_base=params.index_num,
+            num_queries=len(queries),
+            filter_mask=filter_mask,
+        )
+        recall = mean_recall_at_k(results_ids, ground_truth_ids, params.top_k)
+        print(f"Recall@{params.top_k}: {recall}")
+    if params.output_response:
+        print(results_ids)
+
+
+@dataclass
+class SearchSweepParams:
+    collection_name: str
+    top_k: int
+    query_dataset_path: str
+    dataset_path: str
+    hnsw_ef_values: list[int | None]
+    oversampling_values: list[float | None]
+    rescore: bool | None = None
+    num_queries: int | None = None
+    index_num: int | None = None
+    concurrency: int = 1
+    transport: str = "rest"
+    batch_size_values: list[int] = field(default_factory=lambda: [1])
+
+
+def search_sweep_function(params: SearchSweepParams):
+    set_transport(params.transport)
+    queries = np.asarray(load_vectors(params.query_dataset_path)[: params.num_queries])
+    ground_truth_ids = load_ground_truth(
+        params.dataset_path,
+        params.query_dataset_path,
+        params.top_k,
+        num_base=params.index_num,
+        num_queries=len(queries),
+    )
+    rows = run_search_sweep(
+        params.collection_name,
+        params.top_k,
+        queries,
+        ground_truth_ids,
+        params.hnsw_ef_values,
+        params.oversampling_values,
+        params.rescore,
+        params.concurrency,
+        params.batch_size_values,
+    )
+    print("Pareto frontier (recall vs p95):")
+    for row in rows:
+        if row["pareto"]:
+            print(row)
+    save_search_sweep_csv(rows, params.collection_name, params.top_k)
+
+
+@dataclass
+class FilteredSearchSweepParams:
+    collection_name: str
+    top_k: int
+    query_dataset_path: str
+    dataset_path: str
+    filter_field: str
+    selectivity_values: list[float]
+    payload_config: PayloadConfig = field(default_factory=PayloadConfig)
+    num_queries: int | None = None
+    index_num: int | None = None
+    concurrency: int = 1
+    transport: str = "rest"
+    hnsw_ef: int | None = None
+
+
+def filtered_search_sweep_function(params: FilteredSearchSweepParams):
+    set_transport(params.transport)
+    queries = np.asarray(load_vectors(params.query_dataset_path)[: params.num_queries])
+    num_base = len(load_vectors(params.dataset_path)[: params.index_num])
+    base_ids = np.arange(num_base)
+
+    def ground_truth(condition):
+        filter_mask = condition_mask(base_ids, condition, params.payload_config)
+        ground_truth_ids = load_ground_truth(
+            params.dataset_path,
+            params.query_dataset_path,
+            params.top_k,
+            num_base=num_base,
+            num_queries=len(queries),
+            filter_mask=filter_mask,
+        )
+        return ground_truth_ids, float(filter_mask.mean())
+
+    rows = run_filtered_search_sweep(
+        params.collection_name,
+        params.top_k,
+        queries,
+        ground_truth,
+        [
+            condition_for_selectivity(params.filter_field, selectivity, params.payload_config)
+            for selectivity in params.selectivity_values
+        ],
+        build_search_params(hnsw_ef=params.hnsw_ef),
+        params.concurrency,
+    )
+    save_search_sweep_csv(
+        rows, params.collection_name, params.top_k, f"filtered_search_sweep_{params.filter_field}"
+    )
+
+
 def delete_collection_functions(collection_name):
     delete_collection(collection_name)
 
@@ -122,17 +540,79 @@ class RecreateCollectionParams:
     collection_name: str
     create_collection_params: CreateCollectionParams
     bulk_index_params: BulkIndexParams
+    snapshot_cache: bool = False
+
+
+def collection_cache_key(
+    create_collection_params: CreateCollectionParams, bulk_index_params: BulkIndexParams
+) -> str | None:
+    """recreate とスイープで共通のスナップショットのキャッシュキー。
+
+    ランダムベクトルは実行ごとに中身が変わるのでキャッシュしない(None を返す)。
+    """
+    # bulk_index と同じく --dataset_path を --csv_file_path より優先する
+    source_path = bulk_index_params.dataset_path or bulk_index_params.csv_file_path
+    if source_path is None:
+        return None
+    collection_config = asdict(create_collection_params)
+    collection_config.pop("collection_name")
+    # --index_num の省略と全件の指定が同じキーになるよう、実際にインデックスする件数を使う
+    collection_config["index_num"] = indexed_vector_count(bulk_index_params)
+    if bulk_index_params.payload_config is not None:
+        collection_config["payload"] = asdict(bulk_index_params.payload_config)
+    return snapshot_cache_key(collection_config, source_path)
 
 
 def recreate_function(params: RecreateCollectionParams):
+    cache_key = collection_cache_key(
+        params.create_collection_params, params.bulk_index_params
+    )
+    snapshot_cache = params.snapshot_cache and cache_key is not None
+    if params.snapshot_cache and cache_key is None:
+        print("--snapshot_cache is ignored for random vectors (they differ on every run)")
+    if snapshot_cache:
+        # 同じデータセット・設定のスナップショットがあれば再インデックスせずに復元する
+        restore_took_time = restore_collection_snapshot(
+            params.collection_name, cache_key
+        )
+        if restore_took_time is not None:
+            wait_for_green_status(
+                params.collection_name,
+                params.bulk_index_params.timeout,
+                params.bulk_index_params.interval,
+            )
+            snapshot_cache_result = SnapshotCacheResult(
+                cache_key=cache_key,
+                cache_hit=True,
+                restore_took_time=restore_took_time,
+            )
+            print(snapshot_cache_result.model_dump_json(indent=4))
+            info_function(params.collection_name)
+            return
+
     delete_collection(params.collection_name)
     create_collection_function(params.create_collection_params)
     bulk_index_function(params.bulk_index_params)
+    if snapshot_cache:
+        if not params.bulk_index_params.wait_cluster_ready:
+            wait_for_green_status(
+                params.collection_name,
+                params.bulk_index_params.timeout,
+                params.bulk_index_params.interval,
+            )
+        snapshot_cache_result = SnapshotCacheResult(
+            cache_key=cache_key,
+            cache_hit=False,
+            save_took_time=save_collection_snapshot(params.collection_name, cache_key),
+        )
+        print(snapshot_cache_result.model_dump_json(indent=4))
     info_function(params.collection_name)
 
 
 DEFAULT_COLLECTION_NAME = "test_vectors"
 DEFAULT_VECTOR_SIZE = 1536
+# --index_num を省略したときのランダムベクトルの件数(データセットは全件をインデックスする)
+DEFAULT_RANDOM_INDEX_NUM = 10000
 
 
 def setup_create_collection_parser(subparsers, create_collection_command):
@@ -158,6 +638,10 @@ def toCreateCollectionParams(args):
         shard_number=args.shard_number,
         replica_number=args.replica_number,
         max_segment_size=args.max_segment_size,
+        quantization=args.quantization,
+        hnsw_m=args.hnsw_m,
+        hnsw_ef_construct=args.hnsw_ef_construct,
+        payload_indexes=args.payload_indexes,
     )
 
 
@@ -177,6 +661,28 @@ def setup_create_collection_args(create_collection_parser):
     create_collection_parser.add_argument(
         "--max_segment_size", type=int, default=None, help="Max segment size"
     )
+    create_collection_parser.add_argument(
+        "--quantization",
+        type=str,
+        choices=QUANTIZATIONS,
+        default="int8",
+        help="Quantization of the stored vectors",
+    )
+    create_collection_parser.add_argument(
+        "--hnsw_m", type=int, default=None, help="HNSW m (default: server default 16)"
+    )
+    create_collection_parser.add_argument(
+        "--hnsw_ef_construct",
+        type=int,
+        default=None,
+        help="HNSW ef_construct (default: server default 100)",
+    )
+    create_collection_parser.add_argument(
+        "--payload_indexes",
+        type=str2bool,
+        default=False,
+        help="Create payload indexes for the generated payload fields",
+    )
 
 
 def setup_bulk_index_parser(subparsers, bulk_index_command):
@@ -193,17 +699,37 @@ def setup_bulk_index_parser(subparsers, bulk_index_command):
     )
 
 
+def default_index_num(index_num, dataset_path):
+    if index_num is None and dataset_path is None:
+        return DEFAULT_RANDOM_INDEX_NUM
+    return index_num
+
+
 def toBulkIndexParams(args):
     return BulkIndexParams(
         collection_name=args.collection_name,
         csv_file_path=args.csv_file_path,
         vector_size=args.vector_size,
         index_threshold=args.index_threshold,
-        index_num=args.index_num,
+        index_num=default_index_num(args.index_num, args.dataset_path),
         parallel_count=args.parallel_count,
         wait_cluster_ready=args.wait_cluster_ready,
         interval=args.interval,
         timeout=args.timeout,
+        csv_chunk_size=args.csv_chunk_size,
+        dataset_path=args.dataset_path,
+        engine=args.engine,
+        transport=args.transport,
+        payload_config=toPayloadConfig(args) if args.payload else None,
+        target_latency=args.target_latency,
+        max_index_threshold=args.max_index_threshold,
+        max_parallel_count=args.max_parallel_count,
+        latency_breakdown=args.latency_breakdown,
+        telemetry=args.telemetry,
+        telemetry_interval=args.telemetry_interval,
+        telemetry_container=args.telemetry_container,
+        serializer=args.serializer,
+        workers=args.workers,
     )
 
 
@@ -213,14 +739,26 @@ def setup_bulk_index_args(bulk_index_parser):
         type=str,
         help="Path to the CSV file",
     )
+    bulk_index_parser.add_argument(
+        "--csv_chunk_size",
+        type=int,
+        default=None,
+        help="Number of CSV rows parsed at once (default: max(index_threshold * parallel_count, 10000))",
+    )
+    bulk_index_parser.add_argument(
+        "--dataset_path",
+        type=str,
+        default=None,
+        help="Path to the memory-mapped dataset file (.npy or .fvecs). Takes precedence over --csv_file_path",
+    )
     bulk_index_parser.add_argument(
         "--vector_size", type=int, default=DEFAULT_VECTOR_SIZE, help="Vector size"
     )
     bulk_index_parser.add_argument(
         "--index_num",
         type=int,
-        default=10000,
-        help="Number of vectors to index",
+        default=None,
+        help=f"Number of vectors to index (default: the whole --dataset_path, or {DEFAULT_RANDOM_INDEX_NUM} random vectors)",
     )
     bulk_index_parser.add_argument(
         "--index_threshold",
@@ -232,8 +770,60 @@ def setup_bulk_index_args(bulk_index_parser):
         "--parallel_count",
         type=int,
         default=2,
-        help="Number of parallel indexing",
+        help="Number of parallel indexing (max in-flight upserts for --engine async,"
+        " threads per process with --workers)",
+    )
+    bulk_index_parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of ingest processes, each upserting its own ID range with its own client"
+        " (random vectors or --dataset_path)",
+    )
+    bulk_index_parser.add_argument(
+        "--engine",
+        type=str,
+        choices=["thread", "async", "adaptive"],
+        default="thread",
+        help="Ingest engine: thread pool, asyncio with AsyncQdrantClient (random vectors),"
+        " or adaptive batch size and concurrency (random vectors or --dataset_path)",
+    )
+    bulk_index_parser.add_argument(
+        "--target_latency",
+        type=float,
+        default=1.0,
+        help="p95 upsert latency (seconds) the adaptive engine keeps under",
     )
+    bulk_index_parser.add_argument(
+        "--max_index_threshold",
+        type=int,
+        default=10000,
+        help="Upper bound of the batch size for --engine adaptive",
+    )
+    bulk_index_parser.add_argument(
+        "--max_parallel_count",
+        type=int,
+        default=64,
+        help="Upper bound of the in-flight upserts for --engine adaptive",
+    )
+    setup_transport_arg(bulk_index_parser)
+    bulk_index_parser.add_argument(
+        "--serializer",
+        type=str,
+        choices=UPSERT_SERIALIZERS,
+        default="pydantic",
+        help="Upsert body encoding: pydantic models via qdrant_client, or fast"
+        " (JSON / protobuf written straight from float32 arrays, --engine thread)",
+    )
+    setup_latency_breakdown_arg(bulk_index_parser)
+    setup_telemetry_args(bulk_index_parser)
+    bulk_index_parser.add_argument(
+        "--payload",
+        type=str2bool,
+        default=False,
+        help="Attach generated payloads (category, number, tenant_id) to every point",
+    )
+    setup_payload_args(bulk_index_parser)
     bulk_index_parser.add_argument(
         "--wait_cluster_ready",
         type=str2bool,
@@ -244,13 +834,74 @@ def setup_bulk_index_args(bulk_index_parser):
         "--interval",
         type=int,
         default=5,
-        help="Interval to check cluster status",
+        help="Max interval (seconds) to poll the indexing progress",
     )
     bulk_index_parser.add_argument(
         "--timeout",
         type=int,
         default=3600*10,
-        help="Timeout to check cluster status",
+        help="Timeout (seconds) to wait for the indexing to finish",
+    )
+
+
+def setup_payload_args(parser):
+    parser.add_argument(
+        "--category_cardinality",
+        type=int,
+        default=10,
+        help="Number of distinct values of the category payload",
+    )
+    parser.add_argument(
+        "--category_skew",
+        type=float,
+        default=0.0,
+        help="Zipf exponent of the category distribution (0 = uniform)",
+    )
+    parser.add_argument(
+        "--tenant_cardinality",
+        type=int,
+        default=100,
+        help="Number of distinct tenant_id values",
+    )
+    parser.add_argument(
+        "--tenant_skew",
+        type=float,
+        default=1.0,
+        help="Zipf exponent of the tenant_id distribution (0 = uniform)",
+    )
+    parser.add_argument(
+        "--payload_seed", type=int, default=0, help="Seed of the generated payloads"
+    )
+
+
+def toPayloadConfig(args):
+    return PayloadConfig(
+        category_cardinality=args.category_cardinality,
+        category_skew=args.category_skew,
+        tenant_cardinality=args.tenant_cardinality,
+        tenant_skew=args.tenant_skew,
+        seed=args.payload_seed,
+    )
+
+
+def setup_filter_field_arg(parser, required=False):
+    parser.add_argument(
+        "--filter_field",
+        type=str,
+        choices=PAYLOAD_FIELDS,
+        default=None,
+        required=required,
+        help="Payload field used for the filtered search",
+    )
+
+
+def setup_transport_arg(parser):
+    parser.add_argument(
+        "--transport",
+        type=str,
+        choices=TRANSPORTS,
+        default=os.getenv("QDRANT_TRANSPORT", "rest"),
+        help="Client transport: REST (JSON) or gRPC (protobuf)",
     )
 
 
@@ -271,12 +922,280 @@ def setup_search_parser(subparsers, search_command):
     search_parser.add_argument(
         "--query-vector-size", type=int, default=DEFAULT_VECTOR_SIZE, help="Vector size"
     )
-    search_parser.set_defaults(
-        func=lambda args: search_function(
-            args.collection_name,
-            args.top_k,
-            args.query_vector_size,
-            args.output_response,
+    search_parser.add_argument(
+        "--query_dataset_path",
+        type=str,
+        default=None,
+        help="Search every vector of this dataset file instead of one random vector",
+    )
+    search_parser.add_argument(
+        "--num_queries",
+        type=int,
+        default=None,
+        help="Number of queries taken from --query_dataset_path",
+    )
+    search_parser.add_argument(
+        "--dataset_path",
+        type=str,
+        default=None,
+        help="Indexed dataset file used to compute ground truth for recall@k",
+    )
+    search_parser.add_argument(
+        "--index_num",
+        type=int,
+        default=None,
+        help="Number of indexed vectors (first rows of --dataset_path)",
+    )
+    search_parser.add_argument(
+        "--hnsw_ef", type=int, default=None, help="HNSW ef used at search time"
+    )
+    search_parser.add_argument(
+        "--exact", type=str2bool, default=False, help="Exact (brute-force) search"
+    )
+    setup_quantization_search_args(search_parser)
+    search_parser.add_argument(
+        "--oversampling",
+        type=float,
+        default=None,
+        help="Oversampling factor of the quantized search",
+    )
+    search_parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        help="Number of concurrent queries for --query_dataset_path",
+    )
+    search_parser.add_argument(
+        "--batch_size",
+        type=int,
+        default=1,
+        help="Number of queries sent in one search_batch request",
+    )
+    setup_filter_field_arg(search_parser)
+    search_parser.add_argument(
+        "--selectivity",
+        type=float,
+        default=0.1,
+        help="Fraction of points matching the filter of --filter_field",
+    )
+    setup_payload_args(search_parser)
+    setup_transport_arg(search_parser)
+    setup_latency_breakdown_arg(search_parser)
+    search_parser.set_defaults(func=lambda args: search_function(toSearchParams(args)))
+
+
+def toSearchParams(args):
+    return SearchParams(
+        collection_name=args.collection_name,
+        top_k=args.top_k,
+        query_vector_size=args.query_vector_size,
+        output_response=args.output_response,
+        transport=args.transport,
+        query_dataset_path=args.query_dataset_path,
+        num_queries=args.num_queries,
+        dataset_path=args.dataset_path,
+        index_num=args.index_num,
+        hnsw_ef=args.hnsw_ef,
+        exact=args.exact,
+        rescore=args.rescore,
+        oversampling=args.oversampling,
+        concurrency=args.concurrency,
+        batch_size=args.batch_size,
+        filter_field=args.filter_field,
+        selectivity=args.selectivity,
+        payload_config=toPayloadConfig(args),
+        latency_breakdown=args.latency_breakdown,
+    )
+
+
+def setup_telemetry_args(parser):
+    parser.add_argument(
+        "--telemetry",
+        type=str2bool,
+        default=False,
+        help="Record server /metrics, /telemetry and CPU, RSS and IO while indexing",
+    )
+    parser.add_argument(
+        "--telemetry_interval",
+        type=float,
+        default=1.0,
+        help="Seconds between telemetry samples",
+    )
+    parser.add_argument(
+        "--telemetry_container",
+        type=str,
+        default=None,
+        help="Docker container of Qdrant to record CPU, memory and IO of",
+    )
+
+
+def setup_latency_breakdown_arg(parser):
+    parser.add_argument(
+        "--latency_breakdown",
+        type=str2bool,
+        default=False,
+        help="Time build, serialize, transport, server and deserialize phases of each request",
+    )
+
+
+def setup_quantization_search_args(parser):
+    parser.add_argument(
+        "--rescore",
+        type=str2bool,
+        default=None,
+        help="Rescore quantized results with the original vectors",
+    )
+
+
+def parse_optional_list(value, type):
+    """カンマ区切りの値をリストにする。"none" はNone(サーバーのデフォルト)として扱う"""
+    return [None if item == "none" else type(item) for item in value.split(",")]
+
+
+def setup_search_sweep_parser(subparsers, search_sweep_command):
+    search_sweep_parser = subparsers.add_parser(search_sweep_command)
+    search_sweep_parser.add_argument(
+        "--collection_name",
+        type=str,
+        default=DEFAULT_COLLECTION_NAME,
+        help="Collection name",
+    )
+    search_sweep_parser.add_argument(
+        "--top_k", type=int, default=10, help="Number of results to retrieve"
+    )
+    search_sweep_parser.add_argument(
+        "--query_dataset_path",
+        type=str,
+        required=True,
+        help="Dataset file of the fixed query set",
+    )
+    search_sweep_parser.add_argument(
+        "--num_queries",
+        type=int,
+        default=None,
+        help="Number of queries taken from --query_dataset_path",
+    )
+    search_sweep_parser.add_argument(
+        "--dataset_path",
+        type=str,
+        required=True,
+        help="Indexed dataset file used to compute ground truth for recall@k",
+    )
+    search_sweep_parser.add_argument(
+        "--index_num",
+        type=int,
+        default=None,
+        help="Number of indexed vectors (first rows of --dataset_path)",
+    )
+    search_sweep_parser.add_argument(
+        "--hnsw_ef",
+        type=lambda value: parse_optional_list(value, int),
+        default=[16, 32, 64, 128, 256, 512],
+        help="Comma separated hnsw_ef values (none = server default)",
+    )
+    search_sweep_parser.add_argument(
+        "--oversampling",
+        type=lambda value: parse_optional_list(value, float),
+        default=[None],
+        help="Comma separated oversampling values (none = no oversampling)",
+    )
+    setup_quantization_search_args(search_sweep_parser)
+    search_sweep_parser.add_argument(
+        "--concurrency", type=int, default=1, help="Number of concurrent requests"
+    )
+    search_sweep_parser.add_argument(
+        "--batch_size",
+        type=lambda value: [int(item) for item in value.split(",")],
+        default=[1],
+        help="Comma separated numbers of queries per search_batch request",
+    )
+    setup_transport_arg(search_sweep_parser)
+    search_sweep_parser.set_defaults(
+        func=lambda args: search_sweep_function(
+            SearchSweepParams(
+                collection_name=args.collection_name,
+                top_k=args.top_k,
+                query_dataset_path=args.query_dataset_path,
+                dataset_path=args.dataset_path,
+                hnsw_ef_values=args.hnsw_ef,
+                oversampling_values=args.oversampling,
+                rescore=args.rescore,
+                num_queries=args.num_queries,
+                index_num=args.index_num,
+                concurrency=args.concurrency,
+                transport=args.transport,
+                batch_size_values=args.batch_size,
+            )
+        )
+    )
+
+
+def setup_filtered_search_sweep_parser(subparsers, filtered_search_sweep_command):
+    sweep_parser = subparsers.add_parser(filtered_search_sweep_command)
+    sweep_parser.add_argument(
+        "--collection_name",
+        type=str,
+        default=DEFAULT_COLLECTION_NAME,
+        help="Collection name",
+    )
+    sweep_parser.add_argument(
+        "--top_k", type=int, default=10, help="Number of results to retrieve"
+    )
+    sweep_parser.add_argument(
+        "--query_dataset_path",
+        type=str,
+        required=True,
+        help="Dataset file of the fixed query set",
+    )
+    sweep_parser.add_argument(
+        "--num_queries",
+        type=int,
+        default=None,
+        help="Number of queries taken from --query_dataset_path",
+    )
+    sweep_parser.add_argument(
+        "--dataset_path",
+        type=str,
+        required=True,
+        help="Indexed dataset file used to compute filtered ground truth",
+    )
+    sweep_parser.add_argument(
+        "--index_num",
+        type=int,
+        default=None,
+        help="Number of indexed vectors (first rows of --dataset_path)",
+    )
+    setup_filter_field_arg(sweep_parser, required=True)
+    sweep_parser.add_argument(
+        "--selectivity",
+        type=lambda value: [float(item) for item in value.split(",")],
+        default=[0.001, 0.01, 0.1, 0.5, 1.0],
+        help="Comma separated fractions of points matching the filter",
+    )
+    setup_payload_args(sweep_parser)
+    sweep_parser.add_argument(
+        "--hnsw_ef", type=int, default=None, help="HNSW ef used at search time"
+    )
+    sweep_parser.add_argument(
+        "--concurrency", type=int, default=1, help="Number of concurrent requests"
+    )
+    setup_transport_arg(sweep_parser)
+    sweep_parser.set_defaults(
+        func=lambda args: filtered_search_sweep_function(
+            FilteredSearchSweepParams(
+                collection_name=args.collection_name,
+                top_k=args.top_k,
+                query_dataset_path=args.query_dataset_path,
+                dataset_path=args.dataset_path,
+                filter_field=args.filter_field,
+                selectivity_values=args.selectivity,
+                payload_config=toPayloadConfig(args),
+                num_queries=args.num_queries,
+                index_num=args.index_num,
+                concurrency=args.concurrency,
+                transport=args.transport,
+                hnsw_ef=args.hnsw_ef,
+            )
         )
     )
 
@@ -306,7 +1225,8 @@ def setup_info_parser(subparsers, info_command):
 
 
 def setup_recreate_collection_parser(subparsers, recreate_command):
-    recreate_parser = subparsers.add_parser(recreate_command)
+    # create_collection と bulk_index の両方にある --vector_size は1つにまとめる
+    recreate_parser = subparsers.add_parser(recreate_command, conflict_handler="resolve")
     recreate_parser.add_argument(
         "--collection_name",
         type=str,
@@ -315,12 +1235,19 @@ def setup_recreate_collection_parser(subparsers, recreate_command):
     )
     setup_create_collection_args(recreate_parser)
     setup_bulk_index_args(recreate_parser)
+    recreate_parser.add_argument(
+        "--snapshot_cache",
+        type=str2bool,
+        default=False,
+        help="Restore the collection from a cached snapshot, or save one after indexing",
+    )
     recreate_parser.set_defaults(
         func=lambda args: recreate_function(
             RecreateCollectionParams(
                 collection_name=args.collection_name,
                 create_collection_params=toCreateCollectionParams(args),
                 bulk_index_params=toBulkIndexParams(args),
+                snapshot_cache=args.snapshot_cache,
             )
         )
     )
@@ -333,9 +1260,11 @@ def main():
     setup_create_collection_parser(subparsers, "create_collection")
     setup_bulk_index_parser(subparsers, "bulk_index")
     setup_search_parser(subparsers, "search")
+    setup_search_sweep_parser(subparsers, "search_sweep")
+    setup_filtered_search_sweep_parser(subparsers, "filtered_search_sweep")
     setup_info_parser(subparsers, "info")
     setup_delete_collection_parser(subparsers, "delete_collection")
-    # setup_recreate_collection_parser(subparsers, "recreate")
+    setup_recreate_collection_parser(subparsers, "recreate")
 
     args = parser.parse_args()
     args.func(args)
@@ -0,0 +1,256 @@
+import collections
+import concurrent.futures
+import csv
+import datetime
+import os
+import time
+
+import numpy as np
+
+from dataset_util.dataset_util import load_vectors
+from dataset_util.results import UPSERT_MAX_RETRIES, backoff_delay, print_latency_stats
+from qdrant.commands import build_batch, get_client, update_index_threshold
+
+
+class AdaptiveController:
+    """upsertのレイテンシとエラーからバッチサイズと同時実行数を調整する(AIMD)。
+
+    ウィンドウ(同時実行数の2倍のupsert)ごとに判定し、
+    - エラーがあれば同時実行数とバッチサイズを半分にする
+    - p95 レイテンシが target_latency を超えたら同時実行数を半分にする
+    - それ以外は同時実行数を1増やし、レイテンシに余裕(target の半分未満)があれば
+      バッチサイズも初期値分だけ増やす
+    エラーなしで target 以内だったウィンドウのうち、最もスループットの高かった設定を記録する。
+    """
+
+    def __init__(
+        self,
+        batch_size,
+        concurrency,
+        target_latency,
+        max_batch_size,
+        max_concurrency,
+    ):
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.target_latency = target_latency
+        self.batch_step = batch_size
+        self.min_batch_size = max(1, batch_size // 16)
+        self.max_batch_size = max(max_batch_size, batch_size)
+        self.max_concurrency = max(max_concurrency, concurrency)
+        self.history = []
+        self.best = None
+        self._reset_window()
+
+    def _reset_window(self):
+        self.window_start = time.time()
+        self.window_rows = 0
+        self.window_latencies = []
+        self.window_errors = 0
+
+    def record(self, rows, latency):
+        self.window_rows += rows
+        self.window_latencies.append(latency)
+        if len(self.window_latencies) >= max(self.concurrency * 2, 4):
+            self._adjust()
+
+    def record_error(self):
+        self.window_errors += 1
+        self._adjust()
+
+    def _adjust(self):
+        elapsed = max(time.time() - self.window_start, 1e-9)
+        p95 = (
+            float(np.percentile(self.window_latencies, 95))
+            if self.window_latencies
+            else None
+        )
+        window = {
+            "time": time.time(),
+            "batch_size": self.batch_size,
+            "concurrency": self.concurrency,
+            "rows_per_sec": self.window_rows / elapsed,
+            "p95_latency": p95,
+            "errors": self.window_errors,
+        }
+        if self.window_errors:
+            window["action"] = "decrease (error)"
+            self.concurrency = max(1, self.concurrency // 2)
+            self.batch_size = max(self.min_batch_size, self.batch_size // 2)
+        elif p95 > self.target_latency:
+            window["action"] = "decrease (latency)"
+            self.concurrency = max(1, self.concurrency // 2)
+        else:
+            window["action"] = "increase"
+            if self.best is None or window["rows_per_sec"] > self.best["rows_per_sec"]:
+                self.best = window
+            self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+            if p95 < self.target_latency / 2:
+                self.batch_size = min(self.max_batch_size, self.batch_size + self.batch_step)
+        print(
+            f"adaptive ingest: {window['action']} batch_size={window['batch_size']} "
+            f"concurrency={window['concurrency']} rows/s={window['rows_per_sec']:.1f} "
+            f"p95={p95} errors={self.window_errors} -> "
+            f"batch_size={self.batch_size} concurrency={self.concurrency}"
+        )
+        self.history.append(window)
+        self._reset_window()
+
+
+def save_adaptive_ingest_csv(collection_name, history) -> str | None:
+    if not history:
+        return None
+    current_time = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+    os.makedirs("benchmark_results", exist_ok=True)
+    filepath = os.path.join(
+        "benchmark_results", f"adaptive_ingest_{collection_name}_{current_time}.csv"
+    )
+    with open(filepath, "w", newline="") as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=list(history[0].keys()))
+        writer.writeheader()
+        writer.writerows(history)
+    print(f"Adaptive ingest history saved to {filepath}")
+    return filepath
+
+
+def upsert_adaptively(
+    collection_name,
+    read_vectors,
+    index_number,
+    id_offset,
+    controller: AdaptiveController,
+    payload_config=None,
+) -> list[float]:
+    """read_vectors(開始位置, 件数) で読んだベクトルを、コントローラーの設定に従って並列にupsertする。
+
+    失敗したバッチは指数バックオフ(jitter付き)の後に再送し、UPSERT_MAX_RETRIES 回失敗したら例外を投げる。
+    """
+
+    def upsert_range(offset, count, retry_count):
+        if retry_count:
+            time.sleep(backoff_delay(retry_count))
+        vectors = read_vectors(offset, count)
+        ids = list(range(id_offset + offset, id_offset + offset + count))
+        batch = build_batch(ids, vectors, payload_config)
+        start = time.time()
+        get_client().upsert(points=batch, collection_name=collection_name)
+        return time.time() - start
+
+    latencies = []
+    pending = {}
+    retry_queue = collections.deque()
+    next_offset = 0
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=controller.max_concurrency
+    ) as executor:
+        try:
+            while next_offset < index_number or retry_queue or pending:
+                while len(pending) < controller.concurrency and (
+                    retry_queue or next_offset < index_number
+                ):
+                    if retry_queue:
+                        offset, count, retry_count = retry_queue.popleft()
+                    else:
+                        offset = next_offset
+                        count = min(controller.batch_size, index_number - next_offset)
+                        retry_count = 0
+                        next_offset += count
+                    future = executor.submit(upsert_range, offset, count, retry_count)
+                    pending[future] = (offset, count, retry_count)
+
+                done, _ = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    offset, count, retry_count = pending.pop(future)
+                    try:
+                        took_time = future.result()
+                    except Exception as e:
+                        print(f"Upsert failed: {e}")
+                        controller.record_error()
+                        if retry_count + 1 >= UPSERT_MAX_RETRIES:
+                            print(f"Upsert failed after {UPSERT_MAX_RETRIES} retries, so exit")
+                            raise
+                        retry_queue.append((offset, count, retry_count + 1))
+                        continue
+                    latencies.append(took_time)
+                    controller.record(count, took_time)
+                    print(
+                        f"index to qdrant up to {id_offset + offset + count} row took {took_time} seconds"
+                    )
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            raise
+    return latencies
+
+
+def bulk_index_adaptive(
+    collection_name,
+    vector_size,
+    index_number,
+    bulk_index_threshold,
+    parallel_count=1,
+    dataset_path=None,
+    target_latency=1.0,
+    max_index_threshold=10000,
+    max_parallel_count=64,
+    payload_config=None,
+) -> float:
+    """index_threshold / parallel_count を初期値として、AIMDで調整しながらインデックスする"""
+    start_time = time.time()
+    if dataset_path is not None:
+        vectors = load_vectors(dataset_path)
+        index_number = len(vectors[:index_number])
+        print(f"bulk_index_adaptive: {dataset_path} shape={vectors.shape}")
+
+        def read_vectors(offset, count):
+            return vectors[offset : offset + count]
+
+        # データセットからインデックスする場合、IDは行番号
+        id_offset = 0
+    else:
+
+        def read_vectors(offset, count):
+            return np.random.rand(count, vector_size)
+
+        id_offset = 1
+
+    controller = AdaptiveController(
+        bulk_index_threshold,
+        parallel_count,
+        target_latency,
+        max_index_threshold,
+        max_parallel_count,
+    )
+    # 一時的にindexをdisableする
+    update_index_threshold(collection_name, 0)
+
+    latencies = upsert_adaptively(
+        collection_name,
+        read_vectors,
+        index_number,
+        id_offset,
+        controller,
+        payload_config,
+    )
+
+    # indexを有効化する
+    update_index_threshold(collection_name, 20000)
+
+    took_time = time.time() - start_time
+    print_latency_stats("adaptive engine", latencies)
+    if controller.best is not None:
+        print(
+            f"adaptive ingest converged: best batch_size={controller.best['batch_size']} "
+            f"concurrency={controller.best['concurrency']} "
+            f"rows/s={controller.best['rows_per_sec']:.1f} "
+            f"p95={controller.best['p95_latency']} (target_latency={target_latency})"
+        )
+    print(
+        f"adaptive ingest final: batch_size={controller.batch_size} "
+        f"concurrency={controller.concurrency}"
+    )
+    save_adaptive_ingest_csv(collection_name, controller.history)
+    print(f"bulk_index_adaptive took {took_time} seconds ({index_number / took_time:.1f} rows/s)")
+    return took_time
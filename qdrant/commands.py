@@ -1,19 +1,81 @@
+import asyncio
+import collections
+import json
 import os
+import queue
+import threading
+from urllib.parse import urlparse
+import grpc
+import httpx
 import numpy as np
 import time
-import csv
-from qdrant_client import QdrantClient, models
+from qdrant_client import AsyncQdrantClient, QdrantClient, models
+from qdrant_client import grpc as qdrant_grpc
+from qdrant_client.conversions.conversion import GrpcToRest, RestToGrpc
 from qdrant_client.http.models import PointStruct
 import time
 
+from dataset_util.dataset_util import iter_batches, load_vectors, read_csv_chunks
+from dataset_util.payload import PAYLOAD_FIELDS, build_payloads
+from dataset_util.results import (
+    UPSERT_MAX_RETRIES,
+    backoff_delay,
+    print_latency_stats,
+    summarize_latencies,
+)
+from qdrant.encoding import encode_grpc_upsert, encode_rest_upsert
+
+TRANSPORTS = ("rest", "grpc")
+transport = os.getenv("QDRANT_TRANSPORT", "rest")
+
+
+def client_options() -> dict:
+    # gRPC(protobuf)はREST(JSON)よりfloatのエンコード/デコードが軽い
+    options = {"prefer_grpc": transport == "grpc"}
+    # local
+    if os.getenv("QDRANT_HOST") and os.getenv("QDRANT_API_KEY"):
+        return {
+            **options,
+            "url": os.getenv("QDRANT_HOST"),
+            "api_key": os.getenv("QDRANT_API_KEY"),
+        }
+    return {**options, "host": "localhost", "port": 6333, "grpc_port": 6334}
+
+
+def rest_base_url() -> str:
+    options = client_options()
+    if "url" in options:
+        return options["url"].rstrip("/")
+    return f"http://{options['host']}:{options['port']}"
+
+
+def rest_headers() -> dict:
+    api_key = client_options().get("api_key")
+    return {"Api-Key": api_key} if api_key else {}
+
+
+def create_async_client() -> AsyncQdrantClient:
+    return AsyncQdrantClient(**client_options())
+
+
+def set_transport(new_transport):
+    global client, transport
+    if new_transport not in TRANSPORTS:
+        raise ValueError(f"Unknown transport: {new_transport}")
+    if new_transport == transport:
+        return
+    transport = new_transport
+    client = QdrantClient(**client_options())
+    print(f"Qdrant client transport: {transport}")
+
+
 # Qdrantクライアントの初期化
-# local
-client = QdrantClient(host="localhost", port=6333)
-if os.getenv("QDRANT_HOST") and os.getenv("QDRANT_API_KEY"):
-    client = QdrantClient(
-        url=os.getenv("QDRANT_HOST"),
-        api_key=os.getenv("QDRANT_API_KEY"),
-    )
+client = QdrantClient(**client_options())
+
+
+def get_client() -> QdrantClient:
+    # set_transport で差し替えられた後のクライアントを返す
+    return client
 
 
 def get_collection_info(collection_name):
@@ -22,6 +84,25 @@ def get_collection_info(collection_name):
     return collection_info
 
 
+QUANTIZATIONS = ("none", "int8", "binary")
+
+
+def quantization_config(quantization: str):
+    if quantization == "none":
+        return None
+    if quantization == "int8":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8, quantile=0.99, always_ram=True
+            )
+        )
+    if quantization == "binary":
+        return models.BinaryQuantization(
+            binary=models.BinaryQuantizationConfig(always_ram=True)
+        )
+    raise ValueError(f"Unknown quantization: {quantization}")
+
+
 def create_collection(
     collection_name: str,
     vector_size: int,
@@ -29,11 +110,17 @@ def create_collection(
     shard_number: int,
     replica_number: int,
     max_segment_size: int | None,
+    quantization: str = "int8",
+    hnsw_m: int | None = None,
+    hnsw_ef_construct: int | None = None,
+    payload_indexes: bool = False,
 ):
     optimzers_config = models.OptimizersConfigDiff()
     if max_segment_size is not None:
         optimzers_config.max_segment_size = max_segment_size
     # optimzers_config.default_segment_number = 8
+    # Noneの項目はQdrantのデフォルト値(m=16, ef_construct=100)になる
+    hnsw_config = models.HnswConfigDiff(m=hnsw_m, ef_construct=hnsw_ef_construct)
     # コレクションの作成
     client.create_collection(
         collection_name=collection_name,
@@ -43,29 +130,279 @@ def create_collection(
             size=vector_size, distance=models.Distance.COSINE, on_disk=on_disk
         ),
         optimizers_config=optimzers_config,
-        quantization_config=models.ScalarQuantization(
-            scalar=models.ScalarQuantizationConfig(
-                type=models.ScalarType.INT8, quantile=0.99, always_ram=True
-            )
-        ),
+        hnsw_config=hnsw_config,
+        quantization_config=quantization_config(quantization),
     )
     print(
-        f"Collection '{collection_name}' shard_number={shard_number} created successfully."
+        f"Collection '{collection_name}' shard_number={shard_number} hnsw_config={hnsw_config} created successfully."
     )
+    if payload_indexes:
+        create_payload_indexes(collection_name)
+
+
+PAYLOAD_SCHEMAS = {
+    "category": models.PayloadSchemaType.KEYWORD,
+    "number": models.PayloadSchemaType.FLOAT,
+    "tenant_id": models.PayloadSchemaType.KEYWORD,
+}
+
+
+def create_payload_indexes(collection_name):
+    """生成ペイロードの各フィールドにインデックスを作り、フィルター付きHNSW検索を有効にする"""
+    for field in PAYLOAD_FIELDS:
+        client.create_payload_index(
+            collection_name=collection_name,
+            field_name=field,
+            field_schema=PAYLOAD_SCHEMAS[field],
+        )
+        print(f"payload index '{field}' ({PAYLOAD_SCHEMAS[field]}) created")
 
 
 def import_collection_by_file(collection_name: str, file_path: str):
     client.upload_collection(collection_name=collection_name, location=file_path)
 
 
-def search(collection_name, top_k, query_vector_size):
-    query_vector = np.random.rand(query_vector_size).tolist()
+def build_search_params(
+    hnsw_ef: int | None = None,
+    exact: bool = False,
+    rescore: bool | None = None,
+    oversampling: float | None = None,
+) -> models.SearchParams | None:
+    if hnsw_ef is None and not exact and rescore is None and oversampling is None:
+        return None
+    quantization = None
+    if rescore is not None or oversampling is not None:
+        quantization = models.QuantizationSearchParams(
+            rescore=rescore, oversampling=oversampling
+        )
+    return models.SearchParams(hnsw_ef=hnsw_ef, exact=exact, quantization=quantization)
+
+
+def build_filter(condition: dict | None) -> models.Filter | None:
+    """dataset_util.payload.condition_for_selectivity の条件をQdrantのフィルターにする"""
+    if condition is None:
+        return None
+    if "lt" in condition:
+        field_condition = models.FieldCondition(
+            key=condition["field"], range=models.Range(lt=condition["lt"])
+        )
+    else:
+        field_condition = models.FieldCondition(
+            key=condition["field"], match=models.MatchAny(any=condition["any"])
+        )
+    return models.Filter(must=[field_condition])
+
+
+LATENCY_PHASES = ("build", "serialize", "transport", "server", "deserialize")
+
+
+class LatencyBreakdown:
+    """リクエストごとのフェーズ別の時間(秒)を集める。スレッドから add してよい。
+
+    build: SearchRequest / PointStruct などのモデルの構築(gRPCではprotobufへの変換も含む)
+    serialize: JSON / protobuf へのエンコード
+    transport: 送信から応答を受け取り終わるまで(ネットワークとサーバーの処理)
+    server: サーバーが応答に含める処理時間(REST・gRPCの time)
+    deserialize: 応答のデコードとモデルへの変換
+    transport_minus_server: transport からサーバーの処理時間を引いた、ネットワークやキューイングの時間
+    """
+
+    def __init__(self):
+        self.samples = collections.defaultdict(list)
+        self.lock = threading.Lock()
+
+    def add(self, phases: dict):
+        with self.lock:
+            for phase, value in phases.items():
+                self.samples[phase].append(value)
+
+    def summary(self) -> dict:
+        with self.lock:
+            return {
+                phase: summarize_latencies(self.samples[phase])
+                for phase in (*LATENCY_PHASES, "transport_minus_server", "total")
+            }
+
+
+# set_latency_breakdown で記録先を設定すると、search と upsert をクライアントライブラリの代わりに
+# フェーズごとに計測しながら自前で送る(送る内容はクライアントライブラリと同じ)
+latency_breakdown: LatencyBreakdown | None = None
+# クライアントライブラリを通さずにバイト列を送るためのHTTPクライアントとgRPCチャネル
+raw_lock = threading.Lock()
+raw_http_client = None
+raw_grpc_channel = None
+
+
+def set_latency_breakdown(breakdown: LatencyBreakdown | None):
+    global latency_breakdown
+    latency_breakdown = breakdown
+
+
+def get_latency_breakdown() -> LatencyBreakdown | None:
+    return latency_breakdown
+
+
+def get_raw_http_client() -> httpx.Client:
+    global raw_http_client
+    with raw_lock:
+        if raw_http_client is None:
+            raw_http_client = httpx.Client(
+                base_url=rest_base_url(),
+                headers={**rest_headers(), "Content-Type": "application/json"},
+                timeout=None,
+            )
+        return raw_http_client
+
+
+def get_raw_grpc_channel():
+    global raw_grpc_channel
+    with raw_lock:
+        if raw_grpc_channel is None:
+            options = client_options()
+            if "url" in options:
+                url = urlparse(options["url"])
+                target = f"{url.hostname}:6334"
+                if url.scheme == "https":
+                    raw_grpc_channel = grpc.secure_channel(
+                        target, grpc.ssl_channel_credentials()
+                    )
+                else:
+                    raw_grpc_channel = grpc.insecure_channel(target)
+            else:
+                raw_grpc_channel = grpc.insecure_channel(
+                    f"{options['host']}:{options['grpc_port']}"
+                )
+        return raw_grpc_channel
+
+
+def send_raw(body: bytes, rest_method, rest_path, grpc_method) -> bytes:
+    """シリアライズ済みのバイト列をそのまま送り、応答もバイト列で受け取る"""
+    if transport == "grpc":
+        api_key = client_options().get("api_key")
+        return get_raw_grpc_channel().unary_unary(
+            f"/qdrant.Points/{grpc_method}",
+            request_serializer=None,
+            response_deserializer=None,
+        )(body, metadata=[("api-key", api_key)] if api_key else None)
+    response = get_raw_http_client().request(rest_method, rest_path, content=body)
+    response.raise_for_status()
+    return response.content
+
+
+def send_with_breakdown(start, request, rest_method, rest_path, grpc_method, grpc_response):
+    """構築済みのリクエストを送り、(結果, フェーズ別の時間) を返す。start は構築を始めた時刻"""
+    built = time.perf_counter()
+    if transport == "grpc":
+        body = request.SerializeToString()
+    else:
+        body = request.model_dump_json(by_alias=True, exclude_none=True).encode()
+    serialized = time.perf_counter()
+    content = send_raw(body, rest_method, rest_path, grpc_method)
+    received = time.perf_counter()
+    if transport == "grpc":
+        response = grpc_response.FromString(content)
+        result, server_time = response.result, response.time
+    else:
+        response = json.loads(content)
+        result, server_time = response["result"], response["time"]
+    return result, {
+        "build": built - start,
+        "serialize": serialized - built,
+        "transport": received - serialized,
+        "server": server_time,
+        "transport_minus_server": received - serialized - server_time,
+        "deserialize": time.perf_counter() - received,
+    }
+
+
+def search_with_breakdown(
+    collection_name, top_k, query_vector, search_params=None, query_filter=None
+):
+    start = time.perf_counter()
+    # client.search と同じリクエストにする(既定でペイロードを返すので応答の大きさも揃う)
+    request = models.SearchRequest(
+        vector=query_vector,
+        filter=query_filter,
+        params=search_params,
+        limit=top_k,
+        offset=0,
+        with_payload=True,
+    )
+    if transport == "grpc":
+        request = RestToGrpc.convert_search_request(request, collection_name)
+    result, phases = send_with_breakdown(
+        start,
+        request,
+        "POST",
+        f"/collections/{collection_name}/points/search",
+        "Search",
+        qdrant_grpc.SearchResponse,
+    )
+    # デコードに含めるため、結果をクライアントライブラリと同じモデルに変換してから時間を測る
+    deserialize_start = time.perf_counter()
+    if transport == "grpc":
+        points = [GrpcToRest.convert_scored_point(point) for point in result]
+    else:
+        points = [models.ScoredPoint.model_validate(point) for point in result]
+    phases["deserialize"] += time.perf_counter() - deserialize_start
+    phases["total"] = time.perf_counter() - start
+    latency_breakdown.add(phases)
+    return points, phases["total"]
+
+
+def upsert_with_breakdown(points, collection_name, build_time=0.0) -> float:
+    """models.Batch または PointStruct のリストをupsertする。build_time は呼び出し側での構築時間"""
+    start = time.perf_counter() - build_time
+    if isinstance(points, models.Batch):
+        request = models.PointsBatch(batch=points)
+    else:
+        request = models.PointsList(points=points)
+    if transport == "grpc":
+        request = qdrant_grpc.UpsertPoints(
+            collection_name=collection_name,
+            wait=True,
+            points=RestToGrpc.convert_point_insert_operation(request),
+        )
+    result, phases = send_with_breakdown(
+        start,
+        request,
+        "PUT",
+        f"/collections/{collection_name}/points?wait=true",
+        "Upsert",
+        qdrant_grpc.PointsOperationResponse,
+    )
+    deserialize_start = time.perf_counter()
+    if transport == "grpc":
+        GrpcToRest.convert_update_result(result)
+    else:
+        models.UpdateResult.model_validate(result)
+    phases["deserialize"] += time.perf_counter() - deserialize_start
+    phases["total"] = time.perf_counter() - start
+    latency_breakdown.add(phases)
+    return phases["total"]
+
+
+def search(
+    collection_name,
+    top_k,
+    query_vector_size,
+    query_vector=None,
+    search_params=None,
+    query_filter=None,
+):
+    if query_vector is None:
+        query_vector = np.random.rand(query_vector_size).tolist()
+    if latency_breakdown is not None:
+        return search_with_breakdown(
+            collection_name, top_k, query_vector, search_params, query_filter
+        )
     # 検索の実行と応答時間の計測
     start_time = time.time()
     response = client.search(
         collection_name=collection_name,
         query_vector=query_vector,
-        query_filter=None,
+        query_filter=query_filter,
+        search_params=search_params,
         limit=top_k,
         offset=0,
     )
@@ -77,6 +414,63 @@ def search(collection_name, top_k, query_vector_size):
     return response, response_time
 
 
+def search_batch(
+    collection_name, top_k, query_vectors, search_params=None, query_filter=None
+):
+    """複数のクエリを1リクエスト(search_batch)で検索し、クエリごとの結果とリクエストの応答時間を返す"""
+    requests = [
+        models.SearchRequest(
+            vector=query_vector, filter=query_filter, params=search_params, limit=top_k
+        )
+        for query_vector in query_vectors
+    ]
+    start_time = time.time()
+    responses = client.search_batch(collection_name=collection_name, requests=requests)
+    end_time = time.time()
+    return responses, end_time - start_time
+
+
+def search_queries(
+    collection_name,
+    top_k,
+    queries,
+    search_params=None,
+    concurrency=1,
+    batch_size=1,
+    query_filter=None,
+):
+    """クエリセットを検索し、各クエリの結果ID・リクエストごとの応答時間と全体の経過時間を返す。
+
+    batch_size > 1 の場合は batch_size 件ずつ search_batch で送るので、
+    応答時間の件数は len(queries) / batch_size になる。
+    """
+
+    def search_query(query_vectors):
+        if batch_size == 1:
+            response, response_time = search(
+                collection_name,
+                top_k,
+                query_vectors.shape[1],
+                query_vectors[0].tolist(),
+                search_params,
+                query_filter,
+            )
+            return [[point.id for point in response]], response_time
+        responses, response_time = search_batch(
+            collection_name, top_k, query_vectors.tolist(), search_params, query_filter
+        )
+        return [[point.id for point in response] for response in responses], response_time
+
+    batches = [queries[i : i + batch_size] for i in range(0, len(queries), batch_size)]
+    start_time = time.time()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(search_query, batches))
+    took_time = time.time() - start_time
+    results_ids = [ids for batch_ids, _ in results for ids in batch_ids]
+    response_times = [response_time for _, response_time in results]
+    return results_ids, response_times, took_time
+
+
 def update_index_threshold(collection_name, threshold):
     start = time.time()
     client.update_collection(
@@ -87,45 +481,240 @@ def update_index_threshold(collection_name, threshold):
     print(f"update qdrant index threshold to {threshold}kb took {end-start} seconds")
 
 
-def bulk_index_from_csv(collection_name, csv_file_path, bulk_index_threshold):
+UPSERT_SERIALIZERS = ("pydantic", "fast")
+# pydantic: クライアントライブラリでmodels.Batchを送る
+# fast: float32の配列から直接JSON / protobufのボディを作って送る(qdrant.encoding)
+upsert_serializer = "pydantic"
+
+
+def set_upsert_serializer(serializer):
+    global upsert_serializer
+    if serializer not in UPSERT_SERIALIZERS:
+        raise ValueError(f"Unknown upsert serializer: {serializer}")
+    upsert_serializer = serializer
+
+
+def build_batch(ids, vectors, payload_config=None) -> models.Batch:
+    payloads = None
+    if payload_config is not None:
+        payloads = build_payloads(ids, payload_config)
+    return models.Batch(ids=ids, vectors=vectors.tolist(), payloads=payloads)
+
+
+def upsert_batch(ids, vectors, collection_name, payload_config=None):
+    if upsert_serializer == "fast":
+        return upsert_fast(ids, vectors, collection_name, payload_config)
+    start = time.perf_counter()
+    batch = build_batch(ids, vectors, payload_config)
+    return upsert_with_retry(batch, collection_name, time.perf_counter() - start)
+
+
+def retry_upsert(send):
+    retry_count = 0
+    while retry_count < UPSERT_MAX_RETRIES:
+        try:
+            return send()
+        except Exception as e:
+            print(f"Upsert failed: {e}")
+            retry_count += 1
+            if retry_count == UPSERT_MAX_RETRIES:
+                print(f"Upsert failed after {UPSERT_MAX_RETRIES} retries, so exit")
+                raise e
+            time.sleep(backoff_delay(retry_count))
+
+
+def upsert_with_retry(points, collection_name, build_time=0.0) -> float:
+    def send():
+        if latency_breakdown is not None:
+            return upsert_with_breakdown(points, collection_name, build_time)
+        start = time.time()
+        client.upsert(points=points, collection_name=collection_name)
+        return time.time() - start
+
+    return retry_upsert(send)
+
+
+def upsert_fast(ids, vectors, collection_name, payload_config=None) -> float:
+    """ベクトルをPythonのfloatのリストやPointStructにせず、float32の配列から直接ボディを作ってupsertする。
+
+    ボディは1回だけエンコードし、リトライでは同じバイト列を送り直す。
+    返す時間はエンコードと(最後の)送信の合計で、pydanticの経路の client.upsert の時間に対応する。
+    """
+    start = time.perf_counter()
+    payloads = None
+    if payload_config is not None:
+        payloads = build_payloads(ids, payload_config)
+    built = time.perf_counter()
+    if transport == "grpc":
+        body = encode_grpc_upsert(collection_name, ids, vectors, payloads)
+    else:
+        body = encode_rest_upsert(ids, vectors, payloads)
+    serialized = time.perf_counter()
+
+    def send():
+        sent = time.perf_counter()
+        content = send_raw(
+            body,
+            "PUT",
+            f"/collections/{collection_name}/points?wait=true",
+            "Upsert",
+        )
+        received = time.perf_counter()
+        if transport == "grpc":
+            server_time = qdrant_grpc.PointsOperationResponse.FromString(content).time
+        else:
+            server_time = json.loads(content)["time"]
+        return sent, received, server_time
+
+    sent, received, server_time = retry_upsert(send)
+    finished = time.perf_counter()
+    if latency_breakdown is not None:
+        latency_breakdown.add(
+            {
+                "build": built - start,
+                "serialize": serialized - built,
+                "transport": received - sent,
+                "server": server_time,
+                "transport_minus_server": received - sent - server_time,
+                "deserialize": finished - received,
+                "total": finished - start,
+            }
+        )
+    return (serialized - start) + (finished - sent)
+
+
+def upsert_batches_in_parallel(
+    collection_name, batches, parallel_count, payload_config=None
+) -> dict:
+    """(開始ID, ベクトル配列) のイテレータを上限付きキュー経由で並列にupsertする"""
+    batch_queue = queue.Queue(maxsize=parallel_count * 2)
+    stop_event = threading.Event()
+    errors = []
+    upload_lock = threading.Lock()
+    upload_stats = {"rows": 0, "took_time": 0.0}
+
+    def upsert_worker():
+        while True:
+            item = batch_queue.get()
+            if item is None:
+                return
+            if stop_event.is_set():
+                continue
+            start_id, vectors = item
+            try:
+                took_time = upsert_batch(
+                    list(range(start_id, start_id + len(vectors))),
+                    vectors,
+                    collection_name,
+                    payload_config,
+                )
+            except Exception as e:
+                errors.append(e)
+                stop_event.set()
+                continue
+            with upload_lock:
+                upload_stats["rows"] += len(vectors)
+                upload_stats["took_time"] += took_time
+            print(
+                f"index to qdrant up to {start_id + len(vectors)} row took {took_time} seconds"
+            )
+
+    workers = [
+        threading.Thread(target=upsert_worker, daemon=True)
+        for _ in range(parallel_count)
+    ]
+    for worker in workers:
+        worker.start()
+
+    upload_start_time = time.time()
+    read_took_time = 0.0
+    read_rows = 0
+    while not stop_event.is_set():
+        read_start = time.time()
+        item = next(batches, None)
+        read_took_time += time.time() - read_start
+        if item is None:
+            break
+        batch_queue.put(item)
+        read_rows += len(item[1])
+
+    for _ in workers:
+        batch_queue.put(None)
+    for worker in workers:
+        worker.join()
+    upload_took_time = time.time() - upload_start_time
+
+    if errors:
+        raise errors[0]
+
+    print(
+        f"read {read_rows} rows took {read_took_time} seconds "
+        f"({read_rows / max(read_took_time, 1e-9):.1f} rows/s)"
+    )
+    print(
+        f"upload {upload_stats['rows']} rows took {upload_took_time} seconds "
+        f"({upload_stats['rows'] / max(upload_took_time, 1e-9):.1f} rows/s, "
+        f"parallel_count={parallel_count})"
+    )
+    return {
+        "rows": upload_stats["rows"],
+        "read_took_time": read_took_time,
+        "upload_took_time": upload_took_time,
+    }
+
+
+def bulk_index_from_csv(
+    collection_name,
+    csv_file_path,
+    bulk_index_threshold,
+    parallel_count=1,
+    chunk_size=None,
+    payload_config=None,
+) -> float:
     start_time = time.time()
+    if chunk_size is None:
+        chunk_size = max(bulk_index_threshold * parallel_count, 10000)
     # 一時的にindexをdisableする
     update_index_threshold(collection_name, 0)
 
-    with open(csv_file_path, mode="r") as csv_file:
-        csv_reader = csv.reader(csv_file)
-        points = []
-        for i, row in enumerate(csv_reader):
-            # ここで、CSVの各行からベクターを読み込む
-            vector = [
-                float(x) for x in row
-            ]  # CSVの行がベクターの数値データであると仮定
-            point = PointStruct(id=i, vector=vector, payload={})
-            points.append(point)
-
-            if len(points) >= bulk_index_threshold:
-                retry_count = 0
-                while retry_count < 3:
-                    try:
-                        start = time.time()
-                        client.upsert(points=points, collection_name=collection_name)
-                        end = time.time()
-                        points.clear()
-                        print(
-                            f"index to qdrant up to {i+1} row took {end-start} seconds"
-                        )
-                        break
-                    except Exception as e:
-                        print(f"Upsert failed: {e}")
-                        retry_count += 1
-                        time.sleep(1)  # Wait for 1 second before retrying
-                        if retry_count == 3:
-                            print("Upsert failed after 3 retries, so exit")
-                            raise e
-            if len(points) >= bulk_index_threshold:
-                client.upsert(points=points, collection_name=collection_name)
-                points.clear()
-                print(f"index to qdrant up to {i+1} row")
+    def csv_batches():
+        parsed_rows = 0
+        for chunk in read_csv_chunks(csv_file_path, chunk_size):
+            # 末尾の端数バッチも含めてゼロコピーのスライスで送る
+            for start_id, vectors in iter_batches(chunk, bulk_index_threshold):
+                yield parsed_rows + start_id, vectors
+            parsed_rows += len(chunk)
+
+    upsert_batches_in_parallel(
+        collection_name, csv_batches(), parallel_count, payload_config
+    )
+
+    # indexを有効化する
+    update_index_threshold(collection_name, 20000)
+
+    return time.time() - start_time
+
+
+def bulk_index_from_dataset(
+    collection_name,
+    dataset_path,
+    bulk_index_threshold,
+    parallel_count=1,
+    index_number=None,
+    payload_config=None,
+) -> float:
+    start_time = time.time()
+    vectors = load_vectors(dataset_path)
+    print(f"bulk_index_from_dataset: {dataset_path} shape={vectors.shape}")
+    # 一時的にindexをdisableする
+    update_index_threshold(collection_name, 0)
+
+    upsert_batches_in_parallel(
+        collection_name,
+        iter_batches(vectors, bulk_index_threshold, stop=index_number),
+        parallel_count,
+        payload_config,
+    )
 
     # indexを有効化する
     update_index_threshold(collection_name, 20000)
@@ -142,34 +731,41 @@ def delete_collection(collection_name):
 import concurrent.futures
 
 
-def upsert_points(vectors, collection_name):
+def upsert_points(vectors, collection_name, payload_config=None):
+    build_start = time.perf_counter()
+    payloads = [{}] * len(vectors)
+    if payload_config is not None:
+        payloads = build_payloads([vector["id"] for vector in vectors], payload_config)
     points = [
-        PointStruct(id=vector["id"], vector=vector["vector"], payload={})
-        for vector in vectors
+        PointStruct(id=vector["id"], vector=vector["vector"], payload=payload)
+        for vector, payload in zip(vectors, payloads)
     ]
-    retry_count = 0
-    while retry_count < 3:
-        try:
-            start = time.time()
-            client.upsert(points=points, collection_name=collection_name)
-            end = time.time()
-            took_time = end - start
-            print(f"index to qdrant up to {points[-1].id} row took {took_time} seconds")
-            return {
-                "task_name": f"upsert_qdrant_{collection_name}",
-                "took_time": took_time,
-            }
-        except Exception as e:
-            print(f"Upsert failed: {e}")
-            retry_count += 1
-            time.sleep(1)  # Wait for 1 second before retrying
-            if retry_count == 3:
-                print("Upsert failed after 3 retries, so exit")
-                raise e
+    took_time = upsert_with_retry(
+        points, collection_name, time.perf_counter() - build_start
+    )
+    print(f"index to qdrant up to {points[-1].id} row took {took_time} seconds")
+    return {
+        "task_name": f"upsert_qdrant_{collection_name}",
+        "took_time": took_time,
+    }
+
+
+def upsert_block(ids, vectors, collection_name, payload_config=None):
+    took_time = upsert_batch(ids, vectors, collection_name, payload_config)
+    print(f"index to qdrant up to {ids[-1]} row took {took_time} seconds")
+    return {
+        "task_name": f"upsert_qdrant_{collection_name}",
+        "took_time": took_time,
+    }
 
 
 def bulk_index_by_random_vector(
-    collection_name, vector_size, index_number, bulk_index_threshold, parallel_count=1
+    collection_name,
+    vector_size,
+    index_number,
+    bulk_index_threshold,
+    parallel_count=1,
+    payload_config=None,
 ) -> float:
     start_time = time.time()
     # 一時的にindexをdisableする
@@ -177,41 +773,143 @@ def bulk_index_by_random_vector(
 
     with concurrent.futures.ThreadPoolExecutor(max_workers=parallel_count) as executor:
         futures = []
+        rng = np.random.default_rng()
         for i in range(0, index_number, bulk_index_threshold):
-            vectors = vectors = [
+            # 最後のバッチは index_number で打ち切る
+            batch_size = min(bulk_index_threshold, index_number - i)
+            if upsert_serializer == "fast":
+                # float32で直接生成し、行ごとのリストやdictを作らない
+                future = executor.submit(
+                    upsert_block,
+                    list(range(i + 1, i + batch_size + 1)),
+                    rng.random((batch_size, vector_size), dtype=np.float32),
+                    collection_name,
+                    payload_config,
+                )
+                futures.append(future)
+                continue
+            vectors = [
                 {"id": j + 1, "vector": np.random.rand(vector_size).tolist()}
-                for j in range(i, i + bulk_index_threshold)
+                for j in range(i, i + batch_size)
             ]
-            future = executor.submit(upsert_points, vectors, collection_name)
+            future = executor.submit(
+                upsert_points, vectors, collection_name, payload_config
+            )
             futures.append(future)
 
         # Wait for all the futures to complete
         concurrent.futures.wait(futures)
+    # 失敗したバッチがあれば例外をそのまま投げる
+    latencies = [future.result()["took_time"] for future in futures]
 
     # indexを有効化する
     update_index_threshold(collection_name, 20000)
 
     end_time = time.time()
     took_time = end_time - start_time
+    print_latency_stats("thread engine", latencies)
     print(f"bulk_index_by_random_vector took {took_time} seconds")
     return took_time
 
 
-def wait_for_green_status(collection_name, max_wait_time) -> float:
-    start_time = time.time()
-    green_count = 0
-    while green_count < 30:
-        collection_info = get_collection_info(collection_name)
-        status = collection_info.status
-        if status == "green":
-            green_count += 1
+async def upsert_batch_async(
+    async_client, ids, vectors, collection_name, payload_config=None
+) -> float:
+    batch = build_batch(ids, vectors, payload_config)
+    retry_count = 0
+    while retry_count < UPSERT_MAX_RETRIES:
+        try:
+            start = time.perf_counter()
+            await async_client.upsert(points=batch, collection_name=collection_name)
+            return time.perf_counter() - start
+        except Exception as e:
+            print(f"Upsert failed: {e}")
+            retry_count += 1
+            if retry_count == UPSERT_MAX_RETRIES:
+                print(f"Upsert failed after {UPSERT_MAX_RETRIES} retries, so exit")
+                raise e
+            await asyncio.sleep(backoff_delay(retry_count))
+
+
+async def _bulk_index_by_random_vector_async(
+    collection_name,
+    vector_size,
+    index_number,
+    bulk_index_threshold,
+    concurrency,
+    payload_config=None,
+):
+    async_client = create_async_client()
+    # 同時に実行するupsertの数をセマフォで制限する
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def run_batch(start_id, vectors):
+        try:
+            took_time = await upsert_batch_async(
+                async_client,
+                list(range(start_id + 1, start_id + len(vectors) + 1)),
+                vectors,
+                collection_name,
+                payload_config,
+            )
+            latencies.append(took_time)
             print(
-                f"Collection status is green. Ready to proceed. green_count={green_count}"
+                f"index to qdrant up to {start_id + len(vectors)} row took {took_time} seconds"
             )
-        else:
-            green_count = 0
-        # if time.time() - start_time >= max_wait_time:
-        #     print("Max wait time exceeded. Exiting.")
-        #     break
-        time.sleep(1)
-    return time.time() - start_time
+        finally:
+            semaphore.release()
+
+    tasks = []
+    try:
+        for start_id in range(0, index_number, bulk_index_threshold):
+            await semaphore.acquire()
+            # 失敗したタスクがあれば残りを投入せずに例外を伝播させる
+            # (キャンセルされたタスクの exception() は CancelledError を投げるので先に除く)
+            for task in tasks:
+                if task.done() and not task.cancelled() and task.exception() is not None:
+                    raise task.exception()
+            batch_size = min(bulk_index_threshold, index_number - start_id)
+            vectors = np.random.rand(batch_size, vector_size)
+            tasks.append(asyncio.create_task(run_batch(start_id, vectors)))
+            tasks = [task for task in tasks if not task.done()]
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+    finally:
+        await async_client.close()
+    return latencies
+
+
+def bulk_index_by_random_vector_async(
+    collection_name,
+    vector_size,
+    index_number,
+    bulk_index_threshold,
+    concurrency=100,
+    payload_config=None,
+) -> float:
+    start_time = time.time()
+    # 一時的にindexをdisableする
+    update_index_threshold(collection_name, 0)
+
+    latencies = asyncio.run(
+        _bulk_index_by_random_vector_async(
+            collection_name,
+            vector_size,
+            index_number,
+            bulk_index_threshold,
+            concurrency,
+            payload_config,
+        )
+    )
+
+    # indexを有効化する
+    update_index_threshold(collection_name, 20000)
+
+    took_time = time.time() - start_time
+    print_latency_stats(f"async engine (concurrency={concurrency})", latencies)
+    print(f"bulk_index_by_random_vector_async took {took_time} seconds")
+    return took_time
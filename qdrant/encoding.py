@@ -0,0 +1,113 @@
+import json
+
+import numpy as np
+from qdrant_client import grpc as qdrant_grpc
+from qdrant_client.conversions.conversion import RestToGrpc
+
+try:
+    import orjson
+except ImportError:  # orjson がなければ標準のjsonで同じボディを作る(遅い)
+    orjson = None
+
+
+def field_number(message, name) -> int:
+    return message.DESCRIPTOR.fields_by_name[name].number
+
+
+# protobufのフィールド番号はqdrant_clientの定義から取る
+UPSERT_COLLECTION_NAME = field_number(qdrant_grpc.UpsertPoints, "collection_name")
+UPSERT_WAIT = field_number(qdrant_grpc.UpsertPoints, "wait")
+UPSERT_POINTS = field_number(qdrant_grpc.UpsertPoints, "points")
+POINT_ID = field_number(qdrant_grpc.PointStruct, "id")
+POINT_VECTORS = field_number(qdrant_grpc.PointStruct, "vectors")
+POINT_ID_NUM = field_number(qdrant_grpc.PointId, "num")
+VECTORS_VECTOR = field_number(qdrant_grpc.Vectors, "vector")
+VECTOR_DATA = field_number(qdrant_grpc.Vector, "data")
+
+VARINT = 0
+LENGTH_DELIMITED = 2
+
+
+def encode_varint(value: int) -> bytes:
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def encode_tag(number, wire_type) -> bytes:
+    return encode_varint(number << 3 | wire_type)
+
+
+def encode_length_delimited(number, data: bytes) -> bytes:
+    return encode_tag(number, LENGTH_DELIMITED) + encode_varint(len(data)) + data
+
+
+def as_float32_block(vectors) -> np.ndarray:
+    # 既に連続した float32 ならコピーしない
+    return np.ascontiguousarray(vectors, dtype=np.float32)
+
+
+def encode_rest_upsert(ids, vectors, payloads=None) -> bytes:
+    """PointsBatch のJSONボディを float32 の配列から直接作る。
+
+    orjson は NumPy 配列をそのままシリアライズするので、ベクトルの値ごとのPythonのfloatを作らない。
+    """
+    vectors = as_float32_block(vectors)
+    batch = {"ids": ids, "vectors": vectors}
+    if payloads is not None:
+        batch["payloads"] = payloads
+    if orjson is not None:
+        return orjson.dumps({"batch": batch}, option=orjson.OPT_SERIALIZE_NUMPY)
+    batch["vectors"] = vectors.tolist()
+    return json.dumps({"batch": batch}).encode()
+
+
+def encode_grpc_upsert(collection_name, ids, vectors, payloads=None) -> bytes:
+    """UpsertPoints のprotobufを組み立てたバイト列。
+
+    ベクトルは packed repeated float なので、float32 の行のバイト列をそのまま埋め込む。
+    PointStruct などのメッセージは作らない(ペイロードだけprotobufでシリアライズして連結する)。
+    """
+    vectors = as_float32_block(vectors)
+    data_prefix = encode_tag(VECTOR_DATA, LENGTH_DELIMITED) + encode_varint(
+        vectors.shape[1] * 4
+    )
+    # 行ごとのバイト列の長さは同じなので、Vector と Vectors の長さも全点で同じ
+    vector_length = len(data_prefix) + vectors.shape[1] * 4
+    vector_prefix = (
+        encode_tag(VECTORS_VECTOR, LENGTH_DELIMITED)
+        + encode_varint(vector_length)
+        + data_prefix
+    )
+    vectors_length = len(vector_prefix) + vectors.shape[1] * 4
+    vectors_prefix = (
+        encode_tag(POINT_VECTORS, LENGTH_DELIMITED)
+        + encode_varint(vectors_length)
+        + vector_prefix
+    )
+    points = []
+    for i, (point_id, row) in enumerate(zip(ids, vectors)):
+        point_id_message = encode_tag(POINT_ID_NUM, VARINT) + encode_varint(point_id)
+        point = [
+            encode_length_delimited(POINT_ID, point_id_message),
+            vectors_prefix,
+            row.tobytes(),
+        ]
+        if payloads is not None:
+            # 同じメッセージのフィールドは連結してよいので、ペイロードだけのPointStructを後ろに付ける
+            point.append(
+                qdrant_grpc.PointStruct(
+                    payload=RestToGrpc.convert_payload(payloads[i])
+                ).SerializeToString()
+            )
+        points.append(encode_length_delimited(UPSERT_POINTS, b"".join(point)))
+    return b"".join(
+        [
+            encode_length_delimited(UPSERT_COLLECTION_NAME, collection_name.encode()),
+            encode_tag(UPSERT_WAIT, VARINT) + encode_varint(1),
+            *points,
+        ]
+    )
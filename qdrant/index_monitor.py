@@ -0,0 +1,154 @@
+import csv
+import datetime
+import os
+import time
+
+from pydantic import BaseModel
+
+from qdrant.commands import get_collection_info
+
+MIN_POLL_INTERVAL = 0.5
+
+
+class IndexMonitorResult(BaseModel):
+    took_time: float
+    samples: int
+    points_count: int | None
+    indexed_vectors_count: int | None
+    segments_count: int | None
+    # インデックス済みベクトル数の増加から求めた平均スループット
+    indexed_vectors_per_sec: float | None
+    time_series_path: str | None = None
+
+
+def sample_collection(collection_name, start_time) -> dict:
+    collection_info = get_collection_info(collection_name)
+    return {
+        "elapsed": time.time() - start_time,
+        "status": str(getattr(collection_info.status, "value", collection_info.status)),
+        "optimizer_status": str(
+            getattr(
+                collection_info.optimizer_status,
+                "value",
+                collection_info.optimizer_status,
+            )
+        ),
+        "points_count": collection_info.points_count,
+        "indexed_vectors_count": collection_info.indexed_vectors_count,
+        "segments_count": collection_info.segments_count,
+    }
+
+
+def counts(sample) -> tuple:
+    return (
+        sample["points_count"],
+        sample["indexed_vectors_count"],
+        sample["segments_count"],
+    )
+
+
+def add_throughput(samples: list[dict]) -> list[dict]:
+    """前回のサンプルからのインデックス済みベクトル数の増加を1秒あたりに直して付ける"""
+    previous = None
+    for sample in samples:
+        sample["indexed_vectors_per_sec"] = 0.0
+        if previous is not None and sample["elapsed"] > previous["elapsed"]:
+            sample["indexed_vectors_per_sec"] = (
+                (sample["indexed_vectors_count"] or 0)
+                - (previous["indexed_vectors_count"] or 0)
+            ) / (sample["elapsed"] - previous["elapsed"])
+        previous = sample
+    return samples
+
+
+def save_index_progress_csv(collection_name, samples) -> str:
+    current_time = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+    os.makedirs("benchmark_results", exist_ok=True)
+    filepath = os.path.join(
+        "benchmark_results", f"index_progress_{collection_name}_{current_time}.csv"
+    )
+    with open(filepath, "w", newline="") as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=list(samples[0].keys()))
+        writer.writeheader()
+        writer.writerows(samples)
+    print(f"Index progress saved to {filepath}")
+    return filepath
+
+
+def monitor_indexing(
+    collection_name,
+    timeout,
+    interval=5,
+    stable_seconds=5,
+    save_time_series=True,
+) -> IndexMonitorResult:
+    """コレクションの状態とインデックスの進捗をサンプリングし、インデックス作成の完了を待つ。
+
+    status が green で、points_count / indexed_vectors_count / segments_count が
+    stable_seconds 以上変化しなければ完了とみなす。件数が変化している間は短い間隔で、
+    変化がなければ interval まで間隔を倍々に延ばしてポーリングする。
+    timeout 秒以内に完了しなければ TimeoutError を投げる。
+    """
+    start_time = time.time()
+    samples = []
+    poll_interval = MIN_POLL_INTERVAL
+    stable_since = None
+    while True:
+        sample = sample_collection(collection_name, start_time)
+        if samples and counts(sample) == counts(samples[-1]):
+            poll_interval = min(poll_interval * 2, interval)
+        else:
+            stable_since = sample["elapsed"]
+            poll_interval = MIN_POLL_INTERVAL
+        samples.append(sample)
+        print(
+            f"status={sample['status']} points={sample['points_count']} "
+            f"indexed={sample['indexed_vectors_count']} segments={sample['segments_count']} "
+            f"elapsed={sample['elapsed']:.1f}s"
+        )
+        if (
+            sample["status"] == "green"
+            and sample["elapsed"] - stable_since >= stable_seconds
+        ):
+            break
+        if sample["elapsed"] >= timeout:
+            if save_time_series:
+                save_index_progress_csv(collection_name, add_throughput(samples))
+            raise TimeoutError(
+                f"Collection '{collection_name}' was not ready within {timeout} seconds"
+                f" (status={sample['status']}, indexed={sample['indexed_vectors_count']})"
+            )
+        # 完了判定に必要な時間を過ぎないように次のポーリングまでの間隔を切り詰める
+        remaining = stable_since + stable_seconds - sample["elapsed"]
+        if remaining > 0:
+            poll_interval = max(min(poll_interval, remaining), MIN_POLL_INTERVAL)
+        time.sleep(poll_interval)
+
+    took_time = time.time() - start_time
+    add_throughput(samples)
+    # 完了確認のための待ち時間を除いた、件数が最後に変化するまでの区間で平均を出す
+    indexed_delta = (samples[-1]["indexed_vectors_count"] or 0) - (
+        samples[0]["indexed_vectors_count"] or 0
+    )
+    indexed_vectors_per_sec = indexed_delta / stable_since if stable_since > 0 else None
+    time_series_path = None
+    if save_time_series:
+        time_series_path = save_index_progress_csv(collection_name, samples)
+    result = IndexMonitorResult(
+        took_time=took_time,
+        samples=len(samples),
+        points_count=samples[-1]["points_count"],
+        indexed_vectors_count=samples[-1]["indexed_vectors_count"],
+        segments_count=samples[-1]["segments_count"],
+        indexed_vectors_per_sec=indexed_vectors_per_sec,
+        time_series_path=time_series_path,
+    )
+    print(result.model_dump_json(indent=4))
+    return result
+
+
+def wait_for_green_status(collection_name, max_wait_time, interval=5) -> float:
+    """インデックス作成の完了を待ち、かかった時間を返す"""
+    return monitor_indexing(
+        collection_name, max_wait_time, interval, save_time_series=False
+    ).took_time
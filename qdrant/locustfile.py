@@ -1,30 +1,376 @@
-from locust import FastHttpUser, task, between, events
-import numpy as np
+from locust import FastHttpUser, User, between, events
+import json
 import os
+from dataclasses import asdict
+import time
+import urllib.request
+from urllib.parse import urlparse
 
-from locust_util.locust_util import save_stats_csv
+from locust_util.latency_breakdown import create_latency_breakdown_tracker
+from locust_util.locust_util import RecallTracker, batch_extra
+from locust_util.open_loop import (
+    create_arrival_schedule,
+    open_loop_wait_time,
+    post_with_schedule,
+    wait_for_schedule,
+)
+from locust_util.query_pool import (
+    QUERY_POOL_SIZE,
+    build_batch_query_pool,
+    build_query_pool,
+    load_filter_condition,
+    load_query_ground_truth,
+)
+from locust_util.results import TimeSeriesRecorder, save_results
 
-QUERY_VECTOR_SIZE = 1536
+QUERY_VECTOR_SIZE = int(os.getenv("QUERY_VECTOR_SIZE", 1536))
 TOP_K = int(os.getenv("TOP_K", 10))
+# データセットを指定すると先頭行をクエリに使う(未指定ならランダム生成)
+QUERY_DATASET_PATH = os.getenv("QUERY_DATASET_PATH")
 COLLECTION_NAME = "test_vectors"
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
+HEADERS = {"Api-Key": QDRANT_API_KEY, "Content-Type": "application/json"}
+# rest: FastHttpUserでJSONを送る / grpc: QdrantGrpcLoadTestでprotobufを送る
+QDRANT_TRANSPORT = os.getenv("QDRANT_TRANSPORT", "rest")
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", 6334))
+# 2以上なら BATCH_SIZE 件のクエリを1リクエスト(search/batch)にまとめて送る
+BATCH_SIZE = int(os.getenv("BATCH_SIZE", 1))
+# 検索パラメーター(未指定ならサーバーのデフォルト)
+HNSW_EF = int(os.getenv("HNSW_EF")) if os.getenv("HNSW_EF") else None
+EXACT = os.getenv("EXACT", "false").lower() in ("yes", "true", "t", "y", "1")
+RESCORE = (
+    os.getenv("RESCORE").lower() in ("yes", "true", "t", "y", "1")
+    if os.getenv("RESCORE")
+    else None
+)
+OVERSAMPLING = float(os.getenv("OVERSAMPLING")) if os.getenv("OVERSAMPLING") else None
+# FILTER_FIELD を指定すると生成ペイロードに対して SELECTIVITY の割合にマッチするフィルターを付ける
+FILTER_CONDITION, PAYLOAD_CONFIG = load_filter_condition()
+
+
+def filter_dict():
+    if FILTER_CONDITION is None:
+        return None
+    if "lt" in FILTER_CONDITION:
+        condition = {"key": FILTER_CONDITION["field"], "range": {"lt": FILTER_CONDITION["lt"]}}
+    else:
+        condition = {"key": FILTER_CONDITION["field"], "match": {"any": FILTER_CONDITION["any"]}}
+    return {"must": [condition]}
+
+
+def search_params_dict():
+    params = {}
+    if HNSW_EF is not None:
+        params["hnsw_ef"] = HNSW_EF
+    if EXACT:
+        params["exact"] = True
+    quantization = {}
+    if RESCORE is not None:
+        quantization["rescore"] = RESCORE
+    if OVERSAMPLING is not None:
+        quantization["oversampling"] = OVERSAMPLING
+    if quantization:
+        params["quantization"] = quantization
+    return params
+
+
+if QDRANT_TRANSPORT == "grpc":
+    import grpc
+    import grpc.experimental.gevent as grpc_gevent
+    from qdrant_client import grpc as qdrant_grpc
+
+    # grpcのI/Oをgeventのイベントループで動かす
+    grpc_gevent.init_gevent()
+
+    def grpc_search_params():
+        params = search_params_dict()
+        if not params:
+            return None
+        if "quantization" in params:
+            params["quantization"] = qdrant_grpc.QuantizationSearchParams(
+                **params["quantization"]
+            )
+        return qdrant_grpc.SearchParams(**params)
+
+    def grpc_filter():
+        if FILTER_CONDITION is None:
+            return None
+        if "lt" in FILTER_CONDITION:
+            field_condition = qdrant_grpc.FieldCondition(
+                key=FILTER_CONDITION["field"],
+                range=qdrant_grpc.Range(lt=FILTER_CONDITION["lt"]),
+            )
+        else:
+            field_condition = qdrant_grpc.FieldCondition(
+                key=FILTER_CONDITION["field"],
+                match=qdrant_grpc.Match(
+                    keywords=qdrant_grpc.RepeatedStrings(strings=FILTER_CONDITION["any"])
+                ),
+            )
+        return qdrant_grpc.Filter(must=[qdrant_grpc.Condition(field=field_condition)])
+
+    def search_points(vector):
+        return qdrant_grpc.SearchPoints(
+            collection_name=COLLECTION_NAME,
+            vector=vector,
+            limit=TOP_K,
+            params=grpc_search_params(),
+            filter=grpc_filter(),
+        )
+
+    def serialize_query(vector):
+        return search_points(vector).SerializeToString()
+
+    def serialize_batch_query(vectors):
+        return qdrant_grpc.SearchBatchPoints(
+            collection_name=COLLECTION_NAME,
+            search_points=[search_points(vector) for vector in vectors],
+        ).SerializeToString()
+
+else:
+
+    def search_request(vector):
+        body = {"vector": vector, "limit": TOP_K}
+        if search_params_dict():
+            body["params"] = search_params_dict()
+        if filter_dict() is not None:
+            body["filter"] = filter_dict()
+        return body
+
+    def serialize_query(vector):
+        return json.dumps(search_request(vector)).encode()
+
+    def serialize_batch_query(vectors):
+        return json.dumps(
+            {"searches": [search_request(vector) for vector in vectors]}
+        ).encode()
+
+
+# LATENCY_BREAKDOWN=true なら送受信・サーバー処理・デコードの時間を分けて記録する
+breakdown_tracker = create_latency_breakdown_tracker(events)
+if breakdown_tracker is not None:
+    serialize_query = breakdown_tracker.timed_serializer(serialize_query)
+    serialize_batch_query = breakdown_tracker.timed_serializer(serialize_batch_query)
+
+# クエリはワーカーごとに一度だけ生成・シリアライズして使い回す
+if BATCH_SIZE > 1:
+    QUERY_POOL = build_batch_query_pool(
+        serialize_batch_query, QUERY_VECTOR_SIZE, BATCH_SIZE, QUERY_DATASET_PATH
+    )
+else:
+    QUERY_POOL = build_query_pool(serialize_query, QUERY_VECTOR_SIZE, QUERY_DATASET_PATH)
+# インデックスしたデータセットを指定するとrecall@kも計測する
+GROUND_TRUTH = load_query_ground_truth(
+    QUERY_DATASET_PATH,
+    TOP_K,
+    filter_condition=FILTER_CONDITION,
+    payload_config=PAYLOAD_CONFIG,
+)
+recall_tracker = RecallTracker(TOP_K)
+recall_tracker.register(events)
+time_series_recorder = TimeSeriesRecorder()
+time_series_recorder.register(events)
+arrival_schedule = create_arrival_schedule(events)
+
+
+def track_recall(query_index, result_ids):
+    if GROUND_TRUTH is not None and query_index is not None:
+        recall_tracker.add(result_ids, GROUND_TRUTH[query_index])
+
+
+def track_batch_recall(query_indexes, batch_result_ids):
+    for query_index, result_ids in zip(query_indexes, batch_result_ids):
+        track_recall(query_index, result_ids)
+
+
+def read_response(response, sent, received):
+    """recallか内訳の計測に必要なときだけ応答のJSONをデコードして返す"""
+    if response.status_code != 200 or (GROUND_TRUTH is None and breakdown_tracker is None):
+        return None
+    data = response.json()
+    if breakdown_tracker is not None:
+        breakdown_tracker.add_request(
+            received - sent, data.get("time"), time.perf_counter() - received
+        )
+    return data
 
 
 class QdrantLoadTest(FastHttpUser):
-    wait_time = between(0.5, 1)
+    abstract = QDRANT_TRANSPORT != "rest"
+    wait_time = open_loop_wait_time(arrival_schedule, between(0.5, 1))
 
-    @task
     def search_test(self):
-        query_vector = np.random.rand(QUERY_VECTOR_SIZE).tolist()
-        payload = {"vector": query_vector, "limit": TOP_K}
-        headers = {"Api-Key": QDRANT_API_KEY, "Content-Type": "application/json"}
-        self.client.post(
+        scheduled = wait_for_schedule(arrival_schedule)
+        query_index, body = QUERY_POOL.next()
+        sent = time.perf_counter()
+        response = post_with_schedule(
+            self.client,
             f"/collections/{COLLECTION_NAME}/points/search",
-            json=payload,
-            headers=headers,
+            scheduled,
+            data=body,
+            headers=HEADERS,
+        )
+        data = read_response(response, sent, time.perf_counter())
+        if data is not None:
+            track_recall(query_index, [point["id"] for point in data["result"]])
+
+    def search_batch_test(self):
+        scheduled = wait_for_schedule(arrival_schedule)
+        query_indexes, body = QUERY_POOL.next()
+        sent = time.perf_counter()
+        response = post_with_schedule(
+            self.client,
+            f"/collections/{COLLECTION_NAME}/points/search/batch",
+            scheduled,
+            data=body,
+            headers=HEADERS,
+        )
+        data = read_response(response, sent, time.perf_counter())
+        if data is not None:
+            track_batch_recall(
+                query_indexes,
+                [[point["id"] for point in result] for result in data["result"]],
+            )
+
+    tasks = [search_batch_test] if BATCH_SIZE > 1 else [search_test]
+
+
+class QdrantGrpcLoadTest(User):
+    abstract = QDRANT_TRANSPORT != "grpc"
+    wait_time = open_loop_wait_time(arrival_schedule, between(0.5, 1))
+
+    def on_start(self):
+        # --host の REST URL から gRPC の接続先を組み立てる
+        url = urlparse(self.host)
+        target = f"{url.hostname}:{QDRANT_GRPC_PORT}"
+        if url.scheme == "https":
+            self.channel = grpc.secure_channel(target, grpc.ssl_channel_credentials())
+        else:
+            self.channel = grpc.insecure_channel(target)
+        # シリアライズ済みのリクエストをそのまま送り、応答のデコードは別に測る
+        self.search = self.channel.unary_unary(
+            "/qdrant.Points/Search",
+            request_serializer=None,
+            response_deserializer=None,
+        )
+        self.search_batch = self.channel.unary_unary(
+            "/qdrant.Points/SearchBatch",
+            request_serializer=None,
+            response_deserializer=None,
         )
+        self.metadata = [("api-key", QDRANT_API_KEY)] if QDRANT_API_KEY else None
+
+    def on_stop(self):
+        self.channel.close()
+
+    def call(self, method, request, response_type):
+        """シリアライズ済みのリクエストを送り、デコードした応答を返す"""
+        sent = time.perf_counter()
+        content = method(request, metadata=self.metadata)
+        received = time.perf_counter()
+        response = response_type.FromString(content)
+        if breakdown_tracker is not None:
+            breakdown_tracker.add_request(
+                received - sent, response.time, time.perf_counter() - received
+            )
+        return response, len(content)
+
+    def search_test(self):
+        scheduled = wait_for_schedule(arrival_schedule)
+        query_index, request = QUERY_POOL.next()
+        response_length = 0
+        exception = None
+        # open-loopでは予定時刻から測る
+        start = scheduled or time.perf_counter()
+        try:
+            response, response_length = self.call(
+                self.search, request, qdrant_grpc.SearchResponse
+            )
+            track_recall(query_index, [point.id.num for point in response.result])
+        except grpc.RpcError as e:
+            exception = e
+        self.environment.events.request.fire(
+            request_type="grpc",
+            name=f"/collections/{COLLECTION_NAME}/points/search",
+            response_time=(time.perf_counter() - start) * 1000,
+            response_length=response_length,
+            exception=exception,
+            context={},
+        )
+
+    def search_batch_test(self):
+        scheduled = wait_for_schedule(arrival_schedule)
+        query_indexes, request = QUERY_POOL.next()
+        response_length = 0
+        exception = None
+        # open-loopでは予定時刻から測る
+        start = scheduled or time.perf_counter()
+        try:
+            response, response_length = self.call(
+                self.search_batch, request, qdrant_grpc.SearchBatchResponse
+            )
+            track_batch_recall(
+                query_indexes,
+                [[point.id.num for point in batch.result] for batch in response.result],
+            )
+        except grpc.RpcError as e:
+            exception = e
+        self.environment.events.request.fire(
+            request_type="grpc",
+            name=f"/collections/{COLLECTION_NAME}/points/search/batch",
+            response_time=(time.perf_counter() - start) * 1000,
+            response_length=response_length,
+            exception=exception,
+            context={},
+        )
+
+    tasks = [search_batch_test] if BATCH_SIZE > 1 else [search_test]
+
+
+def collection_metadata(host):
+    # 実行時点のコレクション設定を結果に残す
+    try:
+        headers = {"Api-Key": QDRANT_API_KEY} if QDRANT_API_KEY else {}
+        request = urllib.request.Request(
+            f"{host}/collections/{COLLECTION_NAME}", headers=headers
+        )
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return json.load(response)["result"]
+    except Exception as e:
+        print(f"Failed to get collection info: {e}")
+        return None
+
 
 @events.quitting.add_listener
 def _(environment, **kw):
     filename = f"qdrant_top{TOP_K}"
-    save_stats_csv(environment, filename)
\ No newline at end of file
+    if QDRANT_TRANSPORT != "rest":
+        filename = f"qdrant_{QDRANT_TRANSPORT}_top{TOP_K}"
+    if BATCH_SIZE > 1:
+        filename = f"{filename}_batch{BATCH_SIZE}"
+    if FILTER_CONDITION is not None:
+        filename = f"{filename}_filter_{FILTER_CONDITION['field']}"
+    if arrival_schedule is not None:
+        filename = f"{filename}_{arrival_schedule.extra()['target_qps']:g}qps"
+    extra = batch_extra(environment, BATCH_SIZE)
+    if FILTER_CONDITION is not None:
+        extra["expected_selectivity"] = FILTER_CONDITION["expected_selectivity"]
+    if arrival_schedule is not None:
+        extra.update(arrival_schedule.extra())
+    if GROUND_TRUTH is not None:
+        extra[f"recall_at_{TOP_K}"] = recall_tracker.mean()
+    if breakdown_tracker is not None:
+        extra.update(breakdown_tracker.extra())
+    metadata = {
+        "top_k": TOP_K,
+        "transport": QDRANT_TRANSPORT,
+        "collection_name": COLLECTION_NAME,
+        "query_dataset_path": QUERY_DATASET_PATH,
+        "query_pool_size": QUERY_POOL_SIZE,
+        "batch_size": BATCH_SIZE,
+        "filter": FILTER_CONDITION,
+        "payload_config": asdict(PAYLOAD_CONFIG) if PAYLOAD_CONFIG else None,
+        "search_params": search_params_dict(),
+        "collection": collection_metadata(environment.host),
+    }
+    save_results(environment, filename, time_series_recorder, extra, metadata)
@@ -0,0 +1,217 @@
+import concurrent.futures
+import multiprocessing
+import queue
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from dataset_util.dataset_util import load_vectors
+from dataset_util.payload import PayloadConfig
+from dataset_util.results import print_latency_stats
+from qdrant.commands import update_index_threshold
+
+
+@dataclass
+class IngestWorkerTask:
+    collection_name: str
+    # このプロセスが担当する行の範囲 [start, stop)
+    start: int
+    stop: int
+    batch_size: int
+    parallel_count: int
+    vector_size: int
+    dataset_path: str | None
+    id_offset: int
+    transport: str
+    serializer: str
+    payload_config: PayloadConfig | None = None
+
+
+def ingest_worker(worker_index, task: IngestWorkerTask, progress_queue, stop_event):
+    """担当範囲をバッチに分けてupsertし、バッチごとの進捗を progress_queue に送る。
+
+    spawn で起動するので、qdrant.commands のクライアントはプロセスごとに作られる。
+    データセットはプロセスごとにメモリマップで開くため、ページキャッシュを共有してコピーしない。
+    ランダムベクトルは共有せず、各プロセスが担当分をその場で生成する。
+    """
+    from qdrant.commands import set_transport, set_upsert_serializer, upsert_batch
+
+    try:
+        set_transport(task.transport)
+        set_upsert_serializer(task.serializer)
+        if task.dataset_path is not None:
+            vectors = load_vectors(task.dataset_path)
+
+            def read_vectors(offset, count):
+                return vectors[offset : offset + count]
+
+        else:
+            rng = np.random.default_rng()
+
+            def read_vectors(offset, count):
+                return rng.random((count, task.vector_size), dtype=np.float32)
+
+        def upsert_range(offset, count, batch):
+            ids = list(range(task.id_offset + offset, task.id_offset + offset + count))
+            took_time = upsert_batch(
+                ids, batch, task.collection_name, task.payload_config
+            )
+            progress_queue.put(("progress", worker_index, count, took_time))
+
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=task.parallel_count
+        ) as executor:
+            pending = set()
+            for offset in range(task.start, task.stop, task.batch_size):
+                if stop_event.is_set():
+                    break
+                # 読み込んだバッチを溜め込まないよう、実行中のupsertは parallel_count までにする
+                if len(pending) >= task.parallel_count:
+                    done, pending = concurrent.futures.wait(
+                        pending, return_when=concurrent.futures.FIRST_COMPLETED
+                    )
+                    for future in done:
+                        future.result()
+                count = min(task.batch_size, task.stop - offset)
+                pending.add(
+                    executor.submit(upsert_range, offset, count, read_vectors(offset, count))
+                )
+            for future in concurrent.futures.as_completed(pending):
+                future.result()
+    except Exception as e:
+        progress_queue.put(("error", worker_index, repr(e), None))
+        return
+    progress_queue.put(("done", worker_index, None, None))
+
+
+def split_ranges(index_number, workers, batch_size) -> list[tuple[int, int]]:
+    """行をバッチサイズの倍数の境界で workers 個の連続した範囲に分ける"""
+    batches = -(-index_number // batch_size)
+    ranges = []
+    for worker_index in range(workers):
+        start = batches * worker_index // workers * batch_size
+        stop = min(batches * (worker_index + 1) // workers * batch_size, index_number)
+        if start < stop:
+            ranges.append((start, stop))
+    return ranges
+
+
+def bulk_index_multiprocess(
+    collection_name,
+    vector_size,
+    index_number,
+    bulk_index_threshold,
+    workers,
+    parallel_count=1,
+    dataset_path=None,
+    payload_config=None,
+    transport="rest",
+    serializer="pydantic",
+    progress_interval=5.0,
+) -> float:
+    """workers 個のプロセスでIDの範囲を分担してインデックスする(プロセスごとに parallel_count スレッド)。
+
+    コーディネーターはワーカーの進捗を集計してスループットを表示し、
+    どれかのワーカーが失敗したら残りを止めて例外を投げる。
+    """
+    start_time = time.time()
+    if dataset_path is not None:
+        vectors = load_vectors(dataset_path)
+        index_number = len(vectors[:index_number])
+        print(f"bulk_index_multiprocess: {dataset_path} shape={vectors.shape}")
+        # データセットからインデックスする場合、IDは行番号
+        id_offset = 0
+    else:
+        id_offset = 1
+
+    # 一時的にindexをdisableする
+    update_index_threshold(collection_name, 0)
+
+    # fork すると親のgRPCチャネルやHTTP接続を引き継いでしまうので spawn で起動する
+    context = multiprocessing.get_context("spawn")
+    progress_queue = context.Queue()
+    stop_event = context.Event()
+    processes = {}
+    for worker_index, (start, stop) in enumerate(
+        split_ranges(index_number, workers, bulk_index_threshold)
+    ):
+        task = IngestWorkerTask(
+            collection_name=collection_name,
+            start=start,
+            stop=stop,
+            batch_size=bulk_index_threshold,
+            parallel_count=parallel_count,
+            vector_size=vector_size,
+            dataset_path=dataset_path,
+            id_offset=id_offset,
+            transport=transport,
+            serializer=serializer,
+            payload_config=payload_config,
+        )
+        process = context.Process(
+            target=ingest_worker,
+            args=(worker_index, task, progress_queue, stop_event),
+            daemon=True,
+        )
+        process.start()
+        processes[worker_index] = process
+        print(f"ingest worker {worker_index} (pid {process.pid}): rows {start}..{stop}")
+
+    latencies = []
+    worker_rows = {worker_index: 0 for worker_index in processes}
+    errors = {}
+    running = set(processes)
+    last_report = time.time()
+    while running:
+        try:
+            kind, worker_index, value, took_time = progress_queue.get(timeout=1.0)
+        except queue.Empty:
+            # 進捗を送らずに落ちたワーカー(OOMなど)を検出する。
+            # 正常終了(exitcode 0)したワーカーは done / error を送っているので、キューから届くのを待つ
+            for worker_index in list(running):
+                exitcode = processes[worker_index].exitcode
+                if exitcode is not None and exitcode != 0:
+                    errors[worker_index] = f"exited with code {exitcode}"
+                    running.discard(worker_index)
+                    stop_event.set()
+            continue
+        if kind == "progress":
+            worker_rows[worker_index] += value
+            latencies.append(took_time)
+        elif kind == "error":
+            errors[worker_index] = value
+            running.discard(worker_index)
+            stop_event.set()
+        else:
+            running.discard(worker_index)
+        if time.time() - last_report >= progress_interval:
+            last_report = time.time()
+            rows = sum(worker_rows.values())
+            print(
+                f"ingest progress: {rows}/{index_number} rows "
+                f"({rows / (time.time() - start_time):.1f} rows/s, "
+                f"{len(running)} workers running, {len(errors)} failed)"
+            )
+
+    for process in processes.values():
+        process.join()
+    if errors:
+        for worker_index, error in errors.items():
+            print(f"ingest worker {worker_index} failed: {error}")
+        raise RuntimeError(
+            f"{len(errors)} of {len(processes)} ingest workers failed: {next(iter(errors.values()))}"
+        )
+
+    # indexを有効化する
+    update_index_threshold(collection_name, 20000)
+
+    took_time = time.time() - start_time
+    rows = sum(worker_rows.values())
+    print_latency_stats(f"process engine (workers={len(processes)})", latencies)
+    for worker_index, worker_rows_count in worker_rows.items():
+        print(f"ingest worker {worker_index}: {worker_rows_count} rows")
+    print(
+        f"bulk_index_multiprocess took {took_time} seconds ({rows / took_time:.1f} rows/s)"
+    )
+    return took_time
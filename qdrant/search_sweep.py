@@ -0,0 +1,128 @@
+import csv
+import datetime
+import itertools
+import os
+
+from dataset_util.ground_truth import mean_recall_at_k
+from dataset_util.results import summarize_latencies
+from qdrant.commands import build_filter, build_search_params, search_queries
+
+
+def pareto_frontier(rows: list[dict]) -> list[dict]:
+    """recallが高く、p95が小さい点のうち他の点に支配されないものを返す"""
+    frontier = []
+    for row in rows:
+        dominated = any(
+            other["recall"] >= row["recall"]
+            and other["p95"] <= row["p95"]
+            and (other["recall"] > row["recall"] or other["p95"] < row["p95"])
+            for other in rows
+        )
+        if not dominated:
+            frontier.append(row)
+    return sorted(frontier, key=lambda row: row["recall"])
+
+
+def run_search_sweep(
+    collection_name,
+    top_k,
+    queries,
+    ground_truth_ids,
+    hnsw_ef_values,
+    oversampling_values,
+    rescore=None,
+    concurrency=1,
+    batch_size_values=(1,),
+) -> list[dict]:
+    """hnsw_ef / oversampling / バッチサイズの組み合わせごとに同じクエリセットで recall / p95 / QPS を測る。
+
+    p50〜p99 はリクエスト(バッチ)単位の応答時間で、amortized_latency はクエリ1件あたりの平均。
+    """
+    rows = []
+    for hnsw_ef, oversampling, batch_size in itertools.product(
+        hnsw_ef_values, oversampling_values, batch_size_values
+    ):
+        search_params = build_search_params(
+            hnsw_ef=hnsw_ef, rescore=rescore, oversampling=oversampling
+        )
+        results_ids, response_times, took_time = search_queries(
+            collection_name, top_k, queries, search_params, concurrency, batch_size
+        )
+        latencies = summarize_latencies(response_times)
+        row = {
+            "hnsw_ef": hnsw_ef,
+            "oversampling": oversampling,
+            "rescore": rescore,
+            "batch_size": batch_size,
+            "recall": mean_recall_at_k(results_ids, ground_truth_ids, top_k),
+            "p50": latencies["p50"],
+            "p95": latencies["p95"],
+            "p99": latencies["p99"],
+            "amortized_latency": latencies["mean"] / batch_size,
+            "qps": len(queries) / took_time,
+        }
+        print(row)
+        rows.append(row)
+
+    # p95はリクエスト単位なので、バッチサイズごとにフロンティアを求める
+    for batch_size in batch_size_values:
+        group = [row for row in rows if row["batch_size"] == batch_size]
+        frontier = pareto_frontier(group)
+        for row in group:
+            row["pareto"] = row in frontier
+    return rows
+
+
+def run_filtered_search_sweep(
+    collection_name,
+    top_k,
+    queries,
+    ground_truth,
+    conditions,
+    search_params=None,
+    concurrency=1,
+) -> list[dict]:
+    """selectivityの異なるフィルター条件ごとに同じクエリセットで recall / レイテンシ / QPS を測る。
+
+    ground_truth(condition) は (正解ID, 実測selectivity) を返す関数。
+    """
+    rows = []
+    for condition in conditions:
+        ground_truth_ids, actual_selectivity = ground_truth(condition)
+        results_ids, response_times, took_time = search_queries(
+            collection_name,
+            top_k,
+            queries,
+            search_params,
+            concurrency,
+            query_filter=build_filter(condition),
+        )
+        latencies = summarize_latencies(response_times)
+        row = {
+            "filter_field": condition["field"],
+            "expected_selectivity": condition["expected_selectivity"],
+            "actual_selectivity": actual_selectivity,
+            "recall": mean_recall_at_k(results_ids, ground_truth_ids, top_k),
+            "p50": latencies["p50"],
+            "p95": latencies["p95"],
+            "p99": latencies["p99"],
+            "qps": len(queries) / took_time,
+        }
+        print(row)
+        rows.append(row)
+    return rows
+
+
+def save_search_sweep_csv(rows, collection_name, top_k, prefix="search_sweep") -> str:
+    current_time = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+    os.makedirs("benchmark_results", exist_ok=True)
+    filepath = os.path.join(
+        "benchmark_results",
+        f"{prefix}_{collection_name}_top{top_k}_{current_time}.csv",
+    )
+    with open(filepath, "w", newline="") as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"Results saved to {filepath}")
+    return filepath
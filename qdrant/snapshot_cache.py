@@ -0,0 +1,75 @@
+import hashlib
+import json
+import os
+import time
+
+import httpx
+from pydantic import BaseModel
+
+from dataset_util.dataset_util import dataset_fingerprint
+from qdrant.commands import delete_collection, get_client, rest_base_url, rest_headers
+
+SNAPSHOT_CACHE_DIR = "snapshot_cache"
+
+
+class SnapshotCacheResult(BaseModel):
+    cache_key: str
+    cache_hit: bool
+    restore_took_time: float | None = None
+    save_took_time: float | None = None
+
+
+def snapshot_cache_key(collection_config: dict, dataset_path: str) -> str:
+    """データセット(またはCSV)とコレクション設定からキャッシュキーを作る"""
+    dataset = dataset_fingerprint(dataset_path)
+    key = json.dumps({"collection": collection_config, "dataset": dataset}, sort_keys=True)
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+def snapshot_cache_path(cache_key) -> str:
+    return os.path.join(SNAPSHOT_CACHE_DIR, f"{cache_key}.snapshot")
+
+
+def save_collection_snapshot(collection_name, cache_key) -> float:
+    """サーバーでスナップショットを作成し、ローカルのキャッシュにダウンロードする"""
+    start_time = time.time()
+    snapshot = get_client().create_snapshot(collection_name=collection_name)
+    os.makedirs(SNAPSHOT_CACHE_DIR, exist_ok=True)
+    path = snapshot_cache_path(cache_key)
+    url = f"{rest_base_url()}/collections/{collection_name}/snapshots/{snapshot.name}"
+    # 途中で失敗しても壊れたキャッシュを残さないよう一時ファイルに書いてからrenameする
+    with httpx.stream("GET", url, headers=rest_headers(), timeout=None) as response:
+        response.raise_for_status()
+        with open(f"{path}.tmp", "wb") as f:
+            for chunk in response.iter_bytes(1 << 20):
+                f.write(chunk)
+    os.replace(f"{path}.tmp", path)
+    get_client().delete_snapshot(collection_name=collection_name, snapshot_name=snapshot.name)
+    took_time = time.time() - start_time
+    print(f"save snapshot of '{collection_name}' to {path} took {took_time} seconds")
+    return took_time
+
+
+def restore_collection_snapshot(collection_name, cache_key) -> float | None:
+    """キャッシュがあればアップロードしてコレクションを復元し、かかった時間を返す。なければNone"""
+    path = snapshot_cache_path(cache_key)
+    if not os.path.exists(path):
+        print(f"snapshot cache miss: {path}")
+        return None
+    start_time = time.time()
+    try:
+        delete_collection(collection_name)
+    except Exception as e:
+        print(f"Failed to delete collection: {e}")
+    with open(path, "rb") as f:
+        response = httpx.post(
+            f"{rest_base_url()}/collections/{collection_name}/snapshots/upload",
+            params={"priority": "snapshot", "wait": "true"},
+            files={"snapshot": (os.path.basename(path), f)},
+            headers=rest_headers(),
+            timeout=None,
+        )
+    response.raise_for_status()
+    took_time = time.time() - start_time
+    print(f"restore '{collection_name}' from {path} took {took_time} seconds")
+    return took_time
@@ -0,0 +1,348 @@
+import argparse
+import csv
+import glob
+import hashlib
+import itertools
+import json
+import os
+import tomllib
+from dataclasses import asdict, dataclass
+
+from locust_util.local_runner import LocalRunParams, run_local
+from qdrant.__main__ import (
+    BulkIndexParams,
+    CreateCollectionParams,
+    bulk_index_function,
+    collection_cache_key,
+    create_collection_function,
+)
+from qdrant.commands import delete_collection, get_collection_info, rest_base_url
+from qdrant.index_monitor import wait_for_green_status
+from qdrant.telemetry import TelemetryCollector, save_aligned_results, summarize_samples
+from qdrant.snapshot_cache import restore_collection_snapshot, save_collection_snapshot
+
+RESULTS_DIR = "benchmark_results"
+# コレクションの作り直しが必要なパラメーター
+COLLECTION_KEYS = [
+    "index_num",
+    "vector_size",
+    "on_disk",
+    "shard_number",
+    "replica_number",
+    "max_segment_size",
+    "quantization",
+    "hnsw_m",
+    "hnsw_ef_construct",
+]
+# ロードテストごとに変えるパラメーター
+LOAD_KEYS = ["top_k", "users", "batch_size"]
+DEFAULT_MATRIX = {
+    "index_num": [10000],
+    "vector_size": [1536],
+    "on_disk": [True],
+    "shard_number": [1],
+    "replica_number": [1],
+    "max_segment_size": [None],
+    "quantization": ["int8"],
+    "hnsw_m": [None],
+    "hnsw_ef_construct": [None],
+    "top_k": [10],
+    "users": [30],
+    "batch_size": [1],
+}
+
+
+@dataclass
+class SweepConfig:
+    name: str
+    matrix: dict
+    collection_name: str = "test_vectors"
+    # 省略時は bulk_index と同じ接続先(QDRANT_HOST、なければ localhost)
+    host: str | None = None
+    locust_config: str = "qdrant_benchmark.conf"
+    locust_workers: int | None = None
+    run_time: str | None = None
+    dataset_path: str | None = None
+    index_threshold: int = 5000
+    parallel_count: int = 4
+    transport: str = "rest"
+    timeout: int = 3600 * 10
+    snapshot_cache: bool = False
+    # bulk_index とロードテストの間、サーバーのメトリクスとリソースを記録する
+    telemetry: bool = False
+    telemetry_interval: float = 1.0
+    telemetry_container: str | None = None
+
+
+def load_sweep_config(path) -> SweepConfig:
+    if path.endswith((".yaml", ".yml")):
+        # YAMLはPyYAMLが入っている場合のみ対応
+        import yaml
+
+        with open(path) as f:
+            raw = yaml.safe_load(f)
+    else:
+        with open(path, "rb") as f:
+            raw = tomllib.load(f)
+    matrix = {**DEFAULT_MATRIX, **raw.pop("matrix", {})}
+    unknown = set(matrix) - set(COLLECTION_KEYS) - set(LOAD_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown matrix keys: {sorted(unknown)}")
+    # TOMLにはnullがないので "none" をNoneとして扱う
+    for key in ["max_segment_size", "hnsw_m", "hnsw_ef_construct"]:
+        matrix[key] = [None if value in (None, "none") else value for value in matrix[key]]
+    config = SweepConfig(
+        name=raw.pop("name", os.path.splitext(os.path.basename(path))[0]),
+        matrix=matrix,
+        **raw,
+    )
+    if config.host is None:
+        config.host = rest_base_url()
+    return config
+
+
+def fingerprint(values: dict) -> str:
+    return hashlib.sha1(json.dumps(values, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def expand_points(config: SweepConfig) -> list[dict]:
+    keys = COLLECTION_KEYS + LOAD_KEYS
+    points = [
+        dict(zip(keys, values))
+        for values in itertools.product(*[config.matrix[key] for key in keys])
+    ]
+    # 同じコレクション設定の点をまとめて、インデックスの作り直しを最小にする
+    return sorted(points, key=lambda point: collection_fingerprint(config, point))
+
+
+def collection_fingerprint(config: SweepConfig, point: dict) -> str:
+    return fingerprint(
+        {
+            **{key: point[key] for key in COLLECTION_KEYS},
+            "dataset_path": config.dataset_path,
+        }
+    )
+
+
+def point_key(config: SweepConfig, point: dict) -> str:
+    key = f"{collection_fingerprint(config, point)}_top{point['top_k']}_{point['users']}users"
+    if point["batch_size"] > 1:
+        key = f"{key}_batch{point['batch_size']}"
+    return key
+
+
+class SweepState:
+    """完了した点と現在のコレクションのfingerprintを保存し、途中から再開できるようにする"""
+
+    def __init__(self, path):
+        self.path = path
+        self.state = {"collection_fingerprint": None, "completed": {}}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.state = json.load(f)
+
+    def save(self):
+        with open(self.path, "w") as f:
+            json.dump(self.state, f, indent=2, default=str)
+
+    def is_completed(self, key) -> bool:
+        return key in self.state["completed"]
+
+    def complete(self, key, row):
+        self.state["completed"][key] = row
+        self.save()
+
+    @property
+    def collection_fingerprint(self):
+        return self.state["collection_fingerprint"]
+
+    @collection_fingerprint.setter
+    def collection_fingerprint(self, value):
+        self.state["collection_fingerprint"] = value
+        self.save()
+
+    def rows(self) -> list[dict]:
+        return list(self.state["completed"].values())
+
+
+def collection_matches(config: SweepConfig, state: SweepState, point: dict) -> bool:
+    if state.collection_fingerprint != collection_fingerprint(config, point):
+        return False
+    try:
+        collection_info = get_collection_info(config.collection_name)
+    except Exception:
+        return False
+    return collection_info.points_count == point["index_num"]
+
+
+def prepare_collection(config: SweepConfig, state: SweepState, point: dict) -> dict:
+    if collection_matches(config, state, point):
+        print(f"reuse collection {config.collection_name} ({state.collection_fingerprint})")
+        return {"reused_collection": True}
+
+    state.collection_fingerprint = None
+    create_collection_params = CreateCollectionParams(
+        collection_name=config.collection_name,
+        vector_size=point["vector_size"],
+        on_disk=point["on_disk"],
+        shard_number=point["shard_number"],
+        replica_number=point["replica_number"],
+        max_segment_size=point["max_segment_size"],
+        quantization=point["quantization"],
+        hnsw_m=point["hnsw_m"],
+        hnsw_ef_construct=point["hnsw_ef_construct"],
+    )
+    bulk_index_params = BulkIndexParams(
+        collection_name=config.collection_name,
+        csv_file_path=None,
+        vector_size=point["vector_size"],
+        index_threshold=config.index_threshold,
+        index_num=point["index_num"],
+        parallel_count=config.parallel_count,
+        wait_cluster_ready=True,
+        timeout=config.timeout,
+        dataset_path=config.dataset_path,
+        transport=config.transport,
+        telemetry=config.telemetry,
+        telemetry_interval=config.telemetry_interval,
+        telemetry_container=config.telemetry_container,
+    )
+    # recreate --snapshot_cache と同じキーにして、同じコレクションのスナップショットを共有する
+    cache_key = collection_cache_key(create_collection_params, bulk_index_params)
+    snapshot_cache = config.snapshot_cache and cache_key is not None
+    if snapshot_cache:
+        restore_took_time = restore_collection_snapshot(config.collection_name, cache_key)
+        if restore_took_time is not None:
+            wait_for_green_status(config.collection_name, config.timeout)
+            state.collection_fingerprint = collection_fingerprint(config, point)
+            return {
+                "reused_collection": False,
+                "snapshot_cache_hit": True,
+                "restore_took_time": restore_took_time,
+            }
+
+    try:
+        delete_collection(config.collection_name)
+    except Exception as e:
+        print(f"Failed to delete collection: {e}")
+    create_collection_function(create_collection_params)
+    bulk_index_result = bulk_index_function(bulk_index_params)
+    index_result = {"reused_collection": False, **bulk_index_result.model_dump()}
+    if snapshot_cache:
+        index_result["snapshot_cache_hit"] = False
+        index_result["save_snapshot_took_time"] = save_collection_snapshot(
+            config.collection_name, cache_key
+        )
+    state.collection_fingerprint = collection_fingerprint(config, point)
+    return index_result
+
+
+def result_files() -> set[str]:
+    return set(glob.glob(os.path.join(RESULTS_DIR, "qdrant_*.csv")))
+
+
+def run_load_test(config: SweepConfig, point: dict) -> dict:
+    os.environ["TOP_K"] = str(point["top_k"])
+    os.environ["QUERY_VECTOR_SIZE"] = str(point["vector_size"])
+    os.environ["QDRANT_TRANSPORT"] = config.transport
+    os.environ["BATCH_SIZE"] = str(point["batch_size"])
+    before = result_files()
+    collector = None
+    if config.telemetry:
+        api_key = os.getenv("QDRANT_API_KEY")
+        collector = TelemetryCollector(
+            config.host,
+            {"Api-Key": api_key} if api_key else None,
+            config.telemetry_interval,
+            config.telemetry_container,
+        )
+        collector.start()
+    return_code = run_local(
+        LocalRunParams(
+            config=config.locust_config,
+            host=config.host,
+            workers=config.locust_workers,
+            users=point["users"],
+            run_time=config.run_time,
+        )
+    )
+    telemetry_result = {}
+    if collector is not None:
+        collector.stop()
+        telemetry_result = {
+            "telemetry_path": collector.save(f"{config.name}_load"),
+            **summarize_samples(collector.samples),
+        }
+    new_files = sorted(result_files() - before)
+    if not new_files:
+        raise RuntimeError(f"locust wrote no results (exit code {return_code})")
+    with open(new_files[-1]) as f:
+        metrics = next(csv.DictReader(f))
+    if collector is not None:
+        # 秒ごとの応答時間とサーバーの状態を並べたCSVを結果の隣に保存する
+        telemetry_result["aligned_telemetry_path"] = save_aligned_results(
+            collector.samples, new_files[-1].removesuffix(".csv") + ".json"
+        )
+    return {
+        "locust_exit_code": return_code,
+        "results_file": new_files[-1],
+        **metrics,
+        **telemetry_result,
+    }
+
+
+def write_table(path, rows):
+    fieldnames = []
+    for row in rows:
+        fieldnames += [key for key in row if key not in fieldnames]
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"Sweep results saved to {path}")
+
+
+def run_sweep(config: SweepConfig):
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    state = SweepState(os.path.join(RESULTS_DIR, f"sweep_{config.name}_state.json"))
+    table_path = os.path.join(RESULTS_DIR, f"sweep_{config.name}.csv")
+    points = expand_points(config)
+    for i, point in enumerate(points):
+        key = point_key(config, point)
+        if state.is_completed(key):
+            print(f"[{i + 1}/{len(points)}] skip completed point {key}")
+            continue
+        print(f"[{i + 1}/{len(points)}] run point {key}: {point}")
+        index_result = prepare_collection(config, state, point)
+        load_result = run_load_test(config, point)
+        state.complete(
+            key,
+            {"point": key, **point, **index_result, **load_result},
+        )
+        write_table(table_path, state.rows())
+    write_table(table_path, state.rows())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--config", type=str, required=True, help="Sweep matrix file (.toml or .yaml)"
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="Ignore the saved state and run every point again",
+    )
+    args = parser.parse_args()
+
+    config = load_sweep_config(args.config)
+    print(f"sweep config: {asdict(config)}")
+    if args.restart:
+        state_path = os.path.join(RESULTS_DIR, f"sweep_{config.name}_state.json")
+        if os.path.exists(state_path):
+            os.remove(state_path)
+    run_sweep(config)
+
+
+if __name__ == "__main__":
+    main()
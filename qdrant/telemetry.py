@@ -0,0 +1,406 @@
+import argparse
+import datetime
+import json
+import os
+import threading
+import time
+
+import httpx
+import pandas as pd
+
+try:
+    import psutil
+except ImportError:  # psutil がなければホスト・プロセスのリソースは記録しない
+    psutil = None
+
+RESULTS_DIR = "benchmark_results"
+DOCKER_SOCKET = "/var/run/docker.sock"
+# 累積値なので、前回のサンプルからの増加を1秒あたりに直した列も付ける
+CUMULATIVE_KEYS = (
+    "process_read_bytes",
+    "process_write_bytes",
+    "process_major_faults",
+    "host_read_bytes",
+    "host_write_bytes",
+    "container_read_bytes",
+    "container_write_bytes",
+    "container_major_faults",
+)
+
+
+def parse_prometheus(text) -> dict:
+    """Prometheus のテキスト形式を {"name{labels}": value} にする"""
+    metrics = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        name, _, value = line.rpartition(" ")
+        # 末尾にタイムスタンプが付いた行は、その前が値
+        if " " in name and not name.endswith("}"):
+            name, _, value = name.rpartition(" ")
+        try:
+            metrics[f"metric_{name}"] = float(value)
+        except ValueError:
+            continue
+    return metrics
+
+
+def summarize_telemetry(telemetry) -> dict:
+    """/telemetry の応答からセグメント数と実行中のオプティマイザー数を数える。
+
+    バージョンによって構造が違うので、"segments" のリストと "optimizations" の "log" を探して数える。
+    """
+    summary = {"segments_count": 0, "optimizations_running": 0, "optimizer_errors": 0}
+
+    def walk(value):
+        if isinstance(value, dict):
+            for key, child in value.items():
+                if key == "segments" and isinstance(child, list):
+                    summary["segments_count"] += len(child)
+                elif key == "optimizations" and isinstance(child, dict):
+                    if child.get("status") not in (None, "ok"):
+                        summary["optimizer_errors"] += 1
+                    summary["optimizations_running"] += sum(
+                        1
+                        for entry in child.get("log", [])
+                        if isinstance(entry, dict) and entry.get("status") == "optimizing"
+                    )
+                walk(child)
+        elif isinstance(value, list):
+            for child in value:
+                walk(child)
+
+    walk(telemetry)
+    return summary
+
+
+def find_process(name):
+    if psutil is None:
+        return None
+    for process in psutil.process_iter(["name"]):
+        if process.info["name"] == name:
+            return process
+    return None
+
+
+def major_faults(pid) -> int | None:
+    # psutil では取れないので /proc/<pid>/stat の majflt を読む(Linuxのみ)
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return int(f.read().rsplit(")", 1)[1].split()[9])
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def docker_stats(client: httpx.Client, container) -> dict:
+    stats = client.get(
+        f"http://docker/containers/{container}/stats",
+        params={"stream": "false", "one-shot": "true"},
+    ).json()
+    memory = stats.get("memory_stats", {})
+    memory_stats = memory.get("stats", {})
+    io = stats.get("blkio_stats", {}).get("io_service_bytes_recursive") or []
+    return {
+        "container_cpu_usage": stats["cpu_stats"]["cpu_usage"]["total_usage"],
+        "container_system_cpu_usage": stats["cpu_stats"].get("system_cpu_usage"),
+        "container_online_cpus": stats["cpu_stats"].get("online_cpus"),
+        # ページキャッシュ(inactive_file)を除いた使用量。docker stats の表示と同じ
+        "container_memory_bytes": memory.get("usage", 0)
+        - memory_stats.get("inactive_file", memory_stats.get("total_inactive_file", 0)),
+        "container_page_cache_bytes": memory_stats.get("file", memory_stats.get("cache")),
+        "container_major_faults": memory_stats.get(
+            "pgmajfault", memory_stats.get("total_pgmajfault")
+        ),
+        "container_read_bytes": sum(
+            entry["value"] for entry in io if entry["op"].lower() == "read"
+        ),
+        "container_write_bytes": sum(
+            entry["value"] for entry in io if entry["op"].lower() == "write"
+        ),
+    }
+
+
+class TelemetryCollector:
+    """Qdrantの /metrics・/telemetry とホスト・プロセス・コンテナのリソースを一定間隔で記録する。
+
+    start() でバックグラウンドのスレッドを起動し、stop() で止める。
+    サンプルの time はUNIX時間なので、Locustの秒ごとの時系列(time)とそのまま突き合わせられる。
+    """
+
+    def __init__(
+        self,
+        base_url,
+        headers=None,
+        interval=1.0,
+        container=None,
+        process_name="qdrant",
+        telemetry=True,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.headers = headers or {}
+        self.interval = interval
+        self.container = container
+        self.process_name = process_name
+        self.telemetry = telemetry
+        self.samples = []
+        self.errors = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.process = None
+        self.previous = None
+        self.http = httpx.Client(headers=self.headers, timeout=max(interval, 1.0))
+        self.docker = None
+        if container is not None:
+            self.docker = httpx.Client(
+                transport=httpx.HTTPTransport(uds=DOCKER_SOCKET), timeout=10
+            )
+        if psutil is None:
+            print("psutil is not installed, so host and process resources are not recorded")
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        if psutil is not None:
+            # cpu_percent は前回の呼び出しからの値なので、最初に一度呼んでおく
+            psutil.cpu_percent()
+            self.process = find_process(self.process_name)
+            if self.process is not None:
+                self.process.cpu_percent()
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.http.close()
+        if self.docker is not None:
+            self.docker.close()
+
+    def _run(self):
+        next_time = time.time()
+        while not self.stop_event.is_set():
+            self.samples.append(self.sample())
+            next_time += self.interval
+            self.stop_event.wait(max(next_time - time.time(), 0))
+
+    def sample(self) -> dict:
+        sample = {"time": time.time()}
+        for collect in (
+            self._collect_metrics,
+            self._collect_telemetry,
+            self._collect_host,
+            self._collect_process,
+            self._collect_container,
+        ):
+            try:
+                sample.update(collect())
+            except Exception as e:
+                # サーバーが一時的に応答しなくても記録は続ける
+                self.errors += 1
+                print(f"telemetry: {collect.__name__} failed: {e}")
+        self._add_rates(sample)
+        return sample
+
+    def _collect_metrics(self) -> dict:
+        response = self.http.get(f"{self.base_url}/metrics")
+        response.raise_for_status()
+        return parse_prometheus(response.text)
+
+    def _collect_telemetry(self) -> dict:
+        if not self.telemetry:
+            return {}
+        response = self.http.get(f"{self.base_url}/telemetry", params={"details_level": 3})
+        response.raise_for_status()
+        return summarize_telemetry(response.json().get("result", {}))
+
+    def _collect_host(self) -> dict:
+        if psutil is None:
+            return {}
+        memory = psutil.virtual_memory()
+        disk = psutil.disk_io_counters()
+        return {
+            "host_cpu_percent": psutil.cpu_percent(),
+            "host_memory_used_bytes": memory.used,
+            # on_disk=true の検索はページキャッシュに載っているかで速度が大きく変わる
+            "host_page_cache_bytes": getattr(memory, "cached", None),
+            "host_read_bytes": disk.read_bytes if disk else None,
+            "host_write_bytes": disk.write_bytes if disk else None,
+        }
+
+    def _collect_process(self) -> dict:
+        if self.process is None:
+            return {}
+        with self.process.oneshot():
+            values = {
+                "process_cpu_percent": self.process.cpu_percent(),
+                "process_rss_bytes": self.process.memory_info().rss,
+                "process_major_faults": major_faults(self.process.pid),
+            }
+            if hasattr(self.process, "io_counters"):
+                io = self.process.io_counters()
+                values["process_read_bytes"] = io.read_bytes
+                values["process_write_bytes"] = io.write_bytes
+        return values
+
+    def _collect_container(self) -> dict:
+        if self.docker is None:
+            return {}
+        return docker_stats(self.docker, self.container)
+
+    def _add_rates(self, sample):
+        previous = self.previous
+        self.previous = sample
+        if previous is None:
+            return
+        elapsed = sample["time"] - previous["time"]
+        if elapsed <= 0:
+            return
+        for key in CUMULATIVE_KEYS:
+            if sample.get(key) is not None and previous.get(key) is not None:
+                sample[f"{key}_per_sec"] = (sample[key] - previous[key]) / elapsed
+        if (
+            sample.get("container_system_cpu_usage")
+            and previous.get("container_system_cpu_usage")
+            and sample["container_system_cpu_usage"] > previous["container_system_cpu_usage"]
+        ):
+            # docker stats と同じく、コンテナのCPU時間の増加をホスト全体の増加で割ってCPU数を掛ける
+            sample["container_cpu_percent"] = (
+                (sample["container_cpu_usage"] - previous["container_cpu_usage"])
+                / (sample["container_system_cpu_usage"] - previous["container_system_cpu_usage"])
+                * (sample.get("container_online_cpus") or 1)
+                * 100
+            )
+
+    def save(self, name) -> str | None:
+        if not self.samples:
+            return None
+        current_time = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        filepath = os.path.join(RESULTS_DIR, f"telemetry_{name}_{current_time}.csv")
+        pd.DataFrame(self.samples).to_csv(filepath, index=False)
+        print(f"Telemetry saved to {filepath} ({len(self.samples)} samples, {self.errors} errors)")
+        return filepath
+
+
+# スイープの表に載せる、実行中の平均と最大
+SUMMARY_KEYS = (
+    "host_cpu_percent",
+    "process_cpu_percent",
+    "container_cpu_percent",
+    "process_rss_bytes",
+    "container_memory_bytes",
+    "process_major_faults_per_sec",
+    "container_major_faults_per_sec",
+    "process_read_bytes_per_sec",
+    "container_read_bytes_per_sec",
+    "optimizations_running",
+)
+
+
+def summarize_samples(samples: list[dict]) -> dict:
+    summary = {}
+    for key in SUMMARY_KEYS:
+        values = [sample[key] for sample in samples if sample.get(key) is not None]
+        if values:
+            summary[f"telemetry_{key}_mean"] = sum(values) / len(values)
+            summary[f"telemetry_{key}_max"] = max(values)
+    return summary
+
+
+def align_with_time_series(samples: list[dict], time_series: list[dict]) -> pd.DataFrame:
+    """Locustの秒ごとの時系列に、同じ秒のテレメトリ(複数あれば平均)を横に並べる"""
+    series = pd.DataFrame(time_series)
+    if not samples or series.empty:
+        return series
+    telemetry = pd.DataFrame(samples)
+    telemetry["time"] = telemetry["time"].astype(int)
+    telemetry = telemetry.groupby("time").mean(numeric_only=True).reset_index()
+    return series.merge(telemetry, on="time", how="left")
+
+
+def save_aligned_results(samples, results_path) -> str | None:
+    """Locustの結果JSONの時系列とテレメトリを突き合わせて <結果>_telemetry.csv に保存する"""
+    with open(results_path) as f:
+        time_series = json.load(f)["time_series"]
+    aligned = align_with_time_series(samples, time_series)
+    if aligned.empty:
+        return None
+    filepath = results_path.removesuffix(".json") + "_telemetry.csv"
+    aligned.to_csv(filepath, index=False)
+    print(f"Latency and telemetry saved to {filepath}")
+    return filepath
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Record Qdrant /metrics, /telemetry and host, process and container resources"
+    )
+    parser.add_argument(
+        "--host", type=str, default="http://localhost:6333", help="Qdrant REST URL"
+    )
+    parser.add_argument(
+        "--interval", type=float, default=1.0, help="Seconds between samples"
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=None,
+        help="Seconds to record (default: until Ctrl+C)",
+    )
+    parser.add_argument(
+        "--container",
+        type=str,
+        default=None,
+        help="Docker container of Qdrant, read from the Docker socket",
+    )
+    parser.add_argument(
+        "--process_name",
+        type=str,
+        default="qdrant",
+        help="Name of a local Qdrant process to record CPU, RSS and IO of",
+    )
+    parser.add_argument(
+        "--name", type=str, default="qdrant", help="Name used in the output file"
+    )
+    parser.add_argument(
+        "--align_with",
+        type=str,
+        nargs="*",
+        default=[],
+        help="Locust result JSON files to align the telemetry with",
+    )
+    args = parser.parse_args()
+
+    api_key = os.getenv("QDRANT_API_KEY")
+    collector = TelemetryCollector(
+        args.host,
+        {"Api-Key": api_key} if api_key else None,
+        args.interval,
+        args.container,
+        args.process_name,
+    )
+    collector.start()
+    try:
+        if args.duration is None:
+            while True:
+                time.sleep(1)
+        else:
+            time.sleep(args.duration)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        collector.stop()
+    collector.save(args.name)
+    for results_path in args.align_with:
+        save_aligned_results(collector.samples, results_path)
+
+
+if __name__ == "__main__":
+    main()